@@ -0,0 +1,163 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from typing import Optional, List, Dict, Any
+
+from pydantic import BaseModel, Field, validator
+
+from am43_rc.entity import AM43State, AM43StateChange
+from am43_rc.protocol import AM43Status
+from ble_proxy.ble import BLEDeviceInfo
+from ble_proxy.timing import LinkStats
+
+
+class Action:
+    OPEN = "open"
+    CLOSE = "close"
+    STOP = "stop"
+    SET_POSITION = "set_position"
+
+    ALL = (OPEN, CLOSE, STOP, SET_POSITION)
+
+
+class DeviceInfoModel(BaseModel):
+    address: str
+    name: Optional[str]
+    bt_device_name: str
+    rssi: int
+
+    @classmethod
+    def from_info(cls, info: BLEDeviceInfo) -> "DeviceInfoModel":
+        return cls(address=info.address, name=info.name, bt_device_name=info.bt_device_name, rssi=info.rssi)
+
+
+class StatusModel(BaseModel):
+    speed: int
+    shade_length: int
+    roller_diameter: int
+    roller_type: int
+    reverse_direction: bool
+    top_limit_set: bool
+    bottom_limit_set: bool
+    has_light_sensor: bool
+
+    @classmethod
+    def from_status(cls, status: AM43Status) -> "StatusModel":
+        return cls(
+            speed=status.speed,
+            shade_length=status.shade_length,
+            roller_diameter=status.roller_diameter,
+            roller_type=status.roller_type,
+            reverse_direction=status.reverse_direction,
+            top_limit_set=status.top_limit_set,
+            bottom_limit_set=status.bottom_limit_set,
+            has_light_sensor=status.has_light_sensor,
+        )
+
+
+class StateModel(BaseModel):
+    address: str
+    position: Optional[int]
+    battery: Optional[int]
+    light: Optional[int]
+    status: Optional[StatusModel]
+    errors: Dict[str, str] = {}
+
+    @classmethod
+    def from_state(cls, address: str, state: AM43State) -> "StateModel":
+        return cls(
+            address=address,
+            position=state.position,
+            battery=state.battery,
+            light=state.light,
+            status=StatusModel.from_status(state.status) if state.status is not None else None,
+            errors={k: repr(v) for k, v in state.errors.items()},
+        )
+
+
+class StateChangeModel(BaseModel):
+    address: str
+    changes: Dict[str, Any]
+    state: Dict[str, Any]
+
+    @classmethod
+    def from_change(cls, change: AM43StateChange) -> "StateChangeModel":
+        return cls(address=change.address, changes=change.changes, state=change.state.to_dict())
+
+
+class LinkStatsModel(BaseModel):
+    srtt: Optional[float]
+    rttvar: Optional[float]
+    timeout: float
+    samples: int
+    timeouts: int
+    retries: int
+    loss_ratio: float
+
+    @classmethod
+    def from_stats(cls, stats: LinkStats) -> "LinkStatsModel":
+        return cls(loss_ratio=stats.loss_ratio, **stats._asdict())
+
+
+class PositionRequest(BaseModel):
+    position: int = Field(..., ge=0, le=100)
+    wait: bool = True  # wait for the device ack
+
+
+class MoveRequest(BaseModel):
+    action: str
+    wait: bool = True
+
+    @validator("action")
+    def validate_action(cls, v):
+        if v not in (Action.OPEN, Action.CLOSE, Action.STOP):
+            raise ValueError("Action must be one of open, close, stop")
+        return v
+
+
+class BatchOperation(BaseModel):
+    address: str
+    action: str
+    position: Optional[int] = Field(None, ge=0, le=100)
+
+    @validator("action")
+    def validate_action(cls, v):
+        if v not in Action.ALL:
+            raise ValueError("Action must be one of " + ", ".join(Action.ALL))
+        return v
+
+    @validator("position", always=True)
+    def validate_position(cls, v, values):
+        if values.get("action") == Action.SET_POSITION and v is None:
+            raise ValueError("Position is required for set_position")
+        return v
+
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+
+
+class BatchItemResult(BaseModel):
+    address: str
+    ok: bool
+    error: Optional[str]
+    latency: float
+
+
+class BatchResult(BaseModel):
+    ok: bool
+    elapsed: float
+    results: List[BatchItemResult]
@@ -0,0 +1,296 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import json
+import logging
+
+from aiohttp import web, WSMsgType
+from pydantic import BaseModel, ValidationError
+from typing import Optional, Any, Dict, List, Type, TypeVar
+
+from am43_rc.api.models import (
+    Action,
+    BatchItemResult,
+    BatchOperation,
+    BatchRequest,
+    BatchResult,
+    DeviceInfoModel,
+    LinkStatsModel,
+    MoveRequest,
+    PositionRequest,
+    StateChangeModel,
+    StateModel,
+)
+from am43_rc.group import AM43Group
+from am43_rc.service import AM43Device, AM43DeviceManager
+from ble_proxy.error import NotConnectedError
+from ble_proxy.metrics import InMemoryMetrics, render_prometheus
+
+M = TypeVar("M", bound=BaseModel)
+
+
+class AM43ApiServer(object):
+    """
+    HTTP + WebSocket API on top of a single long lived device manager.
+    Devices are connected on first use and kept connected (subject to the manager connection pool limits) so
+    requests normally cost a single GATT round trip.
+
+    REST:
+        GET  /api/devices                       discovered devices (?timeout=seconds)
+        GET  /api/devices/{address}/state       current state (?max_age=seconds)
+        PUT  /api/devices/{address}/position    {"position": 0-100, "wait": true}
+        POST /api/devices/{address}/move        {"action": "open|close|stop", "wait": true}
+        POST /api/batch                         {"operations": [{"address", "action", "position"}]}
+        GET  /api/link-stats                    round trip time estimates of connected devices
+        GET  /metrics                           metrics in Prometheus format (if manager uses InMemoryMetrics)
+    WebSocket:
+        GET  /api/ws                            pushes state changes (?address=...&poll_interval=seconds)
+    """
+
+    def __init__(
+        self,
+        manager: AM43DeviceManager,
+        host: str = "0.0.0.0",
+        port: int = 8080,
+        connect_timeout: float = 5,
+        connect_attempts: int = 2,
+        background_scan: bool = True,
+    ) -> None:
+        """
+        :param background_scan: keep scanning so discovery requests are served from the registry immediately
+        """
+        super().__init__()
+        self.manager = manager
+        self.host = host
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.connect_attempts = connect_attempts
+        self.background_scan = background_scan
+        self.app = self.__build_app()
+        self._runner: Optional[web.AppRunner] = None
+        self._websockets: List[web.WebSocketResponse] = []
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+    def __build_app(self) -> web.Application:
+        app = web.Application(middlewares=[self.__error_middleware])
+        app.add_routes(
+            [
+                web.get("/api/devices", self.handle_discover),
+                web.get("/api/devices/{address}/state", self.handle_state),
+                web.put("/api/devices/{address}/position", self.handle_position),
+                web.post("/api/devices/{address}/move", self.handle_move),
+                web.post("/api/batch", self.handle_batch),
+                web.get("/api/link-stats", self.handle_link_stats),
+                web.get("/api/ws", self.handle_websocket),
+                web.get("/metrics", self.handle_metrics),
+            ]
+        )
+        app.on_shutdown.append(self.__on_shutdown)
+        return app
+
+    async def start(self):
+        if self.background_scan:
+            try:
+                await self.manager.start_background_scan()
+            except Exception as e:
+                self._logger.warning("Background scanning isn't available: {}".format(str(e)))
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self._logger.info("Web API is listening on {}:{}".format(self.host, self.port))
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        await self.manager.stop_background_scan()
+        await self.manager.disconnect_all()
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            while True:
+                await asyncio.sleep(3600)
+        finally:
+            await self.stop()
+
+    async def __on_shutdown(self, app: web.Application):
+        for ws in list(self._websockets):
+            await ws.close()
+
+    @web.middleware
+    async def __error_middleware(self, request: web.Request, handler):
+        try:
+            return await handler(request)
+        except web.HTTPException:
+            raise
+        except ValidationError as e:
+            return self.__error(422, "Invalid request", e.errors())
+        except ValueError as e:
+            return self.__error(400, str(e))
+        except asyncio.TimeoutError:
+            return self.__error(504, "Device didn't respond in time")
+        except (NotConnectedError, ConnectionError) as e:
+            return self.__error(503, "Device is not reachable: {}".format(str(e)))
+        except Exception as e:
+            self._logger.exception("Request {} failed".format(request.path))
+            return self.__error(500, str(e))
+
+    @staticmethod
+    def __error(status: int, message: str, details: Any = None) -> web.Response:
+        body: Dict[str, Any] = dict(error=message)
+        if details is not None:
+            body["details"] = details
+        return web.json_response(body, status=status)
+
+    @staticmethod
+    def __json(model: Any, status: int = 200) -> web.Response:
+        if isinstance(model, list):
+            text = "[" + ",".join(x.json() for x in model) + "]"
+        else:
+            text = model.json()
+        return web.Response(text=text, status=status, content_type="application/json")
+
+    @staticmethod
+    async def __parse(request: web.Request, model: Type[M]) -> M:
+        try:
+            data = await request.json()
+        except json.JSONDecodeError as e:
+            raise ValueError("Request body must be valid JSON: {}".format(str(e)))
+        return model.parse_obj(data)
+
+    @staticmethod
+    def __float_param(request: web.Request, name: str, default: Optional[float] = None) -> Optional[float]:
+        value = request.query.get(name)
+        if value is None:
+            return default
+        try:
+            return float(value)
+        except ValueError:
+            raise ValueError("Query parameter {} must be a number".format(name))
+
+    async def __get_device(self, address: str) -> AM43Device:
+        return await self.manager.connect(address.upper(), timeout=self.connect_timeout, attempts=self.connect_attempts)
+
+    async def handle_discover(self, request: web.Request) -> web.Response:
+        timeout = self.__float_param(request, "timeout", 5)
+        devices = await self.manager.discover(timeout)  # type: ignore[arg-type]
+        return self.__json([DeviceInfoModel.from_info(x) for x in devices])
+
+    async def handle_state(self, request: web.Request) -> web.Response:
+        device = await self.__get_device(request.match_info["address"])
+        state = await device.read_state(partial=True, max_age=self.__float_param(request, "max_age"))
+        return self.__json(StateModel.from_state(device.address, state))
+
+    async def handle_position(self, request: web.Request) -> web.Response:
+        body = await self.__parse(request, PositionRequest)
+        device = await self.__get_device(request.match_info["address"])
+        await device.set_position(body.position, wait=body.wait)
+        return web.json_response(dict(address=device.address, ok=True), status=200 if body.wait else 202)
+
+    async def handle_move(self, request: web.Request) -> web.Response:
+        body = await self.__parse(request, MoveRequest)
+        device = await self.__get_device(request.match_info["address"])
+        await self.__move(device, body.action, wait=body.wait)
+        return web.json_response(dict(address=device.address, ok=True), status=200 if body.wait else 202)
+
+    @staticmethod
+    async def __move(device: AM43Device, action: str, position: Optional[int] = None, wait: bool = True):
+        if action == Action.OPEN:
+            await device.open(wait=wait)
+        elif action == Action.CLOSE:
+            await device.close(wait=wait)
+        elif action == Action.STOP:
+            await device.stop(wait=wait)
+        elif action == Action.SET_POSITION and position is not None:
+            await device.set_position(position, wait=wait)
+        else:
+            raise ValueError("Unsupported action " + action)
+
+    async def handle_batch(self, request: web.Request) -> web.Response:
+        body = await self.__parse(request, BatchRequest)
+        operations: Dict[str, List[BatchOperation]] = {}
+        for op in body.operations:
+            operations.setdefault(op.address.upper(), []).append(op)
+
+        async def run(device: AM43Device):
+            # Operations for the same device are applied in order, different devices are processed concurrently
+            for op in operations[device.address.upper()]:
+                await self.__move(device, op.action, op.position)
+
+        group = AM43Group(
+            self.manager,
+            operations.keys(),
+            connect_timeout=self.connect_timeout,
+            connect_attempts=self.connect_attempts,
+        )
+        report = await group.run(run)
+        return self.__json(
+            BatchResult(
+                ok=report.ok,
+                elapsed=report.elapsed,
+                results=[
+                    BatchItemResult(
+                        address=x.address,
+                        ok=x.ok,
+                        error=repr(x.error) if x.error is not None else None,
+                        latency=x.latency,
+                    )
+                    for x in report.results
+                ],
+            )
+        )
+
+    async def handle_link_stats(self, request: web.Request) -> web.Response:
+        stats = self.manager.get_link_stats()
+        return web.json_response({addr: LinkStatsModel.from_stats(x).dict() for addr, x in stats.items()})
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        if not isinstance(self.manager.metrics, InMemoryMetrics):
+            raise web.HTTPNotFound(text="Metrics are not collected")
+        return web.Response(text=render_prometheus(self.manager.metrics), content_type="text/plain")
+
+    async def handle_websocket(self, request: web.Request) -> web.WebSocketResponse:
+        address = request.query.get("address")
+        poll_interval = self.__float_param(request, "poll_interval")
+        # Device is resolved before the handshake so failures are reported as regular HTTP errors
+        if address is not None:
+            subscription = (await self.__get_device(address)).watch(poll_interval=poll_interval)
+        else:
+            subscription = self.manager.watch(poll_interval=poll_interval)
+        ws = web.WebSocketResponse(heartbeat=30)
+        pusher: Optional["asyncio.Future[None]"] = None
+        try:
+            await ws.prepare(request)
+            self._websockets.append(ws)
+
+            async def push():
+                async for change in subscription:
+                    await ws.send_str(StateChangeModel.from_change(change).json())
+
+            pusher = asyncio.ensure_future(push())
+            # Incoming messages are ignored, loop ends once client disconnects
+            async for msg in ws:
+                if msg.type == WSMsgType.ERROR:
+                    break
+        finally:
+            subscription.close()
+            if pusher is not None:
+                pusher.cancel()
+            if ws in self._websockets:
+                self._websockets.remove(ws)
+        return ws
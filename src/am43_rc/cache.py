@@ -0,0 +1,120 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+
+from typing import Optional, Dict, NamedTuple, Any, Iterable, Callable, Set
+
+
+class CacheStats(NamedTuple):
+    hits: int
+    misses: int
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class _Entry(NamedTuple):
+    value: Any
+    timestamp: float
+
+
+class AM43StateCache(object):
+    """
+    Read-through cache for AM43State fields keyed by device address.
+    Every field has its own TTL: battery changes over days, light over minutes and position only when motor moves.
+    Motion commands invalidate the position and mark device as moving, position of the moving device is not served
+    from cache until two reads at least STABLE_INTERVAL seconds apart return the same value.
+    """
+
+    STABLE_INTERVAL = 1.0
+
+    FIELD_BATTERY = "battery"
+    FIELD_LIGHT = "light"
+    FIELD_POSITION = "position"
+
+    DEFAULT_TTL = {FIELD_BATTERY: 3600.0, FIELD_LIGHT: 60.0, FIELD_POSITION: 30.0}
+
+    def __init__(self, ttl: Optional[Dict[str, float]] = None, clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        :param ttl: field name -> TTL in seconds. Overrides DEFAULT_TTL
+        """
+        super().__init__()
+        self.ttl = dict(self.DEFAULT_TTL)
+        self.ttl.update(ttl or {})
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, Dict[str, _Entry]] = {}
+        self._moving: Set[str] = set()
+
+    @property
+    def stats(self) -> CacheStats:
+        return CacheStats(self.hits, self.misses)
+
+    def get(self, address: str, field: str, max_age: Optional[float] = None) -> Optional[_Entry]:
+        """
+        :param max_age: max acceptable age of the value in seconds. Overrides field TTL, 0 - bypass cache
+        :return: cached entry or None if there is no fresh enough value
+        """
+        entry = self._entries.get(address, {}).get(field)
+        age_limit = self.ttl.get(field, 0) if max_age is None else max_age
+        fresh = (
+            entry is not None
+            and self.clock() - entry.timestamp <= age_limit
+            and not (field == self.FIELD_POSITION and address in self._moving)
+        )
+        if fresh:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def put(self, address: str, field: str, value: Any):
+        fields = self._entries.setdefault(address, {})
+        now = self.clock()
+        if field == self.FIELD_POSITION and address in self._moving:
+            previous = fields.get(field)
+            if previous is not None and previous.value == value:
+                if now - previous.timestamp < self.STABLE_INTERVAL:
+                    return  # Too early to decide, keep the first observation time
+                self._moving.discard(address)
+        fields[field] = _Entry(value, now)
+
+    def invalidate(self, address: str, fields: Optional[Iterable[str]] = None):
+        """
+        Drops cached values for the device
+        :param fields: fields to drop. None - all fields
+        """
+        if fields is None:
+            self._entries.pop(address, None)
+            return
+        entries = self._entries.get(address, {})
+        for field in fields:
+            entries.pop(field, None)
+
+    def mark_moving(self, address: str):
+        """
+        Called when motion command is sent to the device. Position is invalidated and not cached until motor stops.
+        """
+        self._moving.add(address)
+        self.invalidate(address, (self.FIELD_POSITION,))
+
+    def clear(self):
+        self._entries.clear()
+        self._moving.clear()
@@ -0,0 +1,68 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import logging
+
+from typing import Optional, List
+
+from am43_rc.cli.commands import COMMANDS
+from cli_rack import CLI
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="am43", description="Control AM43 blind motors")
+    parser.add_argument("-v", "--verbose", action="store_true", default=False, help="Verbose output")
+    parser.add_argument("-i", "--iface", default=None, help="Bluetooth adapter. Default: hci0")
+    parser.add_argument("-s", "--socket", default=None, help="Daemon socket path")
+    parser.add_argument(
+        "--no-daemon", action="store_true", default=False, help="Don't forward command to the running daemon"
+    )
+    parser.add_argument(
+        "-b",
+        "--backend",
+        default=None,
+        help="BLE backend name or module:factory reference e.g. bleak, am43-emulator or "
+        "am43_rc.emulator:create_backend. Default: $BLE_PROXY_BACKEND or bleak",
+    )
+    parser.add_argument("--record", default=None, help="Record GATT traffic into the given trace file")
+    parser.add_argument("--replay", default=None, help="Play the recorded trace back instead of using bluetooth")
+    parser.add_argument("--store", default=None, help="Path to the JSON file with known devices metadata")
+    parser.add_argument("--connect-timeout", type=float, default=5, help="Device connection timeout in seconds")
+    subparsers = parser.add_subparsers(dest="command", metavar="command")
+    for cmd in COMMANDS:
+        sub = subparsers.add_parser(cmd.COMMAND_NAME, help=cmd.COMMAND_DESCRIPTION)
+        cmd.setup_parser(sub)
+        sub.set_defaults(extension=cmd)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return 2
+    CLI.verbose_mode = args.verbose
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+    try:
+        args.extension(parser).handle(args)
+    except KeyboardInterrupt:
+        return 130
+    except Exception as e:
+        CLI.print_error(e)
+        return 1
+    return 0
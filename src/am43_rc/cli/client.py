@@ -0,0 +1,93 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Client side of the daemon protocol. Intentionally depends on the standard library only so CLI invocations served by
+the daemon don't pay for importing asyncio, bluetooth backends and the rest of am43_rc.
+
+Protocol: single JSON object per line in both directions.
+Request:  {"command": "<name>", ...command arguments}
+Response: {"ok": true, "result": <any>} or {"ok": false, "error": "<message>"}
+"""
+
+import json
+import os
+import socket
+import tempfile
+
+from typing import Optional, Any, Dict
+
+
+def default_socket_path() -> str:
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "am43.sock")
+    return os.path.join(tempfile.gettempdir(), "am43-{}.sock".format(os.getuid()))
+
+
+class DaemonUnavailable(Exception):
+    pass
+
+
+class RemoteCommandError(Exception):
+    pass
+
+
+class DaemonClient(object):
+    def __init__(self, socket_path: Optional[str] = None, timeout: float = 60) -> None:
+        """
+        :param timeout: max time to wait for the daemon reply in seconds
+        """
+        super().__init__()
+        self.socket_path = socket_path or default_socket_path()
+        self.timeout = timeout
+
+    def request(self, command: str, **kwargs) -> Any:
+        """
+        :raises DaemonUnavailable: if daemon isn't running
+        :raises RemoteCommandError: if daemon failed to execute command
+        """
+        payload: Dict[str, Any] = dict(kwargs, command=command)
+        try:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        except (AttributeError, OSError) as e:
+            raise DaemonUnavailable(str(e))
+        with sock:
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError as e:
+                raise DaemonUnavailable("Daemon is not listening on {}: {}".format(self.socket_path, str(e)))
+            sock.sendall(json.dumps(payload).encode("utf-8") + b"\n")
+            reply = self.__read_line(sock)
+        if not reply:
+            raise RemoteCommandError("Daemon closed connection without reply")
+        response = json.loads(reply)
+        if not response.get("ok"):
+            raise RemoteCommandError(response.get("error") or "Unknown daemon error")
+        return response.get("result")
+
+    @staticmethod
+    def __read_line(sock: socket.socket) -> bytes:
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            if chunk.endswith(b"\n"):
+                break
+        return b"".join(chunks)
@@ -0,0 +1,219 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import json
+
+from typing import Any, Dict, List
+
+from am43_rc.cli.client import DaemonClient, DaemonUnavailable
+from cli_rack import CLI, CliExtension
+
+# NOTE: asyncio and am43_rc.service are imported inside handlers only. Requests served by the daemon never need them
+
+
+# Options configuring the device manager. Daemon has its own manager so they can't be applied to forwarded requests
+MANAGER_OPTIONS = ("iface", "backend", "record", "replay", "store")
+
+
+def manager_options_given(args) -> List[str]:
+    return ["--" + x for x in MANAGER_OPTIONS if getattr(args, x, None) is not None]
+
+
+def build_manager(args):
+    from am43_rc.service import AM43DeviceManager
+    from ble_proxy.backend import get_backend
+    from ble_proxy.store import DeviceMetadataStore
+
+    store = DeviceMetadataStore(args.store) if args.store else None
+    backend = args.backend
+    if args.replay:
+        backend = get_backend("replay", path=args.replay)
+    if args.record:
+        backend = get_backend("recording", path=args.record, inner=backend)
+    return AM43DeviceManager(iface=args.iface or "hci0", metadata_store=store, backend=backend)
+
+
+def _position(value: str) -> int:
+    try:
+        position = int(value)
+    except ValueError:
+        position = -1
+    if not 0 <= position <= 100:
+        raise argparse.ArgumentTypeError("Position must be an integer in range 0..100")
+    return position
+
+
+class AM43Command(CliExtension):
+    """
+    Base class for commands which could be either forwarded to the running daemon or executed in-process
+    """
+
+    def build_request(self, args) -> Dict[str, Any]:
+        raise NotImplementedError()
+
+    def handle(self, args):
+        request = self.build_request(args)
+        self.print_result(self.execute(args, request))
+
+    def execute(self, args, request: Dict[str, Any]) -> Any:
+        local_options = manager_options_given(args)
+        if local_options and not args.no_daemon:
+            CLI.print_debug("Not using daemon since {} given".format(", ".join(local_options)))
+        if not args.no_daemon and not local_options:
+            try:
+                return DaemonClient(args.socket).request(**request)
+            except DaemonUnavailable as e:
+                CLI.print_debug(str(e))
+        CLI.print_debug("Executing {} in-process".format(request["command"]))
+        import asyncio
+        from am43_rc.cli.daemon import execute
+
+        # There is nobody to confirm the motion once this process exits
+        request["wait"] = True
+
+        async def run():
+            manager = build_manager(args)
+            try:
+                return await execute(manager, request, args.connect_timeout)
+            finally:
+                await manager.disconnect_all()
+
+        return asyncio.run(run())
+
+    def print_result(self, result: Any):
+        if result is not None:
+            CLI.print_data(json.dumps(result, indent=2))
+
+
+class DiscoverCommand(AM43Command):
+    COMMAND_NAME = "discover"
+    COMMAND_DESCRIPTION = "Scan for AM43 devices nearby"
+
+    @classmethod
+    def setup_parser(cls, parser: argparse.ArgumentParser):
+        parser.add_argument("-t", "--timeout", type=float, default=5, help="Scan duration in seconds")
+
+    def build_request(self, args) -> Dict[str, Any]:
+        return dict(command="discover", timeout=args.timeout)
+
+
+class StateCommand(AM43Command):
+    COMMAND_NAME = "state"
+    COMMAND_DESCRIPTION = "Read position, battery and light level"
+
+    @classmethod
+    def setup_parser(cls, parser: argparse.ArgumentParser):
+        parser.add_argument("address", help="Device MAC address")
+        parser.add_argument(
+            "--max-age", type=float, default=None, help="Accept cached values not older than this many seconds"
+        )
+
+    def build_request(self, args) -> Dict[str, Any]:
+        return dict(command="state", address=args.address, max_age=args.max_age)
+
+
+class _MotionCommand(AM43Command):
+    @classmethod
+    def setup_parser(cls, parser: argparse.ArgumentParser):
+        parser.add_argument("address", help="Device MAC address")
+        parser.add_argument(
+            "--no-wait",
+            action="store_true",
+            default=False,
+            help="Return once command is sent, the daemon confirms motion in background",
+        )
+
+    def build_request(self, args) -> Dict[str, Any]:
+        return dict(command=self.COMMAND_NAME, address=args.address, wait=not args.no_wait)
+
+
+class OpenCommand(_MotionCommand):
+    COMMAND_NAME = "open"
+    COMMAND_DESCRIPTION = "Open blind"
+
+
+class CloseCommand(_MotionCommand):
+    COMMAND_NAME = "close"
+    COMMAND_DESCRIPTION = "Close blind"
+
+
+class StopCommand(_MotionCommand):
+    COMMAND_NAME = "stop"
+    COMMAND_DESCRIPTION = "Stop blind motor"
+
+
+class PositionCommand(_MotionCommand):
+    COMMAND_NAME = "position"
+    COMMAND_DESCRIPTION = "Move blind to the given position"
+
+    @classmethod
+    def setup_parser(cls, parser: argparse.ArgumentParser):
+        super().setup_parser(parser)
+        parser.add_argument("position", type=_position, help="Target position in %%, 0 - fully open")
+
+    def build_request(self, args) -> Dict[str, Any]:
+        return dict(super().build_request(args), position=args.position)
+
+
+class DaemonCommand(CliExtension):
+    COMMAND_NAME = "daemon"
+    COMMAND_DESCRIPTION = "Run resident process keeping connections warm and serving CLI invocations"
+
+    def handle(self, args):
+        try:
+            DaemonClient(args.socket, timeout=2).request("ping")
+            raise RuntimeError("Daemon is already running on {}".format(args.socket or "default socket"))
+        except DaemonUnavailable:
+            pass
+        import asyncio
+        from am43_rc.cli.daemon import AM43Daemon
+
+        async def run():
+            await AM43Daemon(build_manager(args), args.socket, args.connect_timeout).serve_forever()
+
+        asyncio.run(run())
+
+
+class ServeCommand(CliExtension):
+    COMMAND_NAME = "serve"
+    COMMAND_DESCRIPTION = "Run HTTP/WebSocket API server"
+
+    @classmethod
+    def setup_parser(cls, parser: argparse.ArgumentParser):
+        parser.add_argument("--host", default="0.0.0.0", help="Address to listen on")
+        parser.add_argument("--port", type=int, default=8080, help="Port to listen on")
+
+    def handle(self, args):
+        import asyncio
+        from am43_rc.api import AM43ApiServer
+
+        async def run():
+            await AM43ApiServer(build_manager(args), args.host, args.port, args.connect_timeout).serve_forever()
+
+        asyncio.run(run())
+
+
+COMMANDS = (
+    DiscoverCommand,
+    StateCommand,
+    OpenCommand,
+    CloseCommand,
+    StopCommand,
+    PositionCommand,
+    DaemonCommand,
+    ServeCommand,
+)
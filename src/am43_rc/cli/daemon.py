@@ -0,0 +1,143 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import json
+import logging
+import os
+import signal
+
+from typing import Optional, Any, Dict, List
+
+from am43_rc.api.models import DeviceInfoModel, StateModel
+from am43_rc.cli.client import default_socket_path
+from am43_rc.service import AM43DeviceManager
+
+COMMANDS = ("ping", "discover", "state", "open", "close", "stop", "position")
+
+
+async def execute(manager: AM43DeviceManager, request: Dict[str, Any], connect_timeout: float = 5) -> Any:
+    """
+    Executes single CLI request against the manager.
+    :return: JSON serializable result
+    :raises ValueError: for malformed request
+    """
+    command = request.get("command")
+    if command == "ping":
+        return dict(pid=os.getpid(), devices=sorted(manager.get_link_stats().keys()))
+    if command == "discover":
+        devices = await manager.discover(float(request.get("timeout", 5)))  # type: ignore[arg-type]
+        return [DeviceInfoModel.from_info(x).dict() for x in devices]
+    if command not in COMMANDS:
+        raise ValueError("Unknown command {}".format(command))
+    address = request.get("address")
+    if not address:
+        raise ValueError("Device address is required")
+    device = await manager.connect(str(address).upper(), timeout=connect_timeout, attempts=2)
+    wait = bool(request.get("wait", True))
+    if command == "state":
+        state = await device.read_state(partial=True, max_age=request.get("max_age"))
+        return json.loads(StateModel.from_state(device.address, state).json())
+    if command == "open":
+        await device.open(wait=wait)
+    elif command == "close":
+        await device.close(wait=wait)
+    elif command == "stop":
+        await device.stop(wait=wait)
+    elif command == "position":
+        position = int(request.get("position", -1))
+        if not 0 <= position <= 100:
+            raise ValueError("Position must be in range 0..100")
+        await device.set_position(position, wait=wait)
+    return None
+
+
+class AM43Daemon(object):
+    """
+    Resident process serving CLI requests over a Unix socket. Keeps the device manager with its warm connections
+    alive between invocations so a command costs a GATT round trip rather than interpreter start, imports and
+    BLE connect.
+    """
+
+    def __init__(self, manager: AM43DeviceManager, socket_path: Optional[str] = None, connect_timeout: float = 5):
+        super().__init__()
+        self.manager = manager
+        self.socket_path = socket_path or default_socket_path()
+        self.connect_timeout = connect_timeout
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+    async def start(self):
+        if os.path.exists(self.socket_path):
+            # Stale socket left by crashed daemon. Live daemon is detected by the caller before start
+            os.unlink(self.socket_path)
+        try:
+            await self.manager.start_background_scan()
+        except Exception as e:
+            self._logger.warning("Background scanning isn't available: {}".format(str(e)))
+        self._server = await asyncio.start_unix_server(self.__handle_client, path=self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        self._logger.info("Daemon is listening on {}".format(self.socket_path))
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+        await self.manager.disconnect_all()
+
+    async def serve_forever(self):
+        stopped = asyncio.Event()
+        loop = asyncio.get_event_loop()
+        installed: List[int] = []
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stopped.set)
+                installed.append(sig)
+            except (NotImplementedError, RuntimeError):
+                pass
+        await self.start()
+        try:
+            await stopped.wait()
+        finally:
+            for sig in installed:
+                loop.remove_signal_handler(sig)
+            await self.stop()
+
+    async def __handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            line = await reader.readline()
+            if not line:
+                return
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("Request must be JSON object")
+                result = await execute(self.manager, request, self.connect_timeout)
+                response: Dict[str, Any] = dict(ok=True, result=result)
+            except asyncio.TimeoutError:
+                response = dict(ok=False, error="Device didn't respond in time")
+            except Exception as e:
+                self._logger.debug("Request failed", exc_info=True)
+                response = dict(ok=False, error=str(e) or repr(e))
+            writer.write(json.dumps(response).encode("utf-8") + b"\n")
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
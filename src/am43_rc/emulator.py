@@ -0,0 +1,198 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import time
+
+from typing import Dict, List, Callable, Optional, Any
+
+from am43_rc import protocol
+from ble_proxy.backend.simulated import SimulatedPeripheral, Notification, SimulatedBackend, LinkProfile
+from ble_proxy.scanner import Advertisement
+
+
+class AM43Emulator(SimulatedPeripheral):
+    """
+    Emulates AM43 blind motor on the protocol level: single fe51 characteristic, CRC-checked command frames,
+    battery/light/position replies and motor moving with constant speed.
+    Position 0 means fully open, 100 - fully closed.
+    """
+
+    CONTROL_SERVICE_UUID = protocol.CONTROL_SERVICE_UUID
+    CONTROL_RW_CHARACTERISTIC_UUID = protocol.CONTROL_RW_CHARACTERISTIC_UUID
+
+    MOVE_OPEN = protocol.MoveOption.MOVE_OPEN[0]
+    MOVE_CLOSE = protocol.MoveOption.MOVE_CLOSE[0]
+    MOVE_STOP = protocol.MoveOption.MOVE_STOP[0]
+
+    def __init__(
+        self,
+        position: Optional[float] = 0,
+        battery: int = 80,
+        light: int = 5,
+        travel_time: float = 10,
+        speed: int = 30,
+        shade_length: int = 1500,
+        roller_diameter: int = 25,
+        roller_type: int = 0,
+        reverse_direction: bool = False,
+        has_light_sensor: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        :param position: initial position in %. None means limits are not configured
+        :param travel_time: seconds the motor needs to move from 0 to 100%
+        :param clock: monotonic time source, could be replaced for deterministic simulations
+        """
+        super().__init__()
+        self.battery = battery
+        self.light = light
+        self.travel_time = travel_time
+        self.speed = speed
+        self.shade_length = shade_length
+        self.roller_diameter = roller_diameter
+        self.roller_type = roller_type
+        self.reverse_direction = reverse_direction
+        self.has_light_sensor = has_light_sensor
+        self.limits_set = position is not None
+        self.clock = clock
+        self.received_commands: List[bytes] = []
+        self.crc_errors = 0
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.__position = float(position or 0)
+        self.__target: Optional[float] = None
+        self.__moving_since = 0.0
+
+    @property
+    def position(self) -> Optional[float]:
+        if not self.limits_set:
+            return None
+        self.__update_motion()
+        return self.__position
+
+    @property
+    def is_moving(self) -> bool:
+        self.__update_motion()
+        return self.__target is not None
+
+    def __update_motion(self):
+        if self.__target is None:
+            return
+        now = self.clock()
+        step = (now - self.__moving_since) * 100 / self.travel_time
+        self.__moving_since = now
+        distance = self.__target - self.__position
+        if abs(distance) <= step:
+            self.__position = self.__target
+            self.__target = None
+        else:
+            self.__position += step if distance > 0 else -step
+
+    def __move_to(self, target: Optional[float]) -> bool:
+        if not self.limits_set:
+            return False
+        self.__update_motion()
+        self.__target = target
+        self.__moving_since = self.clock()
+        self.__update_motion()
+        return True
+
+    def get_services(self) -> Dict[str, List[str]]:
+        return {self.CONTROL_SERVICE_UUID: [self.CONTROL_RW_CHARACTERISTIC_UUID]}
+
+    def on_disconnect(self):
+        # Motor keeps moving when BLE link is gone
+        pass
+
+    def handle_write(self, characteristic: str, data: bytes) -> List[Notification]:
+        if characteristic != self.CONTROL_RW_CHARACTERISTIC_UUID:
+            return []
+        self.received_commands.append(data)
+        if len(data) < len(protocol.CMD_PREFIX) + 3 or data[: len(protocol.CMD_PREFIX)] != protocol.CMD_PREFIX:
+            self._logger.warning("Malformed frame: {}".format(data.hex()))
+            return []
+        if protocol.calc_crc(data[:-1]) != data[-1]:
+            self.crc_errors += 1
+            self._logger.warning("CRC mismatch: {}".format(data.hex()))
+            return []
+        command = data[5]
+        params = data[7 : 7 + data[6]]
+        reply = self.handle_command(command, params)
+        if reply is None:
+            return []
+        return [(self.CONTROL_RW_CHARACTERISTIC_UUID, reply)]
+
+    def handle_command(self, command: int, params: bytes) -> Optional[bytes]:
+        if command == protocol.Cmd.GET_BATTERY:
+            return protocol.build_reply(command, bytes((0, 0, 0, 0, self.battery)))
+        if command == protocol.Cmd.GET_LIGHT:
+            return protocol.build_reply(command, bytes((0, self.light)))
+        if command == protocol.Cmd.GET_POSITION:
+            return protocol.build_reply(command, self.__position_payload())
+        if command == protocol.Cmd.SET_POSITION:
+            ok = len(params) == 1 and 0 <= params[0] <= 100 and self.__move_to(params[0])
+            return self.__ack(command, ok)
+        if command == protocol.Cmd.MOVE:
+            option = params[0] if params else None
+            if option == self.MOVE_OPEN:
+                ok = self.__move_to(0)
+            elif option == self.MOVE_CLOSE:
+                ok = self.__move_to(100)
+            elif option == self.MOVE_STOP:
+                ok = self.__move_to(None)
+            else:
+                ok = False
+            return self.__ack(command, ok)
+        if command == protocol.Cmd.LOGIN:
+            return self.__ack(command, True)
+        self._logger.warning("Unknown command 0x{:02X}".format(command))
+        return None
+
+    def __ack(self, command: int, ok: bool) -> bytes:
+        return protocol.build_reply(command, bytes((protocol.ACK_OK if ok else protocol.ACK_FAIL,)))
+
+    def __position_payload(self) -> bytes:
+        flags = (
+            (protocol.StatusFlag.REVERSE_DIRECTION if self.reverse_direction else 0)
+            | (protocol.StatusFlag.TOP_LIMIT_SET if self.limits_set else 0)
+            | (protocol.StatusFlag.BOTTOM_LIMIT_SET if self.limits_set else 0)
+            | (protocol.StatusFlag.HAS_LIGHT_SENSOR if self.has_light_sensor else 0)
+        )
+        position = self.position
+        return protocol.encode_status(
+            protocol.AM43Status(
+                flags,
+                self.speed,
+                None if position is None else int(round(position)),
+                self.shade_length,
+                self.roller_diameter,
+                self.roller_type,
+            )
+        )
+
+
+def create_backend(count: int = 3, profile: Optional[LinkProfile] = None, **emulator_options: Any) -> SimulatedBackend:
+    """
+    Simulated backend with the given number of advertised AM43 emulators, exposed as "am43-emulator" backend
+    through the ble_proxy.backends entry point.
+    Connecting to any other address creates emulator on demand.
+    :param emulator_options: passed to AM43Emulator constructor
+    """
+    return SimulatedBackend(
+        lambda address: AM43Emulator(**emulator_options),
+        [Advertisement("02:00:00:00:43:{:02X}".format(i + 1), "Blind {}".format(i + 1), -60) for i in range(count)],
+        profile,
+    )
@@ -14,17 +14,28 @@
 #    You should have received a copy of the GNU General Public License
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from typing import Optional
+from typing import Optional, Dict, Any
+
+from am43_rc.protocol import AM43Status
 
 
 class AM43State(object):
-    light: int
-    battery: int
+    light: Optional[int] = None
+    battery: Optional[int] = None
     position: Optional[int] = None
 
     def __init__(
-        self, light: Optional[int] = None, battery: Optional[int] = None, position: Optional[int] = None
+        self,
+        light: Optional[int] = None,
+        battery: Optional[int] = None,
+        position: Optional[int] = None,
+        errors: Optional[Dict[str, Exception]] = None,
+        status: Optional[AM43Status] = None,
     ) -> None:
+        """
+        :param errors: field name -> error which prevented field from being read. Used for partial states
+        :param status: full motor status. Might be missing if position was served from cache
+        """
         super().__init__()
         if light is not None:
             self.light = light
@@ -32,6 +43,19 @@ class AM43State(object):
             self.battery = battery
         if position is not None:
             self.position = position
+        self.errors: Dict[str, Exception] = errors or {}
+        self.status = status
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(light=self.light, battery=self.battery, position=self.position)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "AM43State":
+        return cls(light=data.get("light"), battery=data.get("battery"), position=data.get("position"))
+
+    @property
+    def is_complete(self) -> bool:
+        return len(self.errors) == 0
 
     @property
     def is_closed(self) -> bool:
@@ -42,6 +66,32 @@ class AM43State(object):
         return not self.is_closed
 
     def __repr__(self):
-        return "AM43 State: {}, Position: {}, Battery: {}, Luminosity: {}".format(
+        res = "AM43 State: {}, Position: {}, Battery: {}, Luminosity: {}".format(
             "OPEN" if self.is_open else "CLOSED", self.position, self.battery, self.light
         )
+        if self.errors:
+            res += ", Errors: {}".format(", ".join(["{}={!r}".format(k, v) for k, v in self.errors.items()]))
+        return res
+
+
+class AM43StateChange(object):
+    """
+    Delta of the device state. Contains only fields which have changed and the full state after the change
+    """
+
+    def __init__(self, address: str, changes: Dict[str, Any], state: AM43State) -> None:
+        super().__init__()
+        self.address = address
+        self.changes = changes
+        self.state = state
+
+    def merge(self, newer: "AM43StateChange") -> "AM43StateChange":
+        """
+        :return: single change equivalent to applying this change and then the newer one
+        """
+        return AM43StateChange(self.address, {**self.changes, **newer.changes}, newer.state)
+
+    def __repr__(self):
+        return "AM43StateChange({}, {})".format(
+            self.address, ", ".join(["{}={}".format(k, v) for k, v in self.changes.items()])
+        )
@@ -0,0 +1,137 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import logging
+import time
+
+from typing import List, Any, Optional, NamedTuple, Callable, Awaitable, Iterable
+
+from am43_rc.entity import AM43State
+from am43_rc.service import AM43Device, AM43DeviceManager
+from ble_proxy.ble import AddrOrBLEDevInfo
+
+DeviceCommand = Callable[[AM43Device], Awaitable[Any]]
+
+
+class DeviceResult(NamedTuple):
+    address: str
+    value: Any = None
+    error: Optional[Exception] = None
+    latency: float = 0  # seconds spent on connect + command
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class GroupReport(object):
+    def __init__(self, results: List[DeviceResult], elapsed: float) -> None:
+        super().__init__()
+        self.results = results
+        self.elapsed = elapsed
+
+    @property
+    def ok(self) -> bool:
+        return all(x.ok for x in self.results)
+
+    @property
+    def succeeded(self) -> List[DeviceResult]:
+        return [x for x in self.results if x.ok]
+
+    @property
+    def failed(self) -> List[DeviceResult]:
+        return [x for x in self.results if not x.ok]
+
+    def __repr__(self):
+        return "Group report: {} succeeded, {} failed in {:.3f}s".format(
+            len(self.succeeded), len(self.failed), self.elapsed
+        )
+
+
+class AM43Group(object):
+    """
+    Runs the same command across multiple blinds with bounded concurrency.
+    Devices are connected lazily through the manager, failure of one device doesn't affect the others.
+    """
+
+    def __init__(
+        self,
+        manager: AM43DeviceManager,
+        targets: Iterable[AddrOrBLEDevInfo],
+        concurrency: int = 8,
+        connect_timeout: float = 5,
+        connect_attempts: int = 2,
+    ) -> None:
+        """
+        :param concurrency: max number of devices processed simultaneously
+        """
+        super().__init__()
+        if concurrency < 1:
+            raise ValueError("Concurrency must be positive integer. Got " + str(concurrency))
+        self.manager = manager
+        self.targets = list(targets)
+        self.concurrency = concurrency
+        self.connect_timeout = connect_timeout
+        self.connect_attempts = connect_attempts
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+    async def __run_for_target(self, target: AddrOrBLEDevInfo, command: DeviceCommand, semaphore: asyncio.Semaphore):
+        address = AM43DeviceManager._get_addr_for_target(target)
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                device = await self.manager.connect(
+                    target, timeout=self.connect_timeout, attempts=self.connect_attempts
+                )
+                value = await command(device)
+                return DeviceResult(address, value, None, time.monotonic() - started)
+            except Exception as e:
+                self._logger.warning("Group command failed for {}: {}".format(address, str(e)))
+                return DeviceResult(address, None, e, time.monotonic() - started)
+
+    async def run(self, command: DeviceCommand) -> GroupReport:
+        """
+        Runs command for every device in group
+        :param command: coroutine function which accepts device and returns command result
+        :return: per-device results in the same order as targets
+        """
+        started = time.monotonic()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(*[self.__run_for_target(x, command, semaphore) for x in self.targets])
+        return GroupReport(list(results), time.monotonic() - started)
+
+    async def open(self) -> GroupReport:
+        return await self.run(lambda dev: dev.open())
+
+    async def close(self) -> GroupReport:
+        return await self.run(lambda dev: dev.close())
+
+    async def stop(self) -> GroupReport:
+        return await self.run(lambda dev: dev.stop())
+
+    async def set_position(self, position: int) -> GroupReport:
+        return await self.run(lambda dev: dev.set_position(position))
+
+    async def read_state(self, partial=False) -> GroupReport:
+        """
+        :return: report with AM43State as a value for every device
+        """
+
+        async def read(dev: AM43Device) -> AM43State:
+            return await dev.read_state(partial=partial)
+
+        return await self.run(read)
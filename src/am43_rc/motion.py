@@ -0,0 +1,211 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import logging
+
+from typing import Optional, NamedTuple, Any, Generator, Callable, Awaitable, AsyncIterator
+
+__all__ = ("MotionResult", "MotionHandle", "MotionProgress", "MotionOutcome", "MotionTracker")
+
+_logger = logging.getLogger("MotionHandle")
+
+
+class MotionResult(NamedTuple):
+    confirmed: bool  # True if device accepted the command or motion was observed
+    acknowledged: Optional[bool]  # ack received from the device, None if ack was lost
+    position: Optional[int] = None  # position observed while verifying motion without ack
+
+
+class MotionHandle(object):
+    """
+    Confirmation of the motion command sent without waiting for the ack. Could be awaited directly.
+    """
+
+    def __init__(self, address: str, command: int, target: Optional[int], confirmation: "asyncio.Future[MotionResult]"):
+        """
+        :param target: position motor is expected to reach, None for stop
+        """
+        super().__init__()
+        self.address = address
+        self.command = command
+        self.target = target
+        self._confirmation = confirmation
+        confirmation.add_done_callback(self.__on_done)
+
+    def __on_done(self, future: "asyncio.Future[MotionResult]"):
+        if not future.cancelled() and future.exception() is not None:
+            # Retrieve exception so it isn't reported as unhandled if nobody awaits the handle
+            _logger.debug("Motion command confirmation for {} failed: {}".format(self.address, future.exception()))
+
+    def done(self) -> bool:
+        return self._confirmation.done()
+
+    def result(self) -> MotionResult:
+        """
+        :raises asyncio.InvalidStateError: if confirmation isn't received yet
+        """
+        return self._confirmation.result()
+
+    def add_done_callback(self, callback: Callable[["MotionHandle"], Any]):
+        self._confirmation.add_done_callback(lambda _: callback(self))
+
+    async def wait(self, timeout: Optional[float] = None) -> MotionResult:
+        """
+        :raises asyncio.TimeoutError: if confirmation isn't received within timeout. Confirmation keeps running
+        """
+        return await asyncio.wait_for(asyncio.shield(self._confirmation), timeout)
+
+    def __await__(self) -> Generator[Any, None, MotionResult]:
+        return self.wait().__await__()
+
+    def __repr__(self):
+        state = repr(self._confirmation.result()) if self.done() and not self._confirmation.exception() else "pending"
+        return "MotionHandle({}, 0x{:02X}, target={}, {})".format(self.address, self.command, self.target, state)
+
+
+class MotionProgress(NamedTuple):
+    position: int
+    speed: Optional[float]  # observed speed in % per second, None until measured
+    eta: Optional[float]  # seconds until target is reached, None if unknown
+    elapsed: float  # seconds since tracking started
+
+
+class MotionOutcome:
+    REACHED = "reached"  # target position reached
+    STOPPED = "stopped"  # motion without target finished
+    STALLED = "stalled"  # position didn't change for stall_timeout before reaching the target
+    UNKNOWN = "unknown"  # position couldn't be determined (limits aren't set)
+
+
+class MotionTracker(object):
+    """
+    Follows blind motion by polling its position. Polling interval adapts to the observed speed: the next poll is
+    scheduled at the estimated arrival time (bounded by min/max interval) so there are few polls during long moves
+    and completion is detected shortly after it happens.
+    Iterate over tracker to receive intermediate positions or await wait() for the final outcome. Could be used once.
+    """
+
+    def __init__(
+        self,
+        read_position: Callable[[], Awaitable[Optional[int]]],
+        target: Optional[int] = None,
+        tolerance: int = 0,
+        initial_speed: Optional[float] = None,
+        min_interval: float = 0.2,
+        max_interval: float = 2,
+        stall_timeout: float = 3,
+        speed_smoothing: float = 0.5,
+        on_finished: Optional[Callable[["MotionTracker"], None]] = None,
+    ) -> None:
+        """
+        :param read_position: coroutine function reading current position from the device
+        :param target: expected final position. None - track until motion stops
+        :param tolerance: max distance from the target in % still considered as reached
+        :param initial_speed: speed in %/s known from the previous moves, used until measured
+        :param stall_timeout: motion is considered finished if position doesn't change for this amount of seconds
+        :param speed_smoothing: weight of the new speed sample in range 0..1
+        :param on_finished: called once motion outcome is determined
+        """
+        super().__init__()
+        self.read_position = read_position
+        self.target = target
+        self.tolerance = tolerance
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.stall_timeout = stall_timeout
+        self.speed_smoothing = speed_smoothing
+        self.on_finished = on_finished
+        self.speed = initial_speed
+        self.polls = 0
+        self.outcome: Optional[str] = None
+        self.last_progress: Optional[MotionProgress] = None
+        self.__started = False
+
+    def __is_reached(self, position: int) -> bool:
+        return self.target is not None and abs(position - self.target) <= self.tolerance
+
+    def __estimate_eta(self, position: int) -> Optional[float]:
+        if self.target is None or not self.speed:
+            return None
+        return abs(self.target - position) / self.speed
+
+    def __next_interval(self, eta: Optional[float]) -> float:
+        if eta is None:
+            # Speed isn't known yet or no target. Stall detection needs a few polls within stall_timeout
+            interval = min(self.max_interval, self.stall_timeout / 3)
+        else:
+            interval = eta
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def __update_speed(self, distance: int, duration: float):
+        if distance == 0 or duration <= 0:
+            return
+        sample = distance / duration
+        if self.speed is None:
+            self.speed = sample
+        else:
+            self.speed += self.speed_smoothing * (sample - self.speed)
+
+    def __finish(self, outcome: str):
+        self.outcome = outcome
+        if self.on_finished is not None:
+            self.on_finished(self)
+
+    async def __aiter__(self) -> AsyncIterator[MotionProgress]:
+        if self.__started:
+            raise RuntimeError("Motion tracker could be used only once")
+        self.__started = True
+        loop = asyncio.get_event_loop()
+        started_at = loop.time()
+        changed_at = started_at
+        previous: Optional[int] = None
+        previous_at = started_at
+        while True:
+            position = await self.read_position()
+            now = loop.time()
+            self.polls += 1
+            if position is None:
+                self.__finish(MotionOutcome.UNKNOWN)
+                return
+            if previous is not None and position != previous:
+                self.__update_speed(abs(position - previous), now - previous_at)
+                changed_at = now
+            if previous is None or position != previous:
+                previous, previous_at = position, now
+            eta = 0.0 if self.__is_reached(position) else self.__estimate_eta(position)
+            self.last_progress = MotionProgress(position, self.speed, eta, now - started_at)
+            yield self.last_progress
+            if self.__is_reached(position):
+                self.__finish(MotionOutcome.REACHED)
+                return
+            if now - changed_at >= self.stall_timeout:
+                self.__finish(MotionOutcome.STALLED if self.target is not None else MotionOutcome.STOPPED)
+                return
+            await asyncio.sleep(self.__next_interval(eta))
+
+    async def wait(self, timeout: Optional[float] = None) -> str:
+        """
+        :return: outcome, see MotionOutcome
+        :raises asyncio.TimeoutError: if motion isn't finished within timeout
+        """
+
+        async def consume():
+            async for _ in self:
+                pass
+
+        await asyncio.wait_for(consume(), timeout)
+        return self.outcome or MotionOutcome.UNKNOWN
@@ -0,0 +1,290 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+AM43 wire protocol codec.
+
+Command frame: 00 FF 00 00 9A <command> <params length> <params> <crc>
+Reply frame:   9A <command> <payload length> <payload> <crc>
+CRC is XOR of all preceding bytes of the frame XOR 0xFF.
+"""
+
+import struct
+from functools import reduce
+from operator import xor
+
+from typing import Optional, Tuple, Iterator, Iterable, Any, Union
+
+Blob = Union[bytes, bytearray, memoryview]
+
+CONTROL_SERVICE_UUID = "0000fe50-0000-1000-8000-00805f9b34fb"
+CONTROL_RW_CHARACTERISTIC_UUID = "0000fe51-0000-1000-8000-00805f9b34fb"
+
+CMD_PREFIX = bytes([0x00, 0xFF, 0x00, 0x00, 0x9A])
+REPLY_MARKER = 0x9A
+REPLY_HEADER_SIZE = 3  # marker, command, payload length
+NO_DATA = bytes([0x01])
+ACK_OK = 0x5A
+ACK_FAIL = 0xA5
+POSITION_UNKNOWN = 0xFF
+
+
+class Cmd:
+    MOVE = 0x0A
+    SET_POSITION = 0x0D
+    GET_POSITION = 0xA7
+    GET_BATTERY = 0xA2
+    GET_LIGHT = 0xAA
+    LOGIN = 0x17
+
+
+_COMMAND_NAMES = {v: k for k, v in vars(Cmd).items() if not k.startswith("_")}
+
+
+def command_name(command: int) -> str:
+    return _COMMAND_NAMES.get(command) or "0x{:02X}".format(command)
+
+
+# Commands which could be safely re-sent when reply is lost. MOVE isn't: repeated STOP/OPEN sent after the motor
+# was commanded elsewhere would override that command
+IDEMPOTENT_COMMANDS = frozenset((Cmd.GET_POSITION, Cmd.GET_BATTERY, Cmd.GET_LIGHT, Cmd.SET_POSITION, Cmd.LOGIN))
+
+MOTION_COMMANDS = frozenset((Cmd.MOVE, Cmd.SET_POSITION))
+
+
+class MoveOption:
+    MOVE_OPEN = bytes([0xDD])
+    MOVE_CLOSE = bytes([0xEE])
+    MOVE_STOP = bytes([0xCC])
+
+
+class StatusFlag:
+    REVERSE_DIRECTION = 0x01
+    OPERATION_MODE = 0x02
+    TOP_LIMIT_SET = 0x04
+    BOTTOM_LIMIT_SET = 0x08
+    HAS_LIGHT_SENSOR = 0x10
+
+
+def calc_crc(blob: Blob) -> int:
+    return reduce(xor, blob, 0) ^ 0xFF
+
+
+def build_frame(command: int, params: Blob) -> bytes:
+    data = bytearray(CMD_PREFIX)
+    data.append(command)
+    data.append(len(params))
+    data += params
+    data.append(calc_crc(data))
+    return bytes(data)
+
+
+def build_reply(command: int, payload: Blob) -> bytes:
+    data = bytearray((REPLY_MARKER, command, len(payload)))
+    data += payload
+    data.append(calc_crc(data))
+    return bytes(data)
+
+
+def reply_prefix(command: int) -> bytes:
+    return bytes((REPLY_MARKER, command))
+
+
+class Frames:
+    """
+    Precomputed immutable command frames
+    """
+
+    GET_BATTERY = build_frame(Cmd.GET_BATTERY, NO_DATA)
+    GET_LIGHT = build_frame(Cmd.GET_LIGHT, NO_DATA)
+    GET_POSITION = build_frame(Cmd.GET_POSITION, NO_DATA)
+    OPEN = build_frame(Cmd.MOVE, MoveOption.MOVE_OPEN)
+    CLOSE = build_frame(Cmd.MOVE, MoveOption.MOVE_CLOSE)
+    STOP = build_frame(Cmd.MOVE, MoveOption.MOVE_STOP)
+    SET_POSITION: Tuple[bytes, ...] = tuple(build_frame(Cmd.SET_POSITION, bytes((x,))) for x in range(101))
+
+
+class AM43Status(object):
+    """
+    Decoded GET_POSITION reply
+    """
+
+    __slots__ = (
+        "flags",
+        "speed",
+        "position",
+        "shade_length",
+        "roller_diameter",
+        "roller_type",
+    )
+
+    def __init__(
+        self,
+        flags: int,
+        speed: int,
+        position: Optional[int],
+        shade_length: int,
+        roller_diameter: int,
+        roller_type: int,
+    ) -> None:
+        self.flags = flags
+        self.speed = speed
+        self.position = position
+        self.shade_length = shade_length
+        self.roller_diameter = roller_diameter
+        self.roller_type = roller_type
+
+    @property
+    def reverse_direction(self) -> bool:
+        return bool(self.flags & StatusFlag.REVERSE_DIRECTION)
+
+    @property
+    def operation_mode(self) -> int:
+        return 1 if self.flags & StatusFlag.OPERATION_MODE else 0
+
+    @property
+    def top_limit_set(self) -> bool:
+        return bool(self.flags & StatusFlag.TOP_LIMIT_SET)
+
+    @property
+    def bottom_limit_set(self) -> bool:
+        return bool(self.flags & StatusFlag.BOTTOM_LIMIT_SET)
+
+    @property
+    def has_light_sensor(self) -> bool:
+        return bool(self.flags & StatusFlag.HAS_LIGHT_SENSOR)
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, AM43Status) and all(getattr(self, x) == getattr(other, x) for x in self.__slots__)
+
+    def __repr__(self):
+        return "AM43Status(position={}, speed={}, flags=0x{:02X}, length={}, diameter={}, type={})".format(
+            self.position, self.speed, self.flags, self.shade_length, self.roller_diameter, self.roller_type
+        )
+
+
+# flags, speed, position, shade length, roller diameter, roller type
+_STATUS_STRUCT = struct.Struct(">BBBHBB")
+
+
+def verify_reply(frame: Blob, command: int, check_crc: bool = False):
+    """
+    :raises ValueError: if frame is not a reply for the given command
+    """
+    if len(frame) < REPLY_HEADER_SIZE or frame[0] != REPLY_MARKER or frame[1] != command:
+        raise ValueError(
+            "Unexpected prefix for reply {}. Expected {}".format(bytes(frame).hex(), reply_prefix(command).hex())
+        )
+    if check_crc and calc_crc(frame[:-1]) != frame[-1]:
+        raise ValueError("CRC mismatch for reply {}".format(bytes(frame).hex()))
+
+
+def is_crc_valid(frame: Blob) -> bool:
+    return len(frame) > 0 and calc_crc(frame[:-1]) == frame[-1]
+
+
+def encode_status(status: AM43Status) -> bytes:
+    """
+    :return: payload of GET_POSITION reply
+    """
+    position = POSITION_UNKNOWN if status.position is None else status.position
+    return _STATUS_STRUCT.pack(
+        status.flags, status.speed, position, status.shade_length, status.roller_diameter, status.roller_type
+    )
+
+
+def decode_status(frame: Blob) -> AM43Status:
+    if len(frame) < REPLY_HEADER_SIZE + _STATUS_STRUCT.size:
+        raise ValueError(
+            "Truncated status reply {}: expected at least {} bytes".format(
+                bytes(frame).hex(), REPLY_HEADER_SIZE + _STATUS_STRUCT.size
+            )
+        )
+    flags, speed, position, length, diameter, roller_type = _STATUS_STRUCT.unpack_from(frame, REPLY_HEADER_SIZE)
+    return AM43Status(flags, speed, position if position != POSITION_UNKNOWN else None, length, diameter, roller_type)
+
+
+def _payload_byte(frame: Blob, offset: int) -> int:
+    if len(frame) <= offset:
+        raise ValueError("Truncated reply {}: expected at least {} bytes".format(bytes(frame).hex(), offset + 1))
+    return frame[offset]
+
+
+def decode_battery(frame: Blob) -> int:
+    return _payload_byte(frame, 7)
+
+
+def decode_light(frame: Blob) -> int:
+    return _payload_byte(frame, 4)
+
+
+def decode_ack(frame: Blob) -> bool:
+    return _payload_byte(frame, REPLY_HEADER_SIZE) == ACK_OK
+
+
+_DECODERS = {
+    Cmd.GET_POSITION: decode_status,
+    Cmd.GET_BATTERY: decode_battery,
+    Cmd.GET_LIGHT: decode_light,
+    Cmd.MOVE: decode_ack,
+    Cmd.SET_POSITION: decode_ack,
+    Cmd.LOGIN: decode_ack,
+}
+
+
+def decode_reply(frame: Blob) -> Tuple[int, Any]:
+    """
+    :return: tuple (command, decoded value)
+    :raises ValueError: for malformed or unknown frame
+    """
+    if len(frame) < REPLY_HEADER_SIZE or frame[0] != REPLY_MARKER:
+        raise ValueError("Not a reply frame: {}".format(bytes(frame).hex()))
+    decoder = _DECODERS.get(frame[1])
+    if decoder is None:
+        raise ValueError("Unknown reply 0x{:02X}".format(frame[1]))
+    return frame[1], decoder(frame)
+
+
+def iter_frames(stream: Blob) -> Iterator[memoryview]:
+    """
+    Splits concatenated reply frames into memoryview slices without copying.
+    Garbage between frames is skipped, incomplete trailing frame is ignored.
+    """
+    view = memoryview(stream)
+    size = len(view)
+    pos = 0
+    while pos + REPLY_HEADER_SIZE <= size:
+        if view[pos] != REPLY_MARKER:
+            pos += 1
+            continue
+        end = pos + REPLY_HEADER_SIZE + view[pos + 2] + 1
+        if end > size:
+            break
+        yield view[pos:end]
+        pos = end
+
+
+def decode_batch(frames: Iterable[Blob], skip_invalid: bool = True) -> Iterator[Tuple[int, Any]]:
+    """
+    Decodes sequence of reply frames e.g. recorded traffic. Combine with iter_frames to parse a raw stream.
+    :param skip_invalid: silently skip frames which can't be decoded instead of raising ValueError
+    """
+    for frame in frames:
+        try:
+            yield decode_reply(frame)
+        except ValueError:
+            if not skip_invalid:
+                raise
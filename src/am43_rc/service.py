@@ -14,11 +14,25 @@
 #    You should have received a copy of the GNU General Public License
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import bleak
-from typing import List, Any, Optional
+import asyncio
+import time
 
-from am43_rc.entity import AM43State
-from ble_proxy.backend.bleak import BleakBLEConnection
+from typing import List, Any, Optional, Dict, Callable, Tuple
+
+from am43_rc.cache import AM43StateCache
+from am43_rc import protocol
+from am43_rc.entity import AM43State, AM43StateChange
+from am43_rc.motion import MotionHandle, MotionResult, MotionTracker, MotionOutcome
+from am43_rc.protocol import AM43Status
+from ble_proxy.backend import BackendSpec
+from ble_proxy.broadcast import Broadcaster, Subscription
+from ble_proxy.commands import CommandPriority
+from ble_proxy.metrics import MetricsSink
+from ble_proxy.response import LengthPrefixedFrameAssembler
+from ble_proxy.scanner import Advertisement
+from ble_proxy.scheduler import OperationKind
+from ble_proxy.store import DeviceMetadataStore
+from ble_proxy.timing import ReconnectPolicy
 from ble_proxy.ble import (
     BLEConnection,
     BLEDevice,
@@ -26,139 +40,407 @@ from ble_proxy.ble import (
     BLEDeviceInfo,
     AddrOrBLEDevInfo,
 )
+from ble_proxy.utils import none_throws, SingleFlight
 
 
 class AM43Device(BLEDevice):
-    CONTROL_SERVICE_UUID = "0000fe50-0000-1000-8000-00805f9b34fb"
-    CONTROL_RW_CHARACTERISTIC_UUID = "0000fe51-0000-1000-8000-00805f9b34fb"
-
-    CMD_PREFIX = bytearray([0x00, 0xFF, 0x00, 0x00, 0x9A])
-    NO_DATA = bytearray([0x01])
-
-    class Cmd:
-        # OPEN_BLINDS = bytearray([0x00, 0xFF, 0x00, 0x00, 0x9A, 0x0D, 0x01, 0x00, 0x96])
-        # CLOSE_BLINDS = bytearray([0x00, 0xFF, 0x00, 0x00, 0x9A, 0x0D, 0x01, 0x64, 0xF2])
-        # STOP_BLINDS = bytearray([0x00, 0xFF, 0x00, 0x00, 0x9A, 0x0A, 0x01, 0xCC, 0x5D])
-        # POSITION_BLINDS_PREFIX = bytearray([0x00, 0xFF, 0x00, 0x00])
-        # POSITION_BLIND_FIXED_CRC_CONTENT = bytearray([0x9A, 0x0D, 0x01])
-        # BATTERY_REQUEST = bytearray([0x00, 0xFF, 0x00, 0x00, 0x9A, 0xA2, 0x01, 0x01, 0x38])
-        # LIGHT_REQUEST = bytearray([0x00, 0xFF, 0x00, 0x00, 0x9A, 0xAA, 0x01, 0x01, 0x30])
-        # POSITION_REQUEST = bytearray([0x00, 0xFF, 0x00, 0x00, 0x9A, 0xA7, 0x01, 0x01, 0x3D])
-        MOVE = 0x0A
-        SET_POSITION = 0x0D
-        GET_POSITION = 0xA7
-        GET_BATTERY = 0xA2
-        GET_LIGHT = 0xAA
-        LOGIN = 0x17
-
-    class MoveOption:
-        MOVE_OPEN = bytearray([0xDD])
-        MOVE_CLOSE = bytearray([0xEE])
-        MOVE_STOP = bytearray([0xCC])
+    CONTROL_SERVICE_UUID = protocol.CONTROL_SERVICE_UUID
+    CONTROL_RW_CHARACTERISTIC_UUID = protocol.CONTROL_RW_CHARACTERISTIC_UUID
+
+    CMD_PREFIX = protocol.CMD_PREFIX
+    REPLY_MARKER = protocol.REPLY_MARKER
+    NO_DATA = protocol.NO_DATA
+    # Whether to reject replies with invalid CRC. Mismatches are counted in metrics either way
+    VERIFY_REPLY_CRC = True
+    MOTION_COALESCE_KEY = "motion"
+    __UNKNOWN = object()
+    # Interval between position reads verifying motion command which ack was lost
+    MOTION_CHECK_INTERVAL = 0.5
+
+    Cmd = protocol.Cmd
+    MoveOption = protocol.MoveOption
 
     class ReplyPrefix:
-        BATTERY = bytearray((0x9A, 0xA2))
-        LIGHT = bytearray((0x9A, 0xAA))
-        POSITION = bytearray((0x9A, 0xA7))
+        BATTERY = protocol.reply_prefix(protocol.Cmd.GET_BATTERY)
+        LIGHT = protocol.reply_prefix(protocol.Cmd.GET_LIGHT)
+        POSITION = protocol.reply_prefix(protocol.Cmd.GET_POSITION)
+        MOVE = protocol.reply_prefix(protocol.Cmd.MOVE)
+        SET_POSITION = protocol.reply_prefix(protocol.Cmd.SET_POSITION)
 
-    def __init__(self, connection: BLEConnection) -> None:
+    def __init__(self, connection: BLEConnection, state_cache: Optional[AM43StateCache] = None) -> None:
+        """
+        :param state_cache: if set, battery/light/position reads are served from cache while values are fresh
+        """
         super().__init__(connection)
+        self.state_cache = state_cache
+        # Control characteristic resolved for the current connection
+        self.__control_char: Any = self.CONTROL_RW_CHARACTERISTIC_UUID
+        self._single_flight = SingleFlight()
+        self.state_listeners: List[Callable[["AM43Device", AM43State], None]] = []
+        # Motor speed in % per second observed during the previous moves
+        self.motion_speed: Optional[float] = None
+        self.state_changes: Broadcaster[AM43StateChange] = Broadcaster()
+        self.__known_state: Dict[str, Any] = {}
+        self.__poll_intervals: Dict[Subscription[AM43StateChange], float] = {}
+        self.__poll_task: Optional["asyncio.Task[None]"] = None
 
-    @classmethod
-    def __verify_reply_identifier(cls, expected_prefix: bytearray, blob: bytearray):
-        match = expected_prefix == blob[: len(expected_prefix)]
-        if not match:
-            raise ValueError("Unexpected prefix for reply {}. Expected {}".format(blob, expected_prefix))
+    def __get_cached(self, field: str, max_age: Optional[float]) -> Any:
+        """
+        :return: cache entry or None if value should be read from the device
+        """
+        if self.state_cache is None or max_age == 0:
+            return None
+        return self.state_cache.get(self.address, field, max_age)
 
-    def __calc_crc(self, blob: bytearray) -> int:
-        crc = 0
-        for x in blob:
-            crc = crc ^ x
-        return crc ^ 0xFF
+    def __put_cached(self, field: str, value: Any):
+        """
+        Registers value freshly read from the device: updates cache and notifies watchers if value has changed
+        """
+        if self.state_cache is not None:
+            self.state_cache.put(self.address, field, value)
+        if self.__known_state.get(field, self.__UNKNOWN) != value:
+            self.__known_state[field] = value
+            self.state_changes.publish(
+                AM43StateChange(self.address, {field: value}, AM43State.from_dict(self.__known_state))
+            )
 
-    def __parse_status_blob(self, data):
-        pass
+    def __on_motion_command(self):
+        if self.state_cache is not None:
+            self.state_cache.mark_moving(self.address)
+
+    def __verify_reply_identifier(self, command: int, blob: bytearray, coalesced=False):
+        """
+        :param coalesced: if True command might have been superseded by the newer motion command sharing its reply
+        """
+        if coalesced and len(blob) > 1 and blob[1] in protocol.MOTION_COMMANDS:
+            command = blob[1]
+        try:
+            protocol.verify_reply(blob, command)
+        except ValueError:
+            self.__count_reply_error(command, "unexpected")
+            raise
+        if not protocol.is_crc_valid(blob):
+            self.__count_reply_error(command, "crc")
+            if self.VERIFY_REPLY_CRC:
+                raise ValueError("CRC mismatch for reply {}".format(bytes(blob).hex()))
+            self._logger.warning("CRC mismatch for reply {}, accepted".format(bytes(blob).hex()))
+
+    def __count_reply_error(self, command: int, reason: str):
+        if self.metrics.enabled:
+            self.metrics.inc(
+                "am43_reply_errors_total", address=self.address, command=protocol.command_name(command), reason=reason
+            )
 
     def on_state_data_received(self, sender, data):
         self._logger.info("Received data: ", str(data))
 
     async def _on_connection_established(self):
-        await self.configure_default_response_pipeline(self.CONTROL_RW_CHARACTERISTIC_UUID)
+        self.__control_char = await self.resolve_characteristic(self.CONTROL_RW_CHARACTERISTIC_UUID)
+        # Reply frame: 0x9A <command> <payload length> <payload> <crc>
+        await self.configure_default_response_pipeline(
+            self.__control_char,
+            LengthPrefixedFrameAssembler(self.REPLY_MARKER, length_offset=2, trailer_size=1),
+        )
+
+    async def read_state(self, partial=False, max_age: Optional[float] = None) -> AM43State:
+        """
+        Reads battery, light and position. All three queries are sent back to back and replies are collected as
+        they arrive so the whole read takes roughly a single round trip.
+
+        :param partial: if True failed fields are reported in AM43State.errors instead of raising an exception
+        :param max_age: max acceptable age of cached values in seconds. None - use cache TTLs, 0 - bypass cache
+        :return: device state
+        """
+        return await self._single_flight.run(
+            (self.address, "read_state", partial, max_age), lambda: self.__read_state(partial, max_age)
+        )
 
-    async def read_state(self):
+    async def __read_state(self, partial: bool, max_age: Optional[float]) -> AM43State:
         # Invalidate state
         self.__state = None
-        self.__state = AM43State(
-            battery=await self.read_battery_status(),
-            light=await self.read_light_status(),
-            position=await self.read_position(),
+        battery, light, status = await asyncio.gather(
+            self.read_battery_status(max_age),
+            self.read_light_status(max_age),
+            self.__read_position_status(max_age),
+            return_exceptions=True,
         )
+        values: Dict[str, Any] = dict(battery=battery, light=light, position=status)
+        for value in values.values():
+            # Cancellation and alike must never be swallowed
+            if isinstance(value, BaseException) and (not partial or not isinstance(value, Exception)):
+                raise value
+        errors: Dict[str, Exception] = {k: v for k, v in values.items() if isinstance(v, Exception)}
+        if "position" not in errors:
+            values["position"], values["status"] = status  # type: ignore[misc]
+        self.__state = AM43State(errors=errors, **{k: v for k, v in values.items() if k not in errors})
+        for listener in self.state_listeners:
+            listener(self, self.__state)
         return self.__state
 
-    async def __send_command(self, command: int, params: bytearray) -> bytearray:
-        data = bytearray(self.CMD_PREFIX)
-        data.append(command)
-        data.append(len(params))
-        data += params
-        data.append(self.__calc_crc(data))
-        return await self._send_char_command(self.CONTROL_RW_CHARACTERISTIC_UUID, data)
+    async def __send_frame(
+        self,
+        command: int,
+        frame: bytes,
+        priority: int = CommandPriority.NORMAL,
+        coalesce_key: Optional[str] = None,
+    ) -> bytearray:
+        started = time.monotonic() if self.metrics.enabled else 0.0
+        reply = await self._send_char_command(
+            self.__control_char,
+            frame,  # type: ignore[arg-type]
+            reply_prefix=protocol.reply_prefix(command),
+            idempotent=command in protocol.IDEMPOTENT_COMMANDS,
+            priority=priority,
+            coalesce_key=coalesce_key,
+        )
+        if self.metrics.enabled:
+            self.metrics.observe(
+                "am43_command_seconds",
+                time.monotonic() - started,
+                address=self.address,
+                command=protocol.command_name(command),
+            )
+        reply = none_throws(reply)
+        self.__verify_reply_identifier(command, reply, coalesced=coalesce_key is not None)
+        return reply
 
-    async def read_battery_status(self) -> int:
-        data = await self.__send_command(self.Cmd.GET_BATTERY, self.NO_DATA)
-        self.__verify_reply_identifier(self.ReplyPrefix.BATTERY, data)
-        return data[7]
+    async def __send_motion(
+        self, command: int, frame: bytes, target: Optional[int], wait: bool, priority: int = CommandPriority.NORMAL
+    ) -> Optional[MotionHandle]:
+        """
+        Sends motion command. Motion commands still waiting in the queue are dropped in favour of the newest one.
+        :param target: position motor is expected to reach, None for stop
+        :param wait: if False returns as soon as the command is written, ack is awaited in background
+        """
+        self.__on_motion_command()
+        if wait:
+            await self.__send_frame(command, frame, priority, self.MOTION_COALESCE_KEY)
+            return None
+        reply = await self._submit_char_command(
+            self.__control_char,
+            frame,  # type: ignore[arg-type]
+            reply_prefix=protocol.reply_prefix(command),
+            priority=priority,
+            coalesce_key=self.MOTION_COALESCE_KEY,
+        )
+        return MotionHandle(
+            self.address, command, target, asyncio.ensure_future(self.__confirm_motion(command, reply, target))
+        )
 
-    async def read_light_status(self) -> int:
-        data = await self.__send_command(self.Cmd.GET_LIGHT, self.NO_DATA)
-        self.__verify_reply_identifier(self.ReplyPrefix.LIGHT, data)
-        return data[4]
+    async def __confirm_motion(
+        self, command: int, reply: "asyncio.Future[bytearray]", target: Optional[int]
+    ) -> MotionResult:
+        try:
+            frame = none_throws(await reply)
+        except asyncio.TimeoutError:
+            self._logger.info("Motion command ack from {} was lost. Verifying by position".format(self.address))
+            return await self.__verify_motion(target)
+        self.__verify_reply_identifier(command, frame, coalesced=True)
+        acknowledged = protocol.decode_ack(frame)
+        return MotionResult(acknowledged, acknowledged)
 
-    async def read_position(self) -> Optional[int]:
+    async def __verify_motion(self, target: Optional[int]) -> MotionResult:
+        """
+        Reads position twice MOTION_CHECK_INTERVAL apart. Motion is confirmed if position moves towards the target
+        (or reached it), stop is confirmed if position doesn't change
+        """
+        first = await self.read_position(max_age=0)
+        await asyncio.sleep(self.MOTION_CHECK_INTERVAL)
+        last = await self.read_position(max_age=0)
+        if first is None or last is None:
+            confirmed = False
+        elif target is None:
+            confirmed = first == last
+        else:
+            confirmed = last == target or abs(last - target) < abs(first - target)
+        return MotionResult(confirmed, None, last)
+
+    async def __query(self, command: int, frame: bytes) -> bytearray:
+        """
+        Sends query command. Identical concurrent queries share a single BLE request and its reply
+        """
+        return await self._single_flight.run((self.address, command), lambda: self.__send_frame(command, frame))
+
+    async def read_battery_status(self, max_age: Optional[float] = None) -> int:
+        cached = self.__get_cached(AM43StateCache.FIELD_BATTERY, max_age)
+        if cached is not None:
+            return cached.value
+        battery = protocol.decode_battery(await self.__query(self.Cmd.GET_BATTERY, protocol.Frames.GET_BATTERY))
+        self.__put_cached(AM43StateCache.FIELD_BATTERY, battery)
+        return battery
+
+    async def read_light_status(self, max_age: Optional[float] = None) -> int:
+        cached = self.__get_cached(AM43StateCache.FIELD_LIGHT, max_age)
+        if cached is not None:
+            return cached.value
+        light = protocol.decode_light(await self.__query(self.Cmd.GET_LIGHT, protocol.Frames.GET_LIGHT))
+        self.__put_cached(AM43StateCache.FIELD_LIGHT, light)
+        return light
+
+    async def read_status(self) -> AM43Status:
+        """
+        Reads full motor status: position, configuration flags, speed, shade length, roller diameter and type
+        """
+        status = protocol.decode_status(await self.__query(self.Cmd.GET_POSITION, protocol.Frames.GET_POSITION))
+        self.__put_cached(AM43StateCache.FIELD_POSITION, status.position)
+        return status
+
+    async def read_position(self, max_age: Optional[float] = None) -> Optional[int]:
         """
         Returns current position in percents.
+        :param max_age: max acceptable age of cached value in seconds. None - use cache TTL, 0 - bypass cache
         :return: Curent position in %. None means limits are not set so it's impossible to determine position
         """
-        data = await self.__send_command(self.Cmd.GET_POSITION, self.NO_DATA)
-        self.__verify_reply_identifier(self.ReplyPrefix.POSITION, data)
-        # * Bytes in this packet are:
-        #  *  3: Configuration flags, bits are:
-        #  *    1: direction
-        #  *    2: operation mode
-        #  *    3: top limit set
-        #  *    4: bottom limit set
-        #  *    5: has light sensor
-        #  *  4: Speed setting
-        #  *  5: Current position
-        #  *  6,7: Shade length.
-        #  *  8: Roller diameter.
-        #  *  9: Roller type.
-        pos = data[5]
-        return pos if pos != 255 else None
-
-    async def set_position(self, position: int):
-        if 0 < position > 100:
+        cached = self.__get_cached(AM43StateCache.FIELD_POSITION, max_age)
+        if cached is not None:
+            return cached.value
+        return (await self.read_status()).position
+
+    async def __read_position_status(self, max_age: Optional[float]) -> Tuple[Optional[int], Optional[AM43Status]]:
+        """
+        :return: tuple (position, status). Status is None if position was served from cache
+        """
+        cached = self.__get_cached(AM43StateCache.FIELD_POSITION, max_age)
+        if cached is not None:
+            return cached.value, None
+        status = await self.read_status()
+        return status.position, status
+
+    async def set_position(self, position: int, wait=True) -> Optional[MotionHandle]:
+        """
+        :param wait: if False returns once command is written. Returned handle resolves when the device acks the command
+        :return: motion handle if wait is False, otherwise None
+        """
+        if not isinstance(position, int) or not 0 <= position <= 100:
             raise ValueError("Position should be in percent (integer 0-100). Got " + str(position))
+        return await self.__send_motion(self.Cmd.SET_POSITION, protocol.Frames.SET_POSITION[position], position, wait)
 
-        await self.__send_command(self.Cmd.SET_POSITION, bytearray([position]))
+    async def open(self, wait=True) -> Optional[MotionHandle]:
+        return await self.__send_motion(self.Cmd.MOVE, protocol.Frames.OPEN, 0, wait)
 
-    async def open(self):
-        await self.__send_command(self.Cmd.MOVE, self.MoveOption.MOVE_OPEN)
+    async def close(self, wait=True) -> Optional[MotionHandle]:
+        return await self.__send_motion(self.Cmd.MOVE, protocol.Frames.CLOSE, 100, wait)
+
+    async def stop(self, wait=True) -> Optional[MotionHandle]:
+        """
+        Stops the motor. Stop jumps ahead of all commands waiting in the device queue and isn't superseded by motion
+        commands issued while it waits
+        """
+        return await self.__send_motion(self.Cmd.MOVE, protocol.Frames.STOP, None, wait, CommandPriority.URGENT)
 
-    async def close(self):
-        await self.__send_command(self.Cmd.MOVE, self.MoveOption.MOVE_CLOSE)
+    def track_motion(self, target: Optional[int] = None, tolerance: int = 0, **kwargs: Any) -> MotionTracker:
+        """
+        Creates tracker following the motion by polling position with adaptive interval. See MotionTracker for
+        the additional arguments.
+        :param target: expected final position. None - track until motion stops
+        """
+
+        def on_finished(tracker: MotionTracker):
+            if tracker.speed is not None:
+                self.motion_speed = tracker.speed
+
+        return MotionTracker(
+            lambda: self.read_position(max_age=0),
+            target,
+            tolerance,
+            initial_speed=self.motion_speed,
+            on_finished=on_finished,
+            **kwargs,
+        )
 
-    async def stop(self):
-        await self.__send_command(self.Cmd.MOVE, self.MoveOption.MOVE_STOP)
+    async def wait_until_position(self, position: int, timeout: Optional[float] = None, tolerance: int = 0) -> bool:
+        """
+        Waits until blind reaches the position or stalls.
+        :return: True if position was reached, False if blind stopped elsewhere
+        :raises asyncio.TimeoutError: if blind is still moving after timeout seconds
+        """
+        return await self.track_motion(position, tolerance).wait(timeout) == MotionOutcome.REACHED
+
+    def watch(
+        self, poll_interval: Optional[float] = None, maxsize: int = 16, emit_current=True
+    ) -> Subscription[AM43StateChange]:
+        """
+        Subscribes for state changes. Every value read from the device (by any caller) is decoded once and delivered
+        to all subscribers, only changed fields are emitted. If consumer falls behind, buffered changes are merged
+        so memory usage is bounded by maxsize.
+
+        :param poll_interval: if set, state is polled at least that often while subscription is active. Polling is
+                              shared: device is polled once with the smallest interval requested by subscribers
+        :param emit_current: start with the change containing all currently known fields
+        :return: async iterator of state changes. Must be closed once not needed
+        """
+        subscription = self.state_changes.subscribe(maxsize, AM43StateChange.merge)
+        if emit_current and self.__known_state:
+            subscription._put(self.__current_state_change())
+        if poll_interval is not None:
+            self.__poll_intervals[subscription] = poll_interval
+            subscription.on_close.append(self.__on_poll_subscription_closed)
+            if self.__poll_task is None or self.__poll_task.done():
+                self.__poll_task = asyncio.ensure_future(self.__poll())
+        return subscription
+
+    def __current_state_change(self) -> AM43StateChange:
+        known = dict(self.__known_state)
+        return AM43StateChange(self.address, known, AM43State.from_dict(known))
+
+    @property
+    def state_snapshot(self) -> Optional[AM43StateChange]:
+        """
+        :return: all fields read from the device so far as a single change or None if nothing was read yet
+        """
+        return self.__current_state_change() if self.__known_state else None
+
+    def __on_poll_subscription_closed(self, subscription: Subscription[AM43StateChange]):
+        self.__poll_intervals.pop(subscription, None)
+        if not self.__poll_intervals and self.__poll_task is not None:
+            self.__poll_task.cancel()
+            self.__poll_task = None
+
+    async def __poll(self):
+        while self.__poll_intervals:
+            interval = min(self.__poll_intervals.values())
+            try:
+                await self.read_state(partial=True, max_age=interval)
+            except Exception as e:
+                self._logger.warning("Polling state of {} failed: {}".format(self.address, str(e)))
+            await asyncio.sleep(interval)
 
 
 class AM43DeviceManager(BLEDiscoveryManager[AM43Device]):
     DEVICE_NAME_PREFIXES = ["Blind"]
 
-    def __init__(self, iface: str = "hci0") -> None:
-        super().__init__(iface)
+    def __init__(
+        self,
+        iface: str = "hci0",
+        max_connections_per_iface: Optional[int] = None,
+        idle_timeout: Optional[float] = None,
+        ifaces: Optional[List[str]] = None,
+        state_cache: Optional[AM43StateCache] = None,
+        metadata_store: Optional[DeviceMetadataStore] = None,
+        reconnect_policy: Optional[ReconnectPolicy] = None,
+        metrics: Optional[MetricsSink] = None,
+        backend: BackendSpec = None,
+    ) -> None:
+        """
+        :param state_cache: cache shared by all devices created by this manager. None - caching is disabled
+        :param metadata_store: persistent store of known devices and their last known state
+        :param reconnect_policy: if set, lost links are restored in background
+        :param metrics: sink for latency histograms and error counters, see ble_proxy.metrics
+        :param backend: BLE backend name or instance, see ble_proxy.backend. "am43-emulator" runs against emulated
+                        motors without bluetooth hardware (entry point of the installed package, from the source tree
+                        use "am43_rc.emulator:create_backend")
+        """
+        super().__init__(
+            iface, max_connections_per_iface, idle_timeout, ifaces, metadata_store, reconnect_policy, metrics, backend
+        )
+        self.state_cache = state_cache
+        # State changes of all managed devices
+        self.state_changes: Broadcaster[AM43StateChange] = Broadcaster()
+        self.__poll_intervals: Dict[Subscription[AM43StateChange], float] = {}
+        self.__poll_task: Optional["asyncio.Task[None]"] = None
 
     @classmethod
-    def is_target_device(cls, dev: "bleak.backends.device.BLEDevice"):
+    def is_target_device(cls, dev: Advertisement):
         return dev.name and len(list(filter(dev.name.startswith, cls.DEVICE_NAME_PREFIXES))) > 0
 
     @classmethod
@@ -171,10 +453,39 @@ class AM43DeviceManager(BLEDiscoveryManager[AM43Device]):
                     break
         return name.strip()
 
+    async def __scan(self, iface: str, timeout: int) -> List[Advertisement]:
+        async with self._scheduler.slot(iface, OperationKind.SCAN):
+            started = time.monotonic()
+            discovered_devs = await self.backend.discover(iface, timeout)
+            if self.metrics.enabled:
+                self._observe_scan(iface, started)
+        for dev in discovered_devs:
+            self._scheduler.record_rssi(iface, dev.address, dev.rssi)
+        return discovered_devs
+
     async def discover(self, timeout: int = 5) -> List[BLEDeviceInfo]:
+        """
+        Scans on all healthy adapters simultaneously. Device seen by multiple adapters is reported with the best RSSI.
+        If background scanning is active returns devices from the registry immediately.
+        """
+        if self.is_scanning:
+            return self.get_known_devices()
         async with self._lock:
-            discovered_devs = await bleak.discover(timeout)
-        return list(
+            ifaces = self._scheduler.healthy_ifaces or self._scheduler.ifaces
+            scan_results = await asyncio.gather(*[self.__scan(x, timeout) for x in ifaces], return_exceptions=True)
+        errors = [x for x in scan_results if isinstance(x, BaseException)]
+        if len(errors) == len(scan_results):
+            raise errors[0]
+        discovered_devs: Dict[str, Any] = {}
+        for devs in scan_results:
+            if isinstance(devs, BaseException):
+                self._logger.warning("Scan failed on one of adapters: {}".format(str(devs)))
+                continue
+            for dev in devs:
+                known = discovered_devs.get(dev.address)
+                if known is None or (dev.rssi or -1000) > (known.rssi or -1000):
+                    discovered_devs[dev.address] = dev
+        res = list(
             map(
                 lambda dev: BLEDeviceInfo(
                     address=dev.address,
@@ -182,9 +493,73 @@ class AM43DeviceManager(BLEDiscoveryManager[AM43Device]):
                     name=self.compose_device_name(dev.name, dev),
                     rssi=dev.rssi,
                 ),
-                filter(self.is_target_device, discovered_devs),
+                filter(self.is_target_device, discovered_devs.values()),
             )
         )
+        self._remember_discovered(res)
+        return res
+
+    def _on_device_created(self, device: AM43Device):
+        device.state_listeners.append(self.__remember_state)
+        device.state_changes.add_callback(self.state_changes.publish)
+
+    def watch(
+        self, poll_interval: Optional[float] = None, maxsize: int = 64, emit_current=True
+    ) -> Subscription[AM43StateChange]:
+        """
+        Subscribes for state changes of all managed devices including ones connected later. See AM43Device.watch
+        :param poll_interval: if set, all managed devices are polled at least that often while subscription is active
+        :param emit_current: start with the currently known state of every managed device
+        """
+        subscription = self.state_changes.subscribe(
+            maxsize, lambda older, newer: older.merge(newer) if older.address == newer.address else None
+        )
+        if emit_current:
+            for device in self._managed_devices.values():
+                current = device.state_snapshot
+                if current is not None:
+                    subscription._put(current)
+        if poll_interval is not None:
+            self.__poll_intervals[subscription] = poll_interval
+            subscription.on_close.append(self.__on_poll_subscription_closed)
+            if self.__poll_task is None or self.__poll_task.done():
+                self.__poll_task = asyncio.ensure_future(self.__poll())
+        return subscription
+
+    def __on_poll_subscription_closed(self, subscription: Subscription[AM43StateChange]):
+        self.__poll_intervals.pop(subscription, None)
+        if not self.__poll_intervals and self.__poll_task is not None:
+            self.__poll_task.cancel()
+            self.__poll_task = None
+
+    async def __poll_device(self, device: AM43Device, interval: float):
+        try:
+            await device.read_state(partial=True, max_age=interval)
+        except Exception as e:
+            self._logger.warning("Polling state of {} failed: {}".format(device.address, str(e)))
+
+    async def __poll(self):
+        while self.__poll_intervals:
+            interval = min(self.__poll_intervals.values())
+            await asyncio.gather(*[self.__poll_device(x, interval) for x in list(self._managed_devices.values())])
+            await asyncio.sleep(interval)
+
+    def __remember_state(self, device: AM43Device, state: AM43State):
+        if self.metadata_store is not None:
+            known = self.metadata_store.get(device.address)
+            merged = dict(known.state) if known is not None else {}
+            merged.update({k: v for k, v in state.to_dict().items() if k not in state.errors})
+            self.metadata_store.update(device.address, state=merged)
+
+    def get_last_known_state(self, address: str) -> Optional[AM43State]:
+        """
+        :return: the last state read from the device (possibly by previous process) or None if unknown
+        """
+        record = self.metadata_store.get(address) if self.metadata_store is not None else None
+        if record is None or not record.state:
+            return None
+        return AM43State.from_dict(record.state)
 
-    async def build_new_device(self, target: AddrOrBLEDevInfo) -> AM43Device:
-        return AM43Device(BleakBLEConnection(target, self.ble_interface))
+    async def build_new_device(self, target: AddrOrBLEDevInfo, iface: Optional[str] = None) -> AM43Device:
+        connection = self.backend.create_connection(target, iface or self.ble_interface)
+        return AM43Device(connection, state_cache=self.state_cache)
@@ -32,7 +32,7 @@ async def main():
         await device.set_position(20)
         # await device.open()
         # print(await device.read_battery_status())
-        await asyncio.sleep(2)
+        print(await device.wait_until_position(20, timeout=60))
     finally:
         await device_manager.disconnect_all()
 
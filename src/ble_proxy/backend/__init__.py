@@ -0,0 +1,144 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Registry of BLE backends. Backend modules are imported on first use only so importing ble_proxy or applications
+built on top of it doesn't pay for initialization of the bluetooth stack bindings (bleak, dbus) nobody asked for.
+
+Backends are resolved by name:
+    1. registered with register_backend("name", "package.module:factory")
+    2. installed packages exposing "ble_proxy.backends" entry points
+    3. "package.module:factory" reference given instead of the name, e.g. to use backend of not installed package
+The default backend is bleak, could be changed with BLE_PROXY_BACKEND environment variable.
+"""
+
+import abc
+import importlib
+import os
+import threading
+from abc import ABCMeta
+
+from typing import Optional, Any, Dict, List, Callable, Union
+
+from ble_proxy.ble import BLEConnection, AddrOrBLEDevInfo
+from ble_proxy.scanner import AdvertisementScanner, Advertisement
+
+__all__ = (
+    "BLEBackend",
+    "BackendSpec",
+    "ENTRY_POINT_GROUP",
+    "DEFAULT_BACKEND",
+    "register_backend",
+    "get_backend",
+    "available_backends",
+)
+
+ENTRY_POINT_GROUP = "ble_proxy.backends"
+DEFAULT_BACKEND = "bleak"
+
+
+class BLEBackend(metaclass=ABCMeta):
+    """
+    Factory of connections and scanners for the particular BLE library/transport
+    """
+
+    name: str = ""
+
+    @abc.abstractmethod
+    def create_connection(self, target: AddrOrBLEDevInfo, iface: str) -> BLEConnection:
+        pass
+
+    def create_scanner(self, iface: str) -> AdvertisementScanner:
+        raise NotImplementedError("Background scanning is not supported by {} backend".format(self.name))
+
+    @abc.abstractmethod
+    async def discover(self, iface: str, timeout: float) -> List[Advertisement]:
+        """
+        Active scan on the given adapter
+        :return: advertisements of all devices seen during timeout seconds
+        """
+        pass
+
+
+BackendSpec = Union[str, BLEBackend, None]
+BackendFactory = Callable[..., BLEBackend]
+
+# name -> "module:attribute" reference or already resolved factory
+_registry: Dict[str, Union[str, BackendFactory]] = {
+    "bleak": "ble_proxy.backend.bleak:BleakBackend",
+    "simulated": "ble_proxy.backend.simulated:SimulatedBackend",
+    "recording": "ble_proxy.backend.recording:RecordingBackend",
+    "replay": "ble_proxy.backend.replay:ReplayBackend",
+}
+_lock = threading.Lock()
+
+
+def register_backend(name: str, factory: Union[str, BackendFactory]):
+    """
+    :param factory: callable returning BLEBackend or "module:attribute" reference to it. Reference is imported
+                    lazily when backend is requested for the first time
+    """
+    with _lock:
+        _registry[name] = factory
+
+
+def available_backends() -> List[str]:
+    """
+    :return: names of registered backends and ones exposed via entry points. Doesn't import any backend
+    """
+    return sorted(set(_registry.keys()) | set(_entry_points().keys()))
+
+
+def get_backend(spec: BackendSpec = None, **options: Any) -> BLEBackend:
+    """
+    :param spec: backend name, "module:factory" reference, backend instance (returned as is) or None for default
+    :param options: passed to the backend factory
+    :raises ValueError: if backend is unknown
+    """
+    if isinstance(spec, BLEBackend):
+        return spec
+    name = spec or os.environ.get("BLE_PROXY_BACKEND") or DEFAULT_BACKEND
+    return _resolve_factory(name)(**options)
+
+
+def _resolve_factory(name: str) -> BackendFactory:
+    with _lock:
+        factory = _registry.get(name)
+        if factory is None:
+            factory = _entry_points().get(name)
+        if factory is None and ":" in name:
+            factory = name
+        if factory is None:
+            raise ValueError("Unknown BLE backend {}. Available: {}".format(name, ", ".join(sorted(_registry.keys()))))
+        if isinstance(factory, str):
+            factory = _import_ref(factory)
+            _registry[name] = factory
+        return factory
+
+
+def _import_ref(ref: str) -> BackendFactory:
+    module_name, _, attr = ref.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def _entry_points() -> Dict[str, str]:
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:  # Python < 3.8
+        return {}
+    eps: Any = entry_points()
+    group = eps.select(group=ENTRY_POINT_GROUP) if hasattr(eps, "select") else eps.get(ENTRY_POINT_GROUP, ())
+    return {ep.name: ep.value for ep in group}
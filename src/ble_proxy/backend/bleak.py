@@ -15,24 +15,46 @@
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import bleak
+from typing import Optional, Any, List
 
+from ble_proxy.backend import BLEBackend
 from ble_proxy.ble import BLEConnection, AddrOrBLEDevInfo, GattIdentifier
+from ble_proxy.scanner import AdvertisementScanner, AdvertisementCallback, Advertisement
 
 
 class BleakBLEConnection(BLEConnection):
     def __init__(self, target: AddrOrBLEDevInfo, iface: str = "hci0") -> None:
         super().__init__(target, iface)
-        self.__bleak = bleak.BleakClient(self.address, device=self.iface)
+        self.__bleak = bleak.BleakClient(
+            self.address,
+            disconnected_callback=lambda client: self._notify_disconnected(),
+            bluez={"adapter": self.iface},
+        )
 
     async def is_connected(self) -> bool:
-        return await self.__bleak.is_connected()
+        return self.__bleak.is_connected
 
     async def connect(self, timeout: float = 2) -> bool:
-        return await self.__bleak.connect(timeout=timeout)
+        # Raises on failure
+        await self.__bleak.connect(timeout=timeout)
+        return True
 
     async def disconnect(self):
         await self.__bleak.disconnect()
 
+    async def resolve_characteristic(self, characteristic: GattIdentifier, handle_hint: Optional[int] = None) -> Any:
+        # Services are discovered by bleak while connecting, the collection is only looked up here
+        services = self.__bleak.services
+        if handle_hint is not None:
+            # Persisted handle is checked by a single lookup, search by uuid is the fallback for changed GATT layout
+            char = services.get_characteristic(handle_hint)
+            if char is not None and char.uuid.lower() == str(characteristic).lower():
+                return char
+        char = services.get_characteristic(characteristic if isinstance(characteristic, int) else str(characteristic))
+        if char is None:
+            raise ValueError("Characteristic {} not found on {}".format(characteristic, self.address))
+        return char
+
     async def write_gatt_char(self, characteristic: GattIdentifier, data: bytearray, write_with_response: bool = False):
         await self.__bleak.write_gatt_char(characteristic, data, write_with_response)
 
@@ -46,4 +68,36 @@ class BleakBLEConnection(BLEConnection):
         await self.__bleak.start_notify(characteristic, handler)
 
     async def get_all_services(self):
-        return await self.__bleak.get_services()
+        return self.__bleak.services
+
+
+class BleakAdvertisementScanner(AdvertisementScanner):
+    def __init__(self, iface: str = "hci0") -> None:
+        super().__init__(iface)
+        self.__scanner: Optional[bleak.BleakScanner] = None
+
+    async def start(self, callback: AdvertisementCallback):
+        def on_detected(device, advertisement_data):
+            callback(Advertisement(device.address, device.name, advertisement_data.rssi, device))
+
+        self.__scanner = bleak.BleakScanner(detection_callback=on_detected, bluez={"adapter": self.iface})
+        await self.__scanner.start()
+
+    async def stop(self):
+        if self.__scanner is not None:
+            await self.__scanner.stop()
+            self.__scanner = None
+
+
+class BleakBackend(BLEBackend):
+    name = "bleak"
+
+    def create_connection(self, target: AddrOrBLEDevInfo, iface: str) -> BLEConnection:
+        return BleakBLEConnection(target, iface)
+
+    def create_scanner(self, iface: str) -> AdvertisementScanner:
+        return BleakAdvertisementScanner(iface)
+
+    async def discover(self, iface: str, timeout: float) -> List[Advertisement]:
+        found = await bleak.BleakScanner.discover(timeout, return_adv=True, bluez={"adapter": iface})
+        return [Advertisement(device.address, device.name, adv.rssi, device) for device, adv in found.values()]
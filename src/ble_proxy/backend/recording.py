@@ -0,0 +1,165 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from typing import Optional, Any, Dict, List, Union, BinaryIO
+
+from ble_proxy.backend import BLEBackend, BackendSpec, get_backend
+from ble_proxy.ble import BLEConnection, AddrOrBLEDevInfo, GattIdentifier
+from ble_proxy.scanner import AdvertisementScanner, AdvertisementCallback, Advertisement
+from ble_proxy.trace import TraceWriter, TraceEvent, encode_advertisement
+
+
+class RecordingBLEConnection(BLEConnection):
+    """
+    Wraps any BLEConnection and logs all the traffic into the trace. See ble_proxy.trace for the format
+    """
+
+    def __init__(self, connection: BLEConnection, writer: TraceWriter) -> None:
+        super().__init__(connection.address, connection.iface)
+        self.name = connection.name
+        self.connection = connection
+        self.writer = writer
+        # Resolved backend specific characteristic object -> identifier it was resolved from
+        self.__char_keys: Dict[Any, str] = {}
+        connection.set_disconnected_callback(self.__on_disconnected)
+
+    def __on_disconnected(self, connection: BLEConnection):
+        self.writer.record(TraceEvent.LINK_LOST, self.address)
+        self._notify_disconnected()
+
+    def __key(self, characteristic: Any) -> str:
+        try:
+            key = self.__char_keys.get(characteristic)
+        except TypeError:  # unhashable
+            key = None
+        if key is None:
+            key = str(getattr(characteristic, "uuid", characteristic)).lower()
+        return key
+
+    def __record(self, event: int, characteristic: Any = None, data: Union[bytes, bytearray] = b""):
+        self.writer.record(event, self.address, None if characteristic is None else self.__key(characteristic), data)
+
+    async def is_connected(self) -> bool:
+        return await self.connection.is_connected()
+
+    async def connect(self, timeout: float = 2) -> bool:
+        self.__record(TraceEvent.CONNECT)
+        try:
+            result = await self.connection.connect(timeout)
+        except BaseException as e:
+            self.__record(TraceEvent.CONNECT_FAILED, data=type(e).__name__.encode())
+            raise
+        self.__record(TraceEvent.CONNECTED if result else TraceEvent.CONNECT_FAILED)
+        return result
+
+    async def disconnect(self):
+        self.__record(TraceEvent.DISCONNECT)
+        await self.connection.disconnect()
+
+    async def resolve_characteristic(self, characteristic: GattIdentifier, handle_hint: Optional[int] = None) -> Any:
+        resolved = await self.connection.resolve_characteristic(characteristic, handle_hint)
+        try:
+            self.__char_keys[resolved] = str(characteristic).lower()
+        except TypeError:
+            pass
+        return resolved
+
+    async def write_gatt_char(self, characteristic: GattIdentifier, data: bytearray, write_with_response: bool = False):
+        event = TraceEvent.WRITE_WITH_RESPONSE if write_with_response else TraceEvent.WRITE
+        self.__record(event, characteristic, data)
+        try:
+            await self.connection.write_gatt_char(characteristic, data, write_with_response)
+        except BaseException as e:
+            self.__record(TraceEvent.WRITE_FAILED, characteristic, type(e).__name__.encode())
+            raise
+
+    async def write_gatt_descriptor(self, handle: int, data: bytearray):
+        self.__record(TraceEvent.DESCRIPTOR_WRITE, handle, data)
+        await self.connection.write_gatt_descriptor(handle, data)
+
+    async def read_gatt_char(self, characteristic: GattIdentifier) -> bytearray:
+        self.__record(TraceEvent.READ, characteristic)
+        result = await self.connection.read_gatt_char(characteristic)
+        self.__record(TraceEvent.READ_RESULT, characteristic, result)
+        return result
+
+    async def subscribe_for_char_notifications(self, characteristic: GattIdentifier, handler):
+        key = self.__key(characteristic)
+
+        def on_notification(sender: Any, data: bytearray):
+            self.writer.record(TraceEvent.NOTIFY, self.address, key, data)
+            handler(sender, data)
+
+        self.__record(TraceEvent.SUBSCRIBE, characteristic)
+        await self.connection.subscribe_for_char_notifications(characteristic, on_notification)
+
+    async def get_all_services(self) -> Any:
+        return await self.connection.get_all_services()
+
+
+class RecordingAdvertisementScanner(AdvertisementScanner):
+    """
+    Wraps scanner of the recorded backend and logs every advertisement it reports
+    """
+
+    def __init__(self, scanner: AdvertisementScanner, writer: TraceWriter) -> None:
+        super().__init__(scanner.iface)
+        self.scanner = scanner
+        self.writer = writer
+
+    async def start(self, callback: AdvertisementCallback):
+        def on_advertisement(adv: Advertisement):
+            self.writer.record(
+                TraceEvent.SCAN_ADVERTISEMENT, adv.address, None, encode_advertisement(adv.name, adv.rssi)
+            )
+            callback(adv)
+
+        await self.scanner.start(on_advertisement)
+
+    async def stop(self):
+        await self.scanner.stop()
+
+
+class RecordingBackend(BLEBackend):
+    """
+    Records traffic of all connections and discovery results of the wrapped backend into a single trace file
+    """
+
+    name = "recording"
+
+    def __init__(self, path: Union[str, BinaryIO, TraceWriter], inner: BackendSpec = None) -> None:
+        """
+        :param path: trace file, stream or writer shared with other recorders
+        :param inner: backend to record, see get_backend
+        """
+        super().__init__()
+        self.inner = get_backend(inner)
+        self.writer = path if isinstance(path, TraceWriter) else TraceWriter(path)
+
+    def create_connection(self, target: AddrOrBLEDevInfo, iface: str) -> BLEConnection:
+        return RecordingBLEConnection(self.inner.create_connection(target, iface), self.writer)
+
+    def create_scanner(self, iface: str) -> AdvertisementScanner:
+        return RecordingAdvertisementScanner(self.inner.create_scanner(iface), self.writer)
+
+    async def discover(self, iface: str, timeout: float) -> List[Advertisement]:
+        result = await self.inner.discover(iface, timeout)
+        for adv in result:
+            self.writer.record(TraceEvent.ADVERTISEMENT, adv.address, None, encode_advertisement(adv.name, adv.rssi))
+        return result
+
+    def close(self):
+        self.writer.close()
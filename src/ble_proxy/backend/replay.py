@@ -0,0 +1,341 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import logging
+
+from typing import Optional, Any, Dict, List, Union, BinaryIO, Callable
+
+from ble_proxy.backend import BLEBackend
+from ble_proxy.ble import BLEConnection, AddrOrBLEDevInfo, GattIdentifier, BLEDeviceInfo
+from ble_proxy.error import NotConnectedError
+from ble_proxy.scanner import Advertisement, AdvertisementCallback, AdvertisementScanner
+from ble_proxy.trace import TraceRecord, TraceEvent, load_trace, decode_advertisement
+from ble_proxy.utils import none_throws
+
+
+class ReplayMismatch(Exception):
+    """
+    Host action doesn't match the recorded session
+    """
+
+    pass
+
+
+class ReplaySession(object):
+    """
+    Recorded traffic of a single device. Host actions are matched against the recording in order, device events
+    which followed the matched action in the recording (up to the next host action) are its response.
+    """
+
+    def __init__(self, address: str, records: List[TraceRecord]) -> None:
+        super().__init__()
+        self.address = address
+        self.records = records
+        self.position = 0
+        self.mismatches = 0
+
+    @property
+    def finished(self) -> bool:
+        return self.position >= len(self.records)
+
+    def match(self, event: int, characteristic: Optional[str] = None, data: Optional[bytes] = None):
+        """
+        Finds the next recorded occurrence of the action starting from the current position.
+        Action with the same payload is preferred, action with another payload is accepted as a mismatch.
+        :return: tuple (matched record or None, list of response events, True if payload matched)
+        """
+        fallback = None
+        for i in range(self.position, len(self.records)):
+            rec = self.records[i]
+            if rec.event != event or rec.characteristic != characteristic:
+                continue
+            if data is None or rec.data == data:
+                return self.__consume(i) + (True,)
+            if fallback is None:
+                fallback = i
+        if fallback is not None:
+            self.mismatches += 1
+            return self.__consume(fallback) + (False,)
+        self.mismatches += 1
+        return None, [], False
+
+    def __consume(self, index: int):
+        action = self.records[index]
+        end = index + 1
+        while end < len(self.records) and self.records[end].event not in TraceEvent.HOST_ACTIONS:
+            end += 1
+        self.position = end
+        return action, self.records[index + 1 : end]
+
+
+class ReplayBLEConnection(BLEConnection):
+    """
+    Plays recorded session back: writes are answered with the notifications recorded after the same write, connect
+    and read results are reproduced. Timing is reproduced relative to the host action scaled by speed.
+    """
+
+    def __init__(
+        self,
+        target: AddrOrBLEDevInfo,
+        session: ReplaySession,
+        iface: str = "hci0",
+        speed: Optional[float] = 1.0,
+        strict: bool = False,
+    ) -> None:
+        """
+        :param speed: playback speed multiplier. None - as fast as possible, preserving the order of events only
+        :param strict: raise ReplayMismatch if host action doesn't match the recording. Otherwise mismatch is logged
+                       and replay continues, unmatched write gets no response
+        """
+        super().__init__(target, iface)
+        self.session = session
+        self.speed = speed
+        self.strict = strict
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.__connected = False
+        self.__handlers: Dict[str, Callable[[Any, bytearray], None]] = {}
+        self.__last_delivery_at = 0.0
+
+    def __delay(self, action: TraceRecord, event: TraceRecord) -> float:
+        if self.speed is None:
+            return 0
+        return (event.timestamp - action.timestamp) / self.speed
+
+    def __match(self, event: int, characteristic: Optional[str] = None, data: Optional[bytes] = None):
+        action, responses, exact = self.session.match(event, characteristic, data)
+        if not exact:
+            msg = "Action {} {} {} on {} doesn't match the recording".format(
+                event, characteristic or "", (data or b"").hex(), self.address
+            )
+            if self.strict:
+                raise ReplayMismatch(msg)
+            self._logger.warning(msg)
+        return action, responses
+
+    def __schedule(self, action: TraceRecord, responses: List[TraceRecord], started: float):
+        """
+        :param started: loop time when the host action was performed
+        """
+        loop = asyncio.get_event_loop()
+        for rec in responses:
+            if rec.event not in (TraceEvent.NOTIFY, TraceEvent.LINK_LOST):
+                continue
+            # Timers scheduled on the same time are not guaranteed to fire in FIFO order
+            deliver_at = max(started + self.__delay(action, rec), self.__last_delivery_at + 1e-6)
+            self.__last_delivery_at = deliver_at
+            loop.call_at(deliver_at, self.__deliver, rec)
+
+    def __deliver(self, rec: TraceRecord):
+        if not self.__connected:
+            return
+        if rec.event == TraceEvent.LINK_LOST:
+            self.__drop_link()
+            return
+        handler = self.__handlers.get(rec.characteristic or "")
+        if handler is not None:
+            handler(rec.characteristic, bytearray(rec.data))
+
+    def __drop_link(self):
+        if self.__connected:
+            self.__connected = False
+            self.__handlers.clear()
+            self._notify_disconnected()
+
+    @staticmethod
+    def __key(characteristic: Any) -> str:
+        return str(characteristic).lower()
+
+    def __verify_connected(self):
+        if not self.__connected:
+            raise NotConnectedError("Replayed device {} is not connected".format(self.address))
+
+    async def __wait_for(self, action: Optional[TraceRecord], responses: List[TraceRecord], started: float, *events):
+        """
+        Waits for the recorded time of the first response event of the given type
+        :return: response event or None if it wasn't recorded
+        """
+        if action is None:
+            return None
+        for rec in responses:
+            if rec.event in events:
+                delay = started + self.__delay(action, rec) - asyncio.get_event_loop().time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                return rec
+        return None
+
+    async def is_connected(self) -> bool:
+        return self.__connected
+
+    async def connect(self, timeout: float = 2) -> bool:
+        started = asyncio.get_event_loop().time()
+        action, responses = self.__match(TraceEvent.CONNECT)
+        result = await self.__wait_for(action, responses, started, TraceEvent.CONNECTED, TraceEvent.CONNECT_FAILED)
+        if result is None or result.event == TraceEvent.CONNECT_FAILED:
+            raise ConnectionError("Recorded connection to {} failed".format(self.address))
+        self.__connected = True
+        self.__schedule(none_throws(action), responses, started)
+        return True
+
+    async def disconnect(self):
+        self.__match(TraceEvent.DISCONNECT)
+        self.__drop_link()
+
+    async def resolve_characteristic(self, characteristic: GattIdentifier, handle_hint: Optional[int] = None) -> Any:
+        return self.__key(characteristic)
+
+    async def write_gatt_char(self, characteristic: GattIdentifier, data: bytearray, write_with_response: bool = False):
+        self.__verify_connected()
+        started = asyncio.get_event_loop().time()
+        event = TraceEvent.WRITE_WITH_RESPONSE if write_with_response else TraceEvent.WRITE
+        action, responses = self.__match(event, self.__key(characteristic), bytes(data))
+        if action is None:
+            return
+        failure = await self.__wait_for(action, responses, started, TraceEvent.WRITE_FAILED)
+        if failure is not None:
+            if any(x.event == TraceEvent.LINK_LOST for x in responses):
+                self.__drop_link()
+            name = failure.data.decode("utf-8", "replace")
+            if name == "TimeoutError":
+                raise asyncio.TimeoutError("Recorded write to {} timed out".format(self.address))
+            raise NotConnectedError("Recorded write to {} failed with {}".format(self.address, name))
+        self.__schedule(action, responses, started)
+
+    async def write_gatt_descriptor(self, handle: int, data: bytearray):
+        self.__verify_connected()
+        started = asyncio.get_event_loop().time()
+        action, responses = self.__match(TraceEvent.DESCRIPTOR_WRITE, self.__key(handle), bytes(data))
+        if action is not None:
+            self.__schedule(action, responses, started)
+
+    async def read_gatt_char(self, characteristic: GattIdentifier) -> bytearray:
+        self.__verify_connected()
+        started = asyncio.get_event_loop().time()
+        action, responses = self.__match(TraceEvent.READ, self.__key(characteristic))
+        result = await self.__wait_for(action, responses, started, TraceEvent.READ_RESULT)
+        if result is None:
+            raise asyncio.TimeoutError("There is no recorded read result for {}".format(characteristic))
+        return bytearray(result.data)
+
+    async def subscribe_for_char_notifications(self, characteristic: GattIdentifier, handler):
+        self.__verify_connected()
+        started = asyncio.get_event_loop().time()
+        key = self.__key(characteristic)
+        action, responses = self.__match(TraceEvent.SUBSCRIBE, key)
+        self.__handlers[key] = handler
+        if action is not None:
+            self.__schedule(action, responses, started)
+
+    async def get_all_services(self) -> Dict[str, List[str]]:
+        self.__verify_connected()
+        chars = sorted({x.characteristic for x in self.session.records if x.characteristic is not None})
+        return {"": chars}
+
+
+class ReplayAdvertisementScanner(AdvertisementScanner):
+    """
+    Reports advertisements seen by the recorded background scanner, keeping their relative timing scaled by speed.
+    Playback starts from the first recorded advertisement once scanner is started.
+    """
+
+    def __init__(self, iface: str, records: List[TraceRecord], speed: Optional[float] = 1.0) -> None:
+        super().__init__(iface)
+        self.records = records
+        self.speed = speed
+        self.__timers: List[asyncio.TimerHandle] = []
+        self.__callback: Optional[AdvertisementCallback] = None
+
+    async def start(self, callback: AdvertisementCallback):
+        self.__callback = callback
+        if not self.records:
+            return
+        loop = asyncio.get_event_loop()
+        origin = self.records[0].timestamp
+        started = loop.time()
+        for i, rec in enumerate(self.records):
+            delay = 0.0 if self.speed is None else (rec.timestamp - origin) / self.speed
+            # Keep recorded order for advertisements sharing the same time
+            self.__timers.append(loop.call_at(started + delay + i * 1e-6, self.__advertise, rec))
+
+    def __advertise(self, rec: TraceRecord):
+        if self.__callback is None:
+            return
+        name, rssi = decode_advertisement(rec.data)
+        self.__callback(Advertisement(none_throws(rec.address), name, rssi))
+
+    async def stop(self):
+        self.__callback = None
+        for timer in self.__timers:
+            timer.cancel()
+        self.__timers.clear()
+
+
+class ReplayBackend(BLEBackend):
+    """
+    Serves connections from the recorded trace, see ble_proxy.backend.recording.
+    Every device of the trace has a single session shared by all connections to it so reconnects continue playback.
+    Discovery returns devices found by the recorded discovery, background scanners replay recorded scanner reports.
+    """
+
+    name = "replay"
+
+    def __init__(
+        self,
+        path: Union[str, BinaryIO, List[TraceRecord]],
+        speed: Optional[float] = 1.0,
+        strict: bool = False,
+    ) -> None:
+        """
+        :param path: trace file, stream or already loaded records
+        :param speed: playback speed multiplier. None - as fast as possible
+        :param strict: raise ReplayMismatch if host actions diverge from the recording
+        """
+        super().__init__()
+        self.records = path if isinstance(path, list) else load_trace(path)
+        self.speed = speed
+        self.strict = strict
+        self.sessions: Dict[str, ReplaySession] = {}
+        self.advertisements: Dict[str, Advertisement] = {}
+        self.scan_records: List[TraceRecord] = []
+        by_address: Dict[str, List[TraceRecord]] = {}
+        for rec in self.records:
+            if rec.address is None:
+                continue
+            if rec.event == TraceEvent.ADVERTISEMENT:
+                name, rssi = decode_advertisement(rec.data)
+                self.advertisements[rec.address] = Advertisement(rec.address, name, rssi)
+            elif rec.event == TraceEvent.SCAN_ADVERTISEMENT:
+                self.scan_records.append(rec)
+            else:
+                by_address.setdefault(rec.address.upper(), []).append(rec)
+        for address, records in by_address.items():
+            self.sessions[address] = ReplaySession(address, records)
+
+    def create_connection(self, target: AddrOrBLEDevInfo, iface: str) -> BLEConnection:
+        address = (target.address if isinstance(target, BLEDeviceInfo) else target).upper()
+        session = self.sessions.get(address)
+        if session is None:
+            raise ValueError("Device {} is not present in the trace".format(address))
+        return ReplayBLEConnection(target, session, iface, self.speed, self.strict)
+
+    def create_scanner(self, iface: str) -> AdvertisementScanner:
+        return ReplayAdvertisementScanner(iface, self.scan_records, self.speed)
+
+    async def discover(self, iface: str, timeout: float) -> List[Advertisement]:
+        if self.speed is not None:
+            await asyncio.sleep(timeout / self.speed)
+        return list(self.advertisements.values())
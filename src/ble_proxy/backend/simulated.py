@@ -0,0 +1,343 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import abc
+import asyncio
+import logging
+import random
+from abc import ABCMeta
+from uuid import UUID
+
+from typing import Optional, NamedTuple, List, Dict, Tuple, Callable, Any
+
+from ble_proxy.backend import BLEBackend
+from ble_proxy.ble import BLEConnection, AddrOrBLEDevInfo, GattIdentifier, BLEDeviceInfo
+from ble_proxy.error import NotConnectedError
+from ble_proxy.scanner import AdvertisementScanner, AdvertisementCallback, Advertisement
+
+Notification = Tuple[str, bytes]
+
+
+class LinkProfile(NamedTuple):
+    """
+    Radio link characteristics of the simulated connection.
+    All times are in seconds, all rates are probabilities in range 0..1
+    """
+
+    latency: float = 0.01  # one-way delay applied to every write, read and notification
+    jitter: float = 0.0  # random extra delay in range [0, jitter] added on top of latency
+    connect_latency: float = 0.1
+    connect_failure_rate: float = 0.0
+    loss_rate: float = 0.0  # probability for a single write or notification fragment to be lost
+    disconnect_rate: float = 0.0  # probability for the link to drop while serving a write
+    fragment_size: int = 0  # split notifications into chunks of this size, 0 - do not split
+    seed: Optional[int] = None
+
+
+class SimulatedPeripheral(metaclass=ABCMeta):
+    """
+    Device side of the simulated link. Subclass defines GATT layout and reacts on writes.
+    """
+
+    @abc.abstractmethod
+    def get_services(self) -> Dict[str, List[str]]:
+        """
+        :return: mapping service uuid -> list of characteristic uuids
+        """
+        pass
+
+    @abc.abstractmethod
+    def handle_write(self, characteristic: str, data: bytes) -> List[Notification]:
+        """
+        Processes data written into characteristic.
+        :return: list of (characteristic uuid, payload) notifications device sends back
+        """
+        pass
+
+    def handle_read(self, characteristic: str) -> bytearray:
+        return bytearray()
+
+    def on_connect(self):
+        pass
+
+    def on_disconnect(self):
+        pass
+
+
+class SimulatedBLEConnection(BLEConnection):
+    """
+    In-process BLEConnection talking to SimulatedPeripheral over a link with configurable latency, jitter, packet loss,
+    notification splitting and spontaneous disconnects. Doesn't require any bluetooth hardware.
+    """
+
+    def __init__(
+        self,
+        target: AddrOrBLEDevInfo,
+        peripheral: SimulatedPeripheral,
+        iface: str = "hci0",
+        profile: Optional[LinkProfile] = None,
+    ) -> None:
+        super().__init__(target, iface)
+        self.peripheral = peripheral
+        self.profile = profile or LinkProfile()
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.__random = random.Random(self.profile.seed)
+        self.__connected = False
+        self.__handlers: Dict[str, Callable[[Any, bytearray], None]] = {}
+        self.__handles: Dict[str, int] = {}
+        self.__uuids_by_handle: Dict[int, str] = {}
+        self.__last_delivery_at = 0.0
+        self.__index_characteristics()
+
+    def __index_characteristics(self):
+        handle = 0x0E
+        for service_uuid, characteristics in self.peripheral.get_services().items():
+            for char_uuid in characteristics:
+                self.__handles[char_uuid.lower()] = handle
+                self.__uuids_by_handle[handle] = char_uuid.lower()
+                handle += 3  # declaration, value and CCCD
+
+    def __resolve_char(self, characteristic: GattIdentifier) -> str:
+        if isinstance(characteristic, int):
+            uuid = self.__uuids_by_handle.get(characteristic)
+        else:
+            uuid = str(characteristic).lower() if isinstance(characteristic, (str, UUID)) else None
+        if uuid is None or uuid not in self.__handles:
+            raise ValueError("Characteristic {} not found".format(characteristic))
+        return uuid
+
+    def __delay(self, base: float) -> float:
+        if self.profile.jitter > 0:
+            return base + self.__random.uniform(0, self.profile.jitter)
+        return base
+
+    def __is_lost(self, rate: float) -> bool:
+        return rate > 0 and self.__random.random() < rate
+
+    def __verify_connected(self):
+        if not self.__connected:
+            raise NotConnectedError("Simulated device {} is not connected".format(self.address))
+
+    def drop_link(self):
+        """
+        Simulates link loss e.g. device moved out of range
+        """
+        if self.__connected:
+            self._logger.debug("Link to {} dropped".format(self.address))
+            self.__connected = False
+            self.__handlers.clear()
+            self.peripheral.on_disconnect()
+            self._notify_disconnected()
+
+    async def is_connected(self) -> bool:
+        return self.__connected
+
+    async def connect(self, timeout: float = 2) -> bool:
+        delay = self.__delay(self.profile.connect_latency)
+        if delay > timeout:
+            await asyncio.sleep(timeout)
+            raise asyncio.TimeoutError("Connection to {} timed out".format(self.address))
+        await asyncio.sleep(delay)
+        if self.__is_lost(self.profile.connect_failure_rate):
+            raise ConnectionError("Connection to {} failed".format(self.address))
+        self.__connected = True
+        self.peripheral.on_connect()
+        return True
+
+    async def disconnect(self):
+        if self.__connected:
+            await asyncio.sleep(self.__delay(self.profile.latency))
+        self.drop_link()
+
+    async def resolve_characteristic(self, characteristic: GattIdentifier, handle_hint: Optional[int] = None) -> Any:
+        self.__verify_connected()
+        uuid = self.__resolve_char(characteristic)
+        if handle_hint is None or self.__uuids_by_handle.get(handle_hint) != uuid:
+            # Service discovery round trip
+            await asyncio.sleep(self.__delay(self.profile.latency) + self.__delay(self.profile.latency))
+        return self.__handles[uuid]
+
+    async def write_gatt_char(self, characteristic: GattIdentifier, data: bytearray, write_with_response: bool = False):
+        self.__verify_connected()
+        uuid = self.__resolve_char(characteristic)
+        await asyncio.sleep(self.__delay(self.profile.latency))
+        self.__verify_connected()
+        if self.__is_lost(self.profile.disconnect_rate):
+            self.drop_link()
+            raise NotConnectedError("Link to {} lost during write".format(self.address))
+        if self.__is_lost(self.profile.loss_rate):
+            if write_with_response:
+                raise asyncio.TimeoutError("Write to {} was not acknowledged".format(uuid))
+            self._logger.debug("Write to {} lost: {}".format(uuid, bytes(data).hex()))
+            return
+        for notify_uuid, payload in self.peripheral.handle_write(uuid, bytes(data)):
+            self.__schedule_notification(notify_uuid, payload)
+        if write_with_response:
+            await asyncio.sleep(self.__delay(self.profile.latency))
+
+    def __schedule_notification(self, characteristic: str, payload: bytes):
+        loop = asyncio.get_event_loop()
+        size = self.profile.fragment_size if self.profile.fragment_size > 0 else len(payload) or 1
+        for offset in range(0, max(len(payload), 1), size):
+            fragment = payload[offset : offset + size]
+            # Notifications are never reordered by the link layer, only delayed. Event loop doesn't guarantee FIFO
+            # order for timers scheduled on the same time so every next one is scheduled strictly later
+            deliver_at = max(loop.time() + self.__delay(self.profile.latency), self.__last_delivery_at + 1e-6)
+            self.__last_delivery_at = deliver_at
+            if self.__is_lost(self.profile.loss_rate):
+                self._logger.debug("Notification fragment from {} lost: {}".format(characteristic, fragment.hex()))
+                continue
+            loop.call_at(deliver_at, self.__deliver_notification, characteristic.lower(), fragment)
+
+    def __deliver_notification(self, characteristic: str, fragment: bytes):
+        handler = self.__handlers.get(characteristic)
+        if handler is None or not self.__connected:
+            return
+        handler(self.__handles[characteristic], bytearray(fragment))
+
+    async def write_gatt_descriptor(self, handle: int, data: bytearray):
+        self.__verify_connected()
+        await asyncio.sleep(self.__delay(self.profile.latency))
+
+    async def read_gatt_char(self, characteristic: GattIdentifier) -> bytearray:
+        self.__verify_connected()
+        uuid = self.__resolve_char(characteristic)
+        await asyncio.sleep(self.__delay(self.profile.latency) + self.__delay(self.profile.latency))
+        self.__verify_connected()
+        return bytearray(self.peripheral.handle_read(uuid))
+
+    async def subscribe_for_char_notifications(self, characteristic: GattIdentifier, handler):
+        self.__verify_connected()
+        uuid = self.__resolve_char(characteristic)
+        await asyncio.sleep(self.__delay(self.profile.latency))
+        self.__handlers[uuid] = handler
+
+    async def get_all_services(self) -> Dict[str, List[str]]:
+        self.__verify_connected()
+        return self.peripheral.get_services()
+
+
+class SimulatedAdvertisementScanner(AdvertisementScanner):
+    """
+    Emits advertisements of the given devices periodically. Every device advertises with its own random phase,
+    RSSI is reported with random noise and some advertisements are lost according to the link profile.
+    """
+
+    def __init__(
+        self,
+        iface: str = "hci0",
+        advertisements: Optional[List[Advertisement]] = None,
+        interval: float = 0.1,
+        rssi_noise: float = 3,
+        profile: Optional[LinkProfile] = None,
+    ) -> None:
+        """
+        :param advertisements: devices to advertise, RSSI is used as the mean value
+        :param interval: advertising interval in seconds
+        """
+        super().__init__(iface)
+        self.advertisements = list(advertisements or [])
+        self.interval = interval
+        self.rssi_noise = rssi_noise
+        self.profile = profile or LinkProfile()
+        self.__random = random.Random(self.profile.seed)
+        self.__timers: Dict[str, asyncio.TimerHandle] = {}
+        self.__callback: Optional[AdvertisementCallback] = None
+
+    async def start(self, callback: AdvertisementCallback):
+        self.__callback = callback
+        loop = asyncio.get_event_loop()
+        for adv in self.advertisements:
+            phase = self.__random.uniform(0, self.interval)
+            self.__timers[adv.address] = loop.call_later(phase, self.__advertise, adv)
+
+    def __advertise(self, adv: Advertisement):
+        self.__timers[adv.address] = asyncio.get_event_loop().call_later(
+            self.interval + self.__random.uniform(0, self.profile.jitter), self.__advertise, adv
+        )
+        if self.__callback is None or self.__is_lost():
+            return
+        rssi = adv.rssi
+        if rssi is not None and self.rssi_noise > 0:
+            rssi = int(round(self.__random.gauss(rssi, self.rssi_noise)))
+        self.__callback(adv._replace(rssi=rssi))
+
+    def __is_lost(self) -> bool:
+        return self.profile.loss_rate > 0 and self.__random.random() < self.profile.loss_rate
+
+    async def stop(self):
+        self.__callback = None
+        for timer in self.__timers.values():
+            timer.cancel()
+        self.__timers.clear()
+
+
+class SimulatedBackend(BLEBackend):
+    """
+    Backend serving simulated peripherals. Peripheral is created on the first connection to the address and kept for
+    the backend lifetime so its state survives reconnects.
+    """
+
+    name = "simulated"
+
+    def __init__(
+        self,
+        peripheral_factory: Optional[Callable[[str], SimulatedPeripheral]] = None,
+        advertisements: Optional[List[Advertisement]] = None,
+        profile: Optional[LinkProfile] = None,
+        advertising_interval: float = 0.1,
+    ) -> None:
+        """
+        :param peripheral_factory: creates peripheral for the given address. None - only peripherals added with
+                                   add_peripheral are reachable
+        :param advertisements: devices reported by discovery and background scanning
+        """
+        super().__init__()
+        self.peripheral_factory = peripheral_factory
+        self.advertisements = list(advertisements or [])
+        self.profile = profile or LinkProfile()
+        self.advertising_interval = advertising_interval
+        self.peripherals: Dict[str, SimulatedPeripheral] = {}
+
+    def add_peripheral(self, address: str, peripheral: SimulatedPeripheral, name: Optional[str] = None, rssi=-60):
+        """
+        :param name: advertised name. None - peripheral is connectable but not advertised
+        """
+        self.peripherals[address.upper()] = peripheral
+        if name is not None:
+            self.advertisements.append(Advertisement(address.upper(), name, rssi))
+
+    def get_peripheral(self, address: str) -> SimulatedPeripheral:
+        address = address.upper()
+        peripheral = self.peripherals.get(address)
+        if peripheral is None:
+            if self.peripheral_factory is None:
+                raise ValueError("There is no simulated peripheral with address {}".format(address))
+            peripheral = self.peripherals[address] = self.peripheral_factory(address)
+        return peripheral
+
+    def create_connection(self, target: AddrOrBLEDevInfo, iface: str) -> BLEConnection:
+        address = target.address if isinstance(target, BLEDeviceInfo) else target
+        return SimulatedBLEConnection(target, self.get_peripheral(address), iface, self.profile)
+
+    def create_scanner(self, iface: str) -> AdvertisementScanner:
+        return SimulatedAdvertisementScanner(
+            iface, self.advertisements, self.advertising_interval, profile=self.profile
+        )
+
+    async def discover(self, iface: str, timeout: float) -> List[Advertisement]:
+        await asyncio.sleep(timeout)
+        return list(self.advertisements)
@@ -17,12 +17,41 @@
 import abc
 import asyncio
 import logging
+import time
 from abc import ABCMeta
+from contextlib import asynccontextmanager, AsyncExitStack
 from uuid import UUID
 
-from typing import Optional, NamedTuple, Union, List, Any, Dict, TypeVar, Generic
-
+from typing import (
+    Optional,
+    NamedTuple,
+    Union,
+    List,
+    Any,
+    Dict,
+    TypeVar,
+    Generic,
+    Callable,
+    Awaitable,
+    AsyncIterator,
+    Set,
+    Hashable,
+    Tuple,
+    TYPE_CHECKING,
+)
+
+from ble_proxy.commands import CommandQueue, CommandPriority, CommandSuperseded, QueueStats
 from ble_proxy.error import NotConnectedError
+from ble_proxy.metrics import MetricsSink, NULL_METRICS
+from ble_proxy.pool import ConnectionPool, PoolStats
+from ble_proxy.response import ResponseDemultiplexer, FrameAssembler
+from ble_proxy.scanner import AdvertisementScanner, Advertisement, DeviceRegistry, RegistryEntry
+from ble_proxy.scheduler import AdapterScheduler, OperationKind
+from ble_proxy.store import DeviceMetadataStore
+from ble_proxy.timing import RTTEstimator, RetryPolicy, LinkStats, ReconnectPolicy
+
+if TYPE_CHECKING:
+    from ble_proxy.backend import BLEBackend, BackendSpec
 from ble_proxy.utils import none_throws
 
 
@@ -49,6 +78,20 @@ class BLEConnection(metaclass=ABCMeta):
             self.name = None
         else:
             raise ValueError("Device must be specified either by mac address or by BLEDeviceInfo instance")
+        self._disconnected_callback: Optional[Callable[["BLEConnection"], None]] = None
+
+    def set_disconnected_callback(self, callback: Optional[Callable[["BLEConnection"], None]]):
+        """
+        :param callback: called when link is lost (including disconnect initiated by disconnect() call)
+        """
+        self._disconnected_callback = callback
+
+    def _notify_disconnected(self):
+        """
+        Should be called by backend once link is lost
+        """
+        if self._disconnected_callback is not None:
+            self._disconnected_callback(self)
 
     @abc.abstractmethod
     async def is_connected(self) -> bool:
@@ -62,6 +105,17 @@ class BLEConnection(metaclass=ABCMeta):
     async def disconnect(self):
         pass
 
+    async def resolve_characteristic(self, characteristic: GattIdentifier, handle_hint: Optional[int] = None) -> Any:
+        """
+        Resolves characteristic into the backend specific object which could be passed to write, read and subscribe
+        methods instead of uuid to avoid lookup on every call. Result is valid for the current connection only.
+        Default implementation returns identifier as is.
+
+        :param handle_hint: previously resolved handle of the characteristic, allows to skip service lookup
+        :return: backend specific characteristic object
+        """
+        return characteristic
+
     @abc.abstractmethod
     async def write_gatt_char(self, characteristic: GattIdentifier, data: bytearray, write_with_response: bool = False):
         pass
@@ -88,25 +142,42 @@ class BLEDevice(metaclass=ABCMeta):
         super().__init__()
         self._connection = connection
         self._has_connect_attempts = False
-        self._notification_bytes: Optional[bytearray] = None
-        self._read_state_event: Optional[asyncio.Event] = asyncio.Event()
+        self._link_up = False
+        self._responses = ResponseDemultiplexer()
+        # Hook invoked before every command, used by ConnectionPool for usage tracking and re-connection
+        self._on_use: Optional[Callable[["BLEDevice"], Awaitable[None]]] = None
+        self._scheduler: Optional[AdapterScheduler] = None
+        # Resolved characteristic uuid -> GATT handle
+        self.gatt_handles: Dict[str, int] = {}
+        # Reply timeout adapts to the round trip time of this particular link
+        self.rtt = RTTEstimator()
+        self.metrics: MetricsSink = NULL_METRICS
+        self.retry_policy = RetryPolicy()
+        self._commands = CommandQueue()
+        # Lost link is restored in background according to the policy. None - no automatic reconnection
+        self.reconnect_policy: Optional[ReconnectPolicy] = None
+        self.disconnect_count = 0
+        self.reconnect_count = 0
+        self._disconnecting = False
+        self._reconnected: Optional["asyncio.Future[None]"] = None
+        self._reconnect_task: Optional["asyncio.Task[None]"] = None
         self._lock = asyncio.Lock()
         self._logger = logging.getLogger(self.__class__.__name__)
+        connection.set_disconnected_callback(lambda _: self._on_link_lost())
 
-    def _default_notification_handler(self, sender, data):
-        # Todo: It is possible to get multiple notifications for single command have to figure out how to
-        #  deal with this...
-        if self._notification_bytes is None:
-            self._notification_bytes = data
+    @asynccontextmanager
+    async def _operation_slot(self, kind: str) -> AsyncIterator[None]:
+        """
+        Waits for the adapter scheduler (if any) to allow the operation of the given kind
+        """
+        if self._scheduler is None or self.iface not in self._scheduler.ifaces:
+            yield
         else:
-            self._notification_bytes += data
-        # Notify waiters
-        if self._read_state_event is not None:
-            self._read_state_event.set()
+            async with self._scheduler.slot(self.iface, kind):
+                yield
 
-    async def _wait_for_read_event(self):
-        if self._read_state_event is not None:
-            await self._read_state_event.wait()
+    def _default_notification_handler(self, sender, data):
+        self._responses.feed(data)
 
     async def _on_connection_established(
         self,
@@ -115,6 +186,19 @@ class BLEDevice(metaclass=ABCMeta):
         for notifications"""
         pass
 
+    async def resolve_characteristic(self, char: GattIdentifier) -> Any:
+        """
+        Resolves characteristic for the current connection and remembers its handle in gatt_handles so that the next
+        connection (possibly in another process, see DeviceMetadataStore) could skip the lookup.
+        Should be called from _on_connection_established, resolved object should be used for writes and subscriptions.
+        """
+        key = str(char).lower()
+        resolved = await self._connection.resolve_characteristic(char, self.gatt_handles.get(key))
+        handle = resolved if isinstance(resolved, int) else getattr(resolved, "handle", None)
+        if isinstance(handle, int):
+            self.gatt_handles[key] = handle
+        return resolved
+
     async def verify_connected(self):
         """
         :return:
@@ -126,42 +210,363 @@ class BLEDevice(metaclass=ABCMeta):
     async def connect(self, timeout: float = 2):
         async with self._lock:
             if not await self.is_connected():
-                await self._connection.connect(timeout=timeout)
+                started = time.monotonic() if self.metrics.enabled else 0.0
+                try:
+                    async with self._operation_slot(OperationKind.CONNECT):
+                        await self._connection.connect(timeout=timeout)
+                except BaseException:
+                    if self.metrics.enabled:
+                        self.__observe("ble_connect_seconds", time.monotonic() - started, result="error")
+                    raise
+                if self.metrics.enabled:
+                    self.__observe("ble_connect_seconds", time.monotonic() - started, result="ok")
                 self._has_connect_attempts = True
+                self._link_up = True
                 await self._on_connection_established()
-                # TODO: shall we subscribe for disconnect callback and change status?
                 # TODO: shall we check services to determine if device is compatible
 
+    def __observe(self, name: str, value: float, **labels: Any):
+        self.metrics.observe(name, value, address=self.address, iface=self.iface, **labels)
+
+    def __inc(self, name: str, **labels: Any):
+        self.metrics.inc(name, address=self.address, iface=self.iface, **labels)
+
     async def is_connected(self):
         if not self._has_connect_attempts:
             return False
         try:
-            return await self._connection.is_connected()
+            connected = await self._connection.is_connected()
         except Exception:
             self._logger.error("Is Connected: Failed to verify connection status")
             return False
+        if not connected and self._link_up:
+            self._on_link_lost()  # Backend didn't report disconnect
+        return connected
 
     async def disconnect(self):
+        self.__cancel_reconnect()
         async with self._lock:
-            if self._has_connect_attempts and await self.is_connected():
-                await self._connection.disconnect()
+            self._disconnecting = True
+            try:
+                if self._has_connect_attempts and await self.is_connected():
+                    await self._connection.disconnect()
+            finally:
+                self._disconnecting = False
+            self._link_up = False
+            self._responses.reset(NotConnectedError("Device {} disconnected".format(self.address)))
+
+    def _on_link_lost(self):
+        """
+        Called by the connection once link is lost. Fails commands waiting for replies and starts reconnection
+        if reconnect_policy is set. Disconnects requested by disconnect() are ignored
+        """
+        if self._disconnecting or not self._link_up:
+            return
+        self._logger.warning("Link to {} lost".format(self.address))
+        self._link_up = False
+        self.disconnect_count += 1
+        if self.metrics.enabled:
+            self.__inc("ble_link_lost_total")
+        self._responses.reset(NotConnectedError("Link to {} lost".format(self.address)))
+        if self.reconnect_policy is not None:
+            self.__start_reconnect()
+
+    @property
+    def is_reconnecting(self) -> bool:
+        return self._reconnect_task is not None and not self._reconnect_task.done()
+
+    def __start_reconnect(self):
+        if self.is_reconnecting:
+            return
+        self._reconnected = asyncio.get_event_loop().create_future()
+        self._reconnect_task = asyncio.ensure_future(self.__reconnect(none_throws(self.reconnect_policy)))
+
+    def __cancel_reconnect(self):
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+
+    async def __reconnect(self, policy: ReconnectPolicy):
+        waiter = none_throws(self._reconnected)
+        delays = policy.delays()
+        attempt = 1
+        try:
+            while True:
+                try:
+                    # Connect through the pool (if any) so the adapter connection limits are respected
+                    if self._on_use is not None:
+                        await self._on_use(self)
+                    else:
+                        await self.connect(policy.connect_timeout)
+                    self.reconnect_count += 1
+                    if self.metrics.enabled:
+                        self.__inc("ble_reconnects_total")
+                    self._logger.info("Link to {} restored after {} attempt(s)".format(self.address, attempt))
+                    waiter.set_result(None)
+                    return
+                except Exception as e:
+                    delay = next(delays, None)
+                    if delay is None:
+                        self._logger.error("Giving up reconnecting to {}: {}".format(self.address, str(e)))
+                        waiter.set_exception(NotConnectedError("Unable to restore link to {}".format(self.address)))
+                        return
+                    self._logger.warning(
+                        "Reconnect to {} failed ({}). Next attempt in {:.1f}s".format(self.address, str(e), delay)
+                    )
+                    attempt += 1
+                    await asyncio.sleep(delay)
+        finally:
+            if not waiter.done():
+                waiter.set_exception(NotConnectedError("Reconnecting to {} was cancelled".format(self.address)))
+            waiter.exception()  # Nobody might be waiting, mark as retrieved
+
+    async def _wait_for_link(self):
+        """
+        Waits for reconnection in progress (if any) so that commands issued while link is being restored aren't failed
+        :raises NotConnectedError: if link couldn't be restored within reconnect_policy.wait_timeout
+        """
+        waiter = self._reconnected
+        if waiter is None or waiter.done():
+            return
+        timeout = self.reconnect_policy.wait_timeout if self.reconnect_policy is not None else None
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except asyncio.TimeoutError:
+            raise NotConnectedError("Link to {} wasn't restored within {}s".format(self.address, timeout))
 
     async def _send_char_command(
-        self, char: GattIdentifier, command: bytearray, expect_reply=True, write_with_response=False
-    ):
-        async with self._lock:
-            self._notification_bytes = None
-            await self._connection.write_gatt_char(char, command, write_with_response=write_with_response)
-            if expect_reply:
-                none_throws(self._read_state_event).clear()
-                await asyncio.wait_for(self._wait_for_read_event(), timeout=1)  # TODO: Const!
-                return self._notification_bytes
+        self,
+        char: GattIdentifier,
+        command: bytearray,
+        expect_reply=True,
+        write_with_response=False,
+        reply_prefix: bytes = b"",
+        idempotent=False,
+        priority: int = CommandPriority.NORMAL,
+        coalesce_key: Optional[Hashable] = None,
+    ) -> Optional[bytearray]:
+        """
+        Writes command into characteristic and waits for the reply notification.
+        Writes are ordered by the command queue, it is held only for the write so multiple commands could wait for
+        their replies simultaneously.
+        Reply timeout is derived from the measured round trip time (see RTTEstimator). Idempotent commands are
+        re-sent on timeout according to retry_policy.
+
+        :param reply_prefix: prefix the reply frame starts with. Used for matching reply with the request, empty
+                             prefix matches any incoming frame
+        :param idempotent: True if sending command multiple times has the same effect as sending it once
+        :param priority: see CommandPriority. Commands with lower value are written first
+        :param coalesce_key: command which is still waiting in the queue is dropped when a newer command with the
+                             same key is submitted, its caller receives the result of the newer one
+        :return: reply frame or None if reply isn't expected
+        """
+        started = time.monotonic() if self.metrics.enabled else 0.0
+        outcome = self.__new_outcome(coalesce_key)
+        try:
+            result = await self.__send_char_command_with_retries(
+                char,
+                command,
+                expect_reply,
+                write_with_response,
+                reply_prefix,
+                idempotent,
+                priority,
+                coalesce_key,
+                outcome,
+            )
+        except CommandSuperseded as e:
+            self._logger.debug("Command {} to {} was superseded".format(bytes(command).hex(), self.address))
+            if self.metrics.enabled:
+                self.__inc("ble_commands_superseded_total")
+            self.__follow_outcome(e.outcome, outcome)
+            return await asyncio.shield(e.outcome)
+        except BaseException as e:
+            self.__fail_outcome(outcome, e)
+            if self.metrics.enabled:
+                self.__observe("ble_command_seconds", time.monotonic() - started, result="error")
+            raise
+        if self.metrics.enabled:
+            self.__observe("ble_command_seconds", time.monotonic() - started, result="ok")
+        if outcome is not None:
+            outcome.set_result(result)
+        return result
+
+    async def _submit_char_command(
+        self,
+        char: GattIdentifier,
+        command: bytearray,
+        reply_prefix: bytes = b"",
+        priority: int = CommandPriority.NORMAL,
+        coalesce_key: Optional[Hashable] = None,
+    ) -> "asyncio.Future[bytearray]":
+        """
+        Non-blocking version of _send_char_command: returns as soon as command is written (or superseded) without
+        waiting for the reply. Command is never retried.
+
+        :return: future resolved with the reply frame. Future could be shared with other callers if command was
+                 superseded, it must not be cancelled
+        """
+        outcome = self.__new_outcome(coalesce_key)
+        try:
+            reply, sent_at = await self.__write_char_command(
+                char, command, True, False, reply_prefix, priority, coalesce_key, outcome
+            )
+        except CommandSuperseded as e:
+            self.__follow_outcome(e.outcome, outcome)
+            return e.outcome
+        except BaseException as e:
+            self.__fail_outcome(outcome, e)
+            raise
+        result = asyncio.ensure_future(self.__wait_reply(none_throws(reply), sent_at, measure_rtt=True))
+        self.__follow_outcome(result, outcome)
+        return result
+
+    @staticmethod
+    def __new_outcome(coalesce_key: Optional[Hashable]) -> Optional["asyncio.Future[Any]"]:
+        """
+        :return: future coalesced commands wait for or None if command can't be coalesced
+        """
+        return asyncio.get_event_loop().create_future() if coalesce_key is not None else None
+
+    @staticmethod
+    def __fail_outcome(outcome: Optional["asyncio.Future[Any]"], error: BaseException):
+        if outcome is None or outcome.done():
+            return
+        if isinstance(error, asyncio.CancelledError):
+            outcome.cancel()  # Superseded commands share the fate of the newer one
+        else:
+            outcome.set_exception(error)
+            outcome.exception()  # Nobody might be waiting, mark as retrieved
+
+    @classmethod
+    def __follow_outcome(cls, source: "asyncio.Future[Any]", target: Optional["asyncio.Future[Any]"]):
+        """
+        Resolves target with the result of source once it is done. Older commands superseded by the command which
+        was superseded itself wait for the target
+        """
+
+        def on_done(f: "asyncio.Future[Any]"):
+            if f.cancelled():
+                cls.__fail_outcome(target, asyncio.CancelledError())
+            elif f.exception() is not None:
+                cls.__fail_outcome(target, f.exception())  # type: ignore[arg-type]
+            elif target is not None and not target.done():
+                target.set_result(f.result())
+
+        source.add_done_callback(on_done)
+
+    async def __send_char_command_with_retries(
+        self,
+        char: GattIdentifier,
+        command: bytearray,
+        expect_reply: bool,
+        write_with_response: bool,
+        reply_prefix: bytes,
+        idempotent: bool,
+        priority: int,
+        coalesce_key: Optional[Hashable],
+        outcome: Optional["asyncio.Future[Any]"],
+    ) -> Optional[bytearray]:
+        attempt = 1
+        while True:
+            try:
+                reply, sent_at = await self.__write_char_command(
+                    char, command, expect_reply, write_with_response, reply_prefix, priority, coalesce_key, outcome
+                )
+                if reply is None:
+                    return None
+                return await self.__wait_reply(reply, sent_at, measure_rtt=attempt == 1)
+            except Exception as e:
+                if not self.retry_policy.should_retry(attempt, e, idempotent):
+                    raise
+                self._logger.debug(
+                    "Command {} to {} failed ({}). Retrying".format(bytes(command).hex(), self.address, e)
+                )
+                self.rtt.retries += 1
+                if self.metrics.enabled:
+                    self.__inc("ble_command_retries_total")
+                attempt += 1
+
+    async def __write_char_command(
+        self,
+        char: GattIdentifier,
+        command: bytearray,
+        expect_reply: bool,
+        write_with_response: bool,
+        reply_prefix: bytes,
+        priority: int,
+        coalesce_key: Optional[Hashable],
+        outcome: Optional["asyncio.Future[Any]"],
+    ) -> Tuple[Optional["asyncio.Future[bytearray]"], float]:
+        """
+        Waits for the turn in command queue and writes command
+        :return: tuple (future of the expected reply or None, time the write started)
+        """
+        await self._wait_for_link()
+        if self._on_use is not None:
+            await self._on_use(self)
+        loop = asyncio.get_event_loop()
+        queued_at = loop.time()
+        reply = None
+        try:
+            async with self._commands.turn(priority, coalesce_key, outcome):
+                # Reply is expected only once command is going to be written so that replies are matched in order
+                reply = self._responses.expect(reply_prefix) if expect_reply else None
+                async with self._lock, self._operation_slot(OperationKind.WRITE):
+                    sent_at = loop.time()
+                    if self.metrics.enabled:
+                        # Time spent in the command queue, device lock and adapter scheduler
+                        self.__observe("ble_lock_wait_seconds", sent_at - queued_at)
+                    await self._connection.write_gatt_char(char, command, write_with_response=write_with_response)
+            return reply, sent_at
+        except BaseException:
+            if reply is not None:
+                self._responses.discard(reply)
+            raise
+
+    async def __wait_reply(self, reply: "asyncio.Future[bytearray]", sent_at: float, measure_rtt: bool) -> bytearray:
+        """
+        Waits for the reply until RTT based timeout counted from the moment command was written
+        :param measure_rtt: whether reply time should be used as RTT sample
+        """
+        loop = asyncio.get_event_loop()
+        try:
+            remaining = sent_at + self.rtt.timeout - loop.time()
+            try:
+                result = await asyncio.wait_for(reply, timeout=max(remaining, 0))
+            except asyncio.TimeoutError:
+                self.rtt.on_timeout()
+                if self.metrics.enabled:
+                    self.__inc("ble_reply_timeouts_total")
+                raise
+            # Reply to the retransmitted command could belong to any of the attempts so it isn't sampled
+            if measure_rtt:
+                self.rtt.sample(loop.time() - sent_at)
+            else:
+                self.rtt.on_reply()
+            return result
+        finally:
+            self._responses.discard(reply)
 
     async def _send_descriptor_command(self, handle: int, data: bytearray):
-        async with self._lock:
+        await self._wait_for_link()
+        if self._on_use is not None:
+            await self._on_use(self)
+        async with self._commands.turn(), self._lock, self._operation_slot(OperationKind.WRITE):
             await self._connection.write_gatt_descriptor(handle, data)
 
-    async def configure_default_response_pipeline(self, target_characteristic: GattIdentifier):
+    async def configure_default_response_pipeline(
+        self, target_characteristic: GattIdentifier, assembler: Optional[FrameAssembler] = None
+    ):
+        """
+        Subscribes for notifications of the given characteristic and routes them into response demultiplexer.
+        :param assembler: defines how notification fragments are combined into frames. By default every notification
+                          is considered to be a complete frame
+        """
+        if assembler is not None:
+            self._responses.assembler = assembler
+        # Outstanding requests were already failed on disconnect, the ones sent on the new link must survive
+        self._responses.assembler.reset()
         await self._connection.subscribe_for_char_notifications(
             target_characteristic, self._default_notification_handler
         )
@@ -174,14 +579,93 @@ class BLEDevice(metaclass=ABCMeta):
     def name(self) -> Optional[str]:
         return self._connection.name
 
+    @property
+    def iface(self) -> str:
+        return self._connection.iface
+
+    @property
+    def has_active_connection(self) -> bool:
+        """
+        Last known connection status. Unlike is_connected() doesn't query the backend
+        """
+        return self._link_up
+
+    @property
+    def link_stats(self) -> LinkStats:
+        """
+        Round trip time estimates and reply loss counters of the link
+        """
+        return self.rtt.stats
+
+    @property
+    def queue_stats(self) -> QueueStats:
+        """
+        Depth of the command queue and time commands spend waiting for their turn
+        """
+        return self._commands.stats
+
+    @property
+    def is_busy(self) -> bool:
+        """
+        :return: True if device is sending command or waiting for reply
+        """
+        return (
+            self._lock.locked()
+            or self._commands.is_active
+            or self._commands.depth > 0
+            or self._responses.pending_count > 0
+        )
+
 
 T = TypeVar("T", bound=BLEDevice)
 
 
 class BLEDiscoveryManager(Generic[T]):
-    def __init__(self, iface: str = "hci0") -> None:
-        self.ble_interface = iface
+    def __init__(
+        self,
+        iface: str = "hci0",
+        max_connections_per_iface: Optional[int] = None,
+        idle_timeout: Optional[float] = None,
+        ifaces: Optional[List[str]] = None,
+        metadata_store: Optional[DeviceMetadataStore] = None,
+        reconnect_policy: Optional[ReconnectPolicy] = None,
+        metrics: Optional[MetricsSink] = None,
+        backend: "BackendSpec" = None,
+    ) -> None:
+        """
+        :param iface: bluetooth adapter
+        :param max_connections_per_iface: max number of simultaneously connected devices per adapter. Least recently
+                                          used device is disconnected when limit is reached. None - no limit
+        :param idle_timeout: seconds after which unused device is disconnected. None - never
+        :param ifaces: list of bluetooth adapters to balance devices across. Overrides iface if set
+        :param metadata_store: persistent store of known devices. Loaded on startup so known devices could be
+                               connected without discovery
+        :param reconnect_policy: if set, managed devices restore lost links in background according to the policy
+        :param metrics: sink for latency histograms and error counters of the manager and all managed devices
+        :param backend: BLE backend name (see ble_proxy.backend) or instance. None - default backend.
+                        Backend is imported on first use
+        """
+        self.ble_interfaces = list(ifaces) if ifaces else [iface]
+        self.ble_interface = self.ble_interfaces[0]
         self._managed_devices: Dict["str", T] = {}
+        self._pool = ConnectionPool(max_connections_per_iface, idle_timeout)
+        self._scheduler = AdapterScheduler(self.ble_interfaces, max_connections_per_iface)
+        self._placing: Dict[str, int] = {}
+        self.registry = DeviceRegistry()
+        self._scanners: List[AdvertisementScanner] = []
+        self._discovery_listeners: List[Callable[[BLEDeviceInfo], None]] = []
+        self.metadata_store = metadata_store
+        self.reconnect_policy = reconnect_policy
+        # Pause between connection attempts of connect(attempts > 1)
+        self.connect_retry_delay = 0.5
+        self.metrics = metrics or NULL_METRICS
+        self._backend_spec = backend
+        self._backend: Optional["BLEBackend"] = None
+        if metadata_store is not None:
+            metadata_store.load()
+            for record in metadata_store.records():
+                if record.iface is not None:
+                    self._scheduler.record_rssi(record.iface, record.address, record.rssi)
         self._logger = logging.getLogger(self.__class__.__name__)
         self._lock = asyncio.Lock()
 
@@ -223,6 +707,142 @@ class BLEDiscoveryManager(Generic[T]):
         """
         pass
 
+    @property
+    def backend(self) -> "BLEBackend":
+        if self._backend is None:
+            from ble_proxy.backend import get_backend
+
+            self._backend = get_backend(self._backend_spec)
+        return self._backend
+
+    def build_scanner(self, iface: str) -> AdvertisementScanner:
+        """
+        Creates backend specific passive scanner for the given adapter. Required for background scanning.
+        """
+        return self.backend.create_scanner(iface)
+
+    @property
+    def is_scanning(self) -> bool:
+        return len(self._scanners) > 0
+
+    async def start_background_scan(self, expiry: Optional[float] = None):
+        """
+        Starts passive scanning on all adapters. Advertisements of target devices are collected in the registry so
+        discover() and connect() don't need to wait for a scan.
+        :param expiry: seconds after the last advertisement when device is considered gone
+        """
+        if self.is_scanning:
+            return
+        if expiry is not None:
+            self.registry.expiry = expiry
+        try:
+            for iface in self.ble_interfaces:
+                scanner = self.build_scanner(iface)
+                await scanner.start(lambda adv, iface=iface: self._on_advertisement(iface, adv))  # type: ignore
+                self._scanners.append(scanner)
+        except Exception:
+            await self.stop_background_scan()
+            raise
+
+    async def stop_background_scan(self):
+        scanners, self._scanners = self._scanners, []
+        for scanner in scanners:
+            try:
+                await scanner.stop()
+            except Exception as e:
+                self._logger.warning("Failed to stop scanner on {}: {}".format(scanner.iface, str(e)))
+
+    def _on_advertisement(self, iface: str, adv: Advertisement):
+        self._scheduler.record_rssi(iface, adv.address, adv.rssi)
+        if self.is_target_device(adv):
+            self.registry.update(adv, self.compose_device_name(adv.name or "", adv))
+            if self._discovery_listeners:
+                info = self._registry_entry_to_info(none_throws(self.registry.get(adv.address)))
+                for listener in self._discovery_listeners:
+                    listener(info)
+
+    async def discover_iter(self, timeout: float = 5) -> AsyncIterator[BLEDeviceInfo]:
+        """
+        Streaming version of discover(): yields every target device as soon as its first advertisement is received.
+        If background scanning is active devices already present in the registry are yielded immediately, otherwise
+        temporary scanners are started on all healthy adapters for the duration of iteration.
+
+        :param timeout: max time to listen for advertisements in seconds
+        """
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        queue: "asyncio.Queue[BLEDeviceInfo]" = asyncio.Queue()
+        seen: Set[str] = set()
+        self._discovery_listeners.append(queue.put_nowait)
+        try:
+            async with AsyncExitStack() as stack:
+                if self.is_scanning:
+                    for info in self.get_known_devices():
+                        queue.put_nowait(info)
+                else:
+                    for iface in self._scheduler.healthy_ifaces or self._scheduler.ifaces:
+                        await stack.enter_async_context(self._scheduler.slot(iface, OperationKind.SCAN))
+                        scanner = self.build_scanner(iface)
+                        await scanner.start(lambda adv, iface=iface: self._on_advertisement(iface, adv))  # type: ignore
+                        stack.push_async_callback(scanner.stop)
+                        if self.metrics.enabled:
+                            stack.callback(self._observe_scan, iface, time.monotonic())
+                while True:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        return
+                    try:
+                        info = await asyncio.wait_for(queue.get(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        return
+                    if info.address not in seen:
+                        seen.add(info.address)
+                        yield info
+        finally:
+            self._discovery_listeners.remove(queue.put_nowait)
+
+    def _observe_scan(self, iface: str, started: float):
+        self.metrics.observe("ble_scan_seconds", time.monotonic() - started, iface=iface)
+
+    async def find(self, address_or_name: str, timeout: float = 5) -> Optional[BLEDeviceInfo]:
+        """
+        Looks for the device with the given address or name. Scanning stops as soon as the device is found.
+        :return: device info or None if device wasn't seen within timeout
+        """
+
+        def matches(info: BLEDeviceInfo) -> bool:
+            return info.address.upper() == address_or_name.upper() or address_or_name in (
+                info.name,
+                info.bt_device_name,
+            )
+
+        known = self.registry.get(address_or_name.upper()) or self.registry.find_by_name(address_or_name)
+        if known is not None:
+            return self._registry_entry_to_info(known)
+        discovered = self.discover_iter(timeout)
+        try:
+            async for info in discovered:
+                if matches(info):
+                    return info
+        finally:
+            await discovered.aclose()  # type: ignore[attr-defined]
+        return None
+
+    @classmethod
+    def _registry_entry_to_info(cls, entry: RegistryEntry) -> BLEDeviceInfo:
+        return BLEDeviceInfo(
+            address=entry.address,
+            bt_device_name=entry.bt_device_name,
+            name=entry.name,
+            rssi=int(round(entry.rssi)) if entry.rssi is not None else -127,
+        )
+
+    def get_known_devices(self) -> List[BLEDeviceInfo]:
+        """
+        :return: devices currently present in the registry of the background scanner
+        """
+        return [self._registry_entry_to_info(x) for x in self.registry.entries()]
+
     @classmethod
     def _get_addr_for_target(cls, target: AddrOrBLEDevInfo) -> str:
         """
@@ -240,40 +860,137 @@ class BLEDiscoveryManager(Generic[T]):
         return address
 
     @abc.abstractmethod
-    async def build_new_device(self, target: AddrOrBLEDevInfo) -> T:
+    async def build_new_device(self, target: AddrOrBLEDevInfo, iface: Optional[str] = None) -> T:
+        """
+        :param iface: bluetooth adapter device should be connected through. None - default one
+        """
         pass
 
-    async def connect(self, target: AddrOrBLEDevInfo, timeout: float = 5, attempts=1) -> T:
+    def _link_counts(self) -> Dict[str, int]:
+        """
+        :return: number of connected or currently connecting devices per adapter
+        """
+        counts = self._pool.link_counts()
+        for iface, placing in self._placing.items():
+            counts[iface] = counts.get(iface, 0) + placing
+        return counts
+
+    async def _place_device(self, target: AddrOrBLEDevInfo) -> T:
+        """
+        Returns managed device for the target, creates it on the most suitable adapter if needed.
+        Disconnected device bound to the failing adapter is moved to another one.
+        """
         address = self._get_addr_for_target(target)
         device = self._managed_devices.get(address, None)
+        if device is not None and not device.has_active_connection and not self._scheduler.is_healthy(device.iface):
+            iface = self._scheduler.choose_adapter(address, self._link_counts())
+            if iface != device.iface:
+                self._logger.info("Moving {} from adapter {} to {}".format(address, device.iface, iface))
+                self._pool.remove(device)
+                device = None
         if device is None:  # If not found in managed devices list
-            device = await self.build_new_device(target)
+            iface = self._scheduler.choose_adapter(address, self._link_counts())
+            self._placing[iface] = self._placing.get(iface, 0) + 1
+            try:
+                device = await self.build_new_device(target, iface)
+            finally:
+                self._placing[iface] -= 1
+            device._scheduler = self._scheduler
+            device.reconnect_policy = self.reconnect_policy
+            device.metrics = self.metrics
+            record = self.metadata_store.get(address) if self.metadata_store is not None else None
+            if record is not None:
+                device.gatt_handles.update(record.handles)
             self._managed_devices[address] = device
-        # if not await device.is_connected():
+            self._on_device_created(device)
+        return device
+
+    def _on_device_created(self, device: T):
+        """
+        Called once new managed device is created. Could be overridden by subclass e.g. to subscribe for updates
+        """
+        pass
+
+    def _remember_device(self, device: T):
+        if self.metadata_store is None:
+            return
+        self.metadata_store.update(
+            device.address,
+            name=device.name,
+            iface=device.iface,
+            rssi=self._scheduler.get_rssi(device.iface, device.address),
+            handles=dict(device.gatt_handles) or None,
+        )
+
+    def _remember_discovered(self, devices: List[BLEDeviceInfo]):
+        if self.metadata_store is None:
+            return
+        for info in devices:
+            self.metadata_store.update(info.address, name=info.name, bt_device_name=info.bt_device_name, rssi=info.rssi)
+
+    async def connect(self, target: AddrOrBLEDevInfo, timeout: float = 5, attempts=1) -> T:
+        address = self._get_addr_for_target(target)
+        if isinstance(target, str):
+            known = self.registry.get(address)
+            record = self.metadata_store.get(address) if self.metadata_store is not None else None
+            if known is not None:
+                target = self._registry_entry_to_info(known)
+            elif record is not None:
+                target = BLEDeviceInfo(address, record.bt_device_name, record.name, record.rssi or -127)
         attempts_left = attempts
         while attempts_left > 0:
             current_attempt = (attempts - attempts_left) + 1
+            device = await self._place_device(target)
+            # Count device as occupying the link slot while connecting so concurrent placements are balanced
+            self._placing[device.iface] = self._placing.get(device.iface, 0) + 1
             try:
-                await device.connect(timeout)
+                await self._pool.connect(device, timeout)
+                if self.metrics.enabled:
+                    self.metrics.inc("ble_connect_attempts_total", iface=device.iface, result="ok")
+                if isinstance(target, BLEDeviceInfo):
+                    self._remember_discovered([target])
+                self._remember_device(device)
                 return device
             except Exception as e:
+                if self.metrics.enabled:
+                    self.metrics.inc("ble_connect_attempts_total", iface=device.iface, result="error")
                 if attempts == 1:
                     raise e
                 self._logger.warning("Connection failed. Attempt #{} Re-connecting...".format(current_attempt))
                 attempts_left -= 1
-                await asyncio.sleep(0.5)
+                await asyncio.sleep(self.connect_retry_delay)
+            finally:
+                self._placing[device.iface] -= 1
         raise RuntimeError("Connection to device {} failed after {} attempts".format(address, attempts))
 
+    @property
+    def pool_stats(self) -> PoolStats:
+        return self._pool.stats
+
+    def get_link_stats(self) -> Dict[str, LinkStats]:
+        """
+        :return: link quality estimates of all managed devices keyed by address
+        """
+        return {addr: dev.link_stats for addr, dev in self._managed_devices.items()}
+
     async def disconnect_all(self):
         """
-        Disconnects all currently connected devices.
+        Disconnects all currently connected devices and stops background scanning.
         All errors will be logged and suppressed
         :return: None
         """
+        await self.stop_background_scan()
+        if self.metadata_store is not None:
+            try:
+                self.metadata_store.save()
+            except Exception as e:
+                self._logger.warning("Unable to save device metadata: {}".format(str(e)))
         for addr, dev in list(self._managed_devices.items()):
             try:
                 self._logger.info("Disconnecting {}...".format(dev.address))
                 await dev.disconnect()
+                self._pool.remove(dev)
                 del self._managed_devices[addr]
             except Exception as e:
                 self._logger.exception("Unable to disconnect device {}: {}".format(dev.address, str(e)))
+        self._pool.close()
@@ -0,0 +1,174 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import logging
+from collections import deque
+
+from typing import Optional, Generic, TypeVar, Callable, List, Deque, Any, AsyncIterator
+
+__all__ = ("Subscription", "Broadcaster")
+
+T = TypeVar("T")
+
+_logger = logging.getLogger("Broadcaster")
+
+
+class Subscription(AsyncIterator[T]):
+    """
+    Bounded buffer of items published by Broadcaster for a single consumer. Iterate over it to receive items.
+    When consumer is slower than publisher and the buffer is full the newest item is merged into the last buffered
+    one (if merge function is provided and items could be merged) or the oldest item is dropped, so memory usage is
+    bounded.
+    """
+
+    def __init__(
+        self,
+        broadcaster: "Broadcaster[T]",
+        maxsize: int = 16,
+        merge: Optional[Callable[[T, T], Optional[T]]] = None,
+    ) -> None:
+        """
+        :param maxsize: max number of buffered items
+        :param merge: combines buffered item with the newer one, e.g. joins two deltas. Returns None if items
+                      can't be merged
+        """
+        super().__init__()
+        if maxsize < 1:
+            raise ValueError("Subscription buffer size must be positive")
+        self.maxsize = maxsize
+        self.merge = merge
+        self.overflows = 0  # number of items merged or dropped due to slow consumer
+        self._broadcaster = broadcaster
+        self._items: Deque[T] = deque()
+        self._waiter: Optional["asyncio.Future[None]"] = None
+        self._closed = False
+        self.on_close: List[Callable[["Subscription[T]"], None]] = []
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def __len__(self):
+        return len(self._items)
+
+    def _put(self, item: T):
+        if self._closed:
+            return
+        if len(self._items) >= self.maxsize:
+            self.overflows += 1
+            merged = self.merge(self._items[-1], item) if self.merge is not None else None
+            if merged is not None:
+                self._items[-1] = merged
+            else:
+                self._items.popleft()
+                self._items.append(item)
+        else:
+            self._items.append(item)
+        self.__wake_up()
+
+    def __wake_up(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def close(self):
+        """
+        Unsubscribes. Iteration stops once buffered items are consumed
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._broadcaster._unsubscribe(self)
+        self.__wake_up()
+        for callback in self.on_close:
+            callback(self)
+
+    def get_nowait(self) -> Optional[T]:
+        return self._items.popleft() if self._items else None
+
+    async def get(self) -> T:
+        """
+        :raises StopAsyncIteration: if subscription is closed and all items are consumed
+        """
+        while not self._items:
+            if self._closed:
+                raise StopAsyncIteration()
+            self._waiter = asyncio.get_event_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        return self._items.popleft()
+
+    def __aiter__(self) -> "Subscription[T]":
+        return self
+
+    async def __anext__(self) -> T:
+        return await self.get()
+
+    async def __aenter__(self) -> "Subscription[T]":
+        return self
+
+    async def __aexit__(self, *args: Any):
+        self.close()
+
+
+class Broadcaster(Generic[T]):
+    """
+    Fans out published items to any number of subscriptions (async iterators) and callbacks.
+    Item is passed to every subscriber as is, so it must not be modified by consumers.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._subscriptions: List[Subscription[T]] = []
+        self._callbacks: List[Callable[[T], None]] = []
+
+    def subscribe(self, maxsize: int = 16, merge: Optional[Callable[[T, T], Optional[T]]] = None) -> Subscription[T]:
+        subscription = Subscription(self, maxsize, merge)
+        self._subscriptions.append(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription[T]):
+        if subscription in self._subscriptions:
+            self._subscriptions.remove(subscription)
+
+    def add_callback(self, callback: Callable[[T], None]):
+        self._callbacks.append(callback)
+
+    def remove_callback(self, callback: Callable[[T], None]):
+        if callback in self._callbacks:
+            self._callbacks.remove(callback)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscriptions) + len(self._callbacks)
+
+    def publish(self, item: T):
+        for subscription in self._subscriptions:
+            subscription._put(item)
+        for callback in list(self._callbacks):
+            try:
+                callback(item)
+            except Exception:
+                _logger.exception("Subscriber callback failed")
+
+    def close(self):
+        """
+        Closes all subscriptions
+        """
+        for subscription in list(self._subscriptions):
+            subscription.close()
@@ -0,0 +1,173 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import heapq
+import itertools
+from contextlib import asynccontextmanager
+
+from typing import Optional, NamedTuple, List, Dict, Hashable, Any, AsyncIterator
+
+__all__ = ("CommandPriority", "CommandSuperseded", "QueueStats", "CommandQueue")
+
+
+class CommandPriority:
+    """
+    Lower value is served first
+    """
+
+    URGENT = 0  # e.g. stop motor, preempts everything waiting in the queue
+    NORMAL = 10
+    BACKGROUND = 20  # e.g. periodic polling
+
+
+class CommandSuperseded(Exception):
+    """
+    Raised when pending command was replaced by the newer one with the same coalesce key before being sent.
+    outcome is the future which will be resolved with result of the command which superseded this one.
+    """
+
+    def __init__(self, outcome: "asyncio.Future[Any]") -> None:
+        super().__init__("Command was superseded by the newer one")
+        self.outcome = outcome
+
+
+class QueueStats(NamedTuple):
+    depth: int  # commands currently waiting for their turn
+    max_depth: int
+    executed: int
+    coalesced: int  # commands which were never sent because superseded by the newer ones
+    total_wait: float  # seconds spent by executed commands waiting for their turn
+    max_wait: float
+
+    @property
+    def avg_wait(self) -> float:
+        return self.total_wait / self.executed if self.executed > 0 else 0.0
+
+
+class _Entry(object):
+    __slots__ = ("priority", "seq", "coalesce_key", "outcome", "turn", "enqueued_at")
+
+    def __init__(
+        self, priority: int, seq: int, coalesce_key: Optional[Hashable], outcome: Optional["asyncio.Future[Any]"]
+    ) -> None:
+        self.priority = priority
+        self.seq = seq
+        self.coalesce_key = coalesce_key
+        self.outcome = outcome
+        loop = asyncio.get_event_loop()
+        self.turn: "asyncio.Future[None]" = loop.create_future()
+        self.enqueued_at = loop.time()
+
+    def __lt__(self, other: "_Entry") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class CommandQueue(object):
+    """
+    Orders commands sent to a single device. Only one command holds the turn at a time, waiting commands are served
+    by priority and then in submission order. Pending command with coalesce key is superseded by the newer command
+    with the same key and the same or higher priority: it never gets the turn and its caller receives the result of
+    the newer command instead.
+    Turn is expected to be held for the write only, waiting for reply happens outside so commands are pipelined.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._heap: List[_Entry] = []
+        self._by_key: Dict[Hashable, _Entry] = {}
+        self._active = False
+        self._seq = itertools.count()
+        self._max_depth = 0
+        self._executed = 0
+        self._coalesced = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    @property
+    def depth(self) -> int:
+        return sum(1 for x in self._heap if not x.turn.done())
+
+    @property
+    def is_active(self) -> bool:
+        return self._active
+
+    @property
+    def stats(self) -> QueueStats:
+        return QueueStats(
+            self.depth, self._max_depth, self._executed, self._coalesced, self._total_wait, self._max_wait
+        )
+
+    def __grant_next(self):
+        while not self._active and self._heap:
+            entry = heapq.heappop(self._heap)
+            if entry.turn.done():  # Cancelled or superseded
+                continue
+            if self._by_key.get(entry.coalesce_key) is entry:
+                del self._by_key[entry.coalesce_key]
+            self._active = True
+            wait = asyncio.get_event_loop().time() - entry.enqueued_at
+            self._executed += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+            entry.turn.set_result(None)
+
+    def __release(self):
+        self._active = False
+        self.__grant_next()
+
+    @asynccontextmanager
+    async def turn(
+        self,
+        priority: int = CommandPriority.NORMAL,
+        coalesce_key: Optional[Hashable] = None,
+        outcome: Optional["asyncio.Future[Any]"] = None,
+    ) -> AsyncIterator[None]:
+        """
+        Waits until it is the command's turn and holds it for the duration of the context.
+
+        :param coalesce_key: pending commands with the same key and not higher priority are superseded by this one
+        :param outcome: future resolved by the caller with the command result. Required for coalescing as superseded
+                        callers wait for it
+        :raises CommandSuperseded: if newer command with the same key arrived while this one was waiting
+        """
+        if coalesce_key is not None and outcome is None:
+            raise ValueError("Outcome future is required for coalescing commands")
+        entry = _Entry(priority, next(self._seq), coalesce_key, outcome)
+        if coalesce_key is not None:
+            previous = self._by_key.get(coalesce_key)
+            # Command of lower priority never supersedes the pending one e.g. urgent stop still waiting for its turn
+            # is sent before the following set position instead of being replaced by it
+            if previous is not None and not previous.turn.done() and priority <= previous.priority:
+                previous.turn.set_exception(CommandSuperseded(outcome))  # type: ignore[arg-type]
+                self._coalesced += 1
+            self._by_key[coalesce_key] = entry
+        heapq.heappush(self._heap, entry)
+        self._max_depth = max(self._max_depth, self.depth)
+        self.__grant_next()
+        try:
+            await entry.turn
+        except asyncio.CancelledError:
+            if entry.turn.done() and not entry.turn.cancelled() and entry.turn.exception() is None:
+                self.__release()  # Turn was granted right before cancellation
+            elif self._by_key.get(coalesce_key) is entry:
+                del self._by_key[coalesce_key]
+            entry.turn.cancel()
+            raise
+        try:
+            yield
+        finally:
+            self.__release()
@@ -0,0 +1,165 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import bisect
+import math
+import threading
+
+from typing import Dict, Tuple, List, Sequence, Optional, Any
+
+__all__ = ("MetricsSink", "NULL_METRICS", "InMemoryMetrics", "Histogram", "render_prometheus")
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class MetricsSink(object):
+    """
+    Receives counters and histogram observations. Base implementation discards everything.
+    Instrumented code checks `enabled` before measuring anything so the default sink costs a single attribute lookup.
+    """
+
+    enabled = False
+
+    def inc(self, name: str, value: float = 1, **labels: Any):
+        pass
+
+    def observe(self, name: str, value: float, **labels: Any):
+        pass
+
+
+NULL_METRICS = MetricsSink()
+
+
+class Histogram(object):
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        :return: approximate quantile (upper bound of the bucket containing it)
+        """
+        if self.count == 0:
+            return math.nan
+        rank = q * self.count
+        total = 0
+        for i, count in enumerate(self.counts):
+            total += count
+            if total >= rank:
+                return self.buckets[i] if i < len(self.buckets) else math.inf
+        return math.inf
+
+
+class InMemoryMetrics(MetricsSink):
+    """
+    Keeps counters and histograms in memory. Could be rendered in Prometheus text format with render_prometheus
+    """
+
+    enabled = True
+
+    def __init__(
+        self, buckets: Sequence[float] = DEFAULT_BUCKETS, bucket_overrides: Optional[Dict[str, Sequence[float]]] = None
+    ) -> None:
+        """
+        :param buckets: default histogram bucket upper bounds in seconds
+        :param bucket_overrides: metric name -> buckets for histograms which need a different scale
+        """
+        super().__init__()
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_overrides = {k: tuple(sorted(v)) for k, v in (bucket_overrides or {}).items()}
+        self.counters: Dict[str, Dict[LabelSet, float]] = {}
+        self.histograms: Dict[str, Dict[LabelSet, Histogram]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def __labels(labels: Dict[str, Any]) -> LabelSet:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels: Any):
+        key = self.__labels(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: Any):
+        key = self.__labels(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self.bucket_overrides.get(name, self.buckets))
+            histogram.observe(value)
+
+    def get_counter(self, name: str, **labels: Any) -> float:
+        return self.counters.get(name, {}).get(self.__labels(labels), 0)
+
+    def get_histogram(self, name: str, **labels: Any) -> Optional[Histogram]:
+        return self.histograms.get(name, {}).get(self.__labels(labels))
+
+    def clear(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+def _format_labels(labels: LabelSet, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra is not None else [])
+    if not items:
+        return ""
+    escaped = [(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in items]
+    return "{" + ",".join('{}="{}"'.format(k, v) for k, v in escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def render_prometheus(metrics: InMemoryMetrics, prefix: str = "") -> str:
+    """
+    Renders metrics in Prometheus text exposition format (version 0.0.4)
+    """
+    lines: List[str] = []
+    with metrics._lock:
+        for name, series in sorted(metrics.counters.items()):
+            full_name = prefix + name
+            lines.append("# TYPE {} counter".format(full_name))
+            for labels, value in series.items():
+                lines.append("{}{} {}".format(full_name, _format_labels(labels), _format_value(value)))
+        for name, hist_series in sorted(metrics.histograms.items()):
+            full_name = prefix + name
+            lines.append("# TYPE {} histogram".format(full_name))
+            for labels, histogram in hist_series.items():
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + [math.inf], histogram.counts):
+                    cumulative += count
+                    le = ("le", _format_value(bound))
+                    lines.append("{}_bucket{} {}".format(full_name, _format_labels(labels, le), cumulative))
+                lines.append("{}_sum{} {}".format(full_name, _format_labels(labels), _format_value(histogram.sum)))
+                lines.append("{}_count{} {}".format(full_name, _format_labels(labels), histogram.count))
+    return "\n".join(lines) + "\n"
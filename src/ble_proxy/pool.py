@@ -0,0 +1,204 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from typing import Optional, NamedTuple, Dict, List, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ble_proxy.ble import BLEDevice  # noqa: F401
+
+__all__ = ("ConnectionPool", "PoolStats")
+
+
+class PoolStats(NamedTuple):
+    hits: int  # connects and commands served by already connected device
+    misses: int  # connects and commands which had to establish connection
+    evictions: int
+    connected: int
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class ConnectionPool(object):
+    """
+    Keeps track of connected devices per bluetooth adapter.
+    When adapter reaches max_connections_per_iface the least recently used idle device on this adapter is
+    disconnected to free the slot. Devices which haven't been used for idle_timeout seconds are disconnected as well.
+    Evicted device stays registered so it is re-connected transparently once it is used again.
+    """
+
+    def __init__(
+        self,
+        max_connections_per_iface: Optional[int] = None,
+        idle_timeout: Optional[float] = None,
+        connect_timeout: float = 5,
+    ) -> None:
+        """
+        :param max_connections_per_iface: max number of simultaneously connected devices per adapter. None - no limit
+        :param idle_timeout: seconds after which unused device is disconnected. None - never
+        :param connect_timeout: timeout used for transparent re-connections
+        """
+        super().__init__()
+        self.max_connections_per_iface = max_connections_per_iface
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # address -> last used timestamp, ordered from least to most recently used
+        self._last_used: "OrderedDict[str, float]" = OrderedDict()
+        self._devices: Dict[str, "BLEDevice"] = {}
+        self._connecting: Dict[str, int] = {}
+        self._lock = asyncio.Lock()
+        self._idle_watcher: Optional["asyncio.Future[None]"] = None
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+    @property
+    def stats(self) -> PoolStats:
+        connected = len([x for x in self._devices.values() if x.has_active_connection])
+        return PoolStats(self.hits, self.misses, self.evictions, connected)
+
+    def __touch(self, device: "BLEDevice"):
+        self._last_used[device.address] = time.monotonic()
+        self._last_used.move_to_end(device.address)
+
+    def link_counts(self) -> Dict[str, int]:
+        """
+        :return: number of connected devices per adapter
+        """
+        res: Dict[str, int] = {}
+        for dev in self._devices.values():
+            if dev.has_active_connection:
+                res[dev.iface] = res.get(dev.iface, 0) + 1
+        return res
+
+    def _connected_on_iface(self, iface: str) -> List["BLEDevice"]:
+        """
+        :return: connected devices on the given adapter ordered from least to most recently used
+        """
+        return [
+            dev
+            for dev in (self._devices.get(addr) for addr in self._last_used.keys())
+            if dev is not None and dev.iface == iface and dev.has_active_connection
+        ]
+
+    async def __evict(self, device: "BLEDevice", reason: str):
+        self._logger.info("Evicting {} ({})".format(device.address, reason))
+        self.evictions += 1
+        try:
+            await device.disconnect()
+        except Exception as e:
+            self._logger.warning("Failed to disconnect evicted device {}: {}".format(device.address, str(e)))
+
+    async def evict_idle(self):
+        """
+        Disconnects devices which haven't been used for idle_timeout seconds.
+        Called periodically in background while pool has devices and before reserving connection slot.
+        """
+        if self.idle_timeout is None:
+            return
+        threshold = time.monotonic() - self.idle_timeout
+        for addr, last_used in list(self._last_used.items()):
+            if last_used > threshold:
+                break  # Ordered by usage time so the rest are even more recent
+            device = self._devices.get(addr)
+            if device is not None and device.has_active_connection and not device.is_busy:
+                await self.__evict(device, "idle")
+
+    async def __reserve_slot(self, device: "BLEDevice"):
+        async with self._lock:
+            await self.evict_idle()
+            if self.max_connections_per_iface is not None:
+                iface = device.iface
+                candidates = [x for x in self._connected_on_iface(iface) if x is not device and not x.is_busy]
+                used = len(self._connected_on_iface(iface)) + self._connecting.get(iface, 0)
+                while used >= self.max_connections_per_iface and candidates:
+                    await self.__evict(candidates.pop(0), "LRU, adapter {} is full".format(iface))
+                    used -= 1
+                if used >= self.max_connections_per_iface:
+                    self._logger.warning("No free connection slots on {}, all devices are busy".format(iface))
+            self._connecting[device.iface] = self._connecting.get(device.iface, 0) + 1
+
+    async def connect(self, device: "BLEDevice", timeout: Optional[float] = None):
+        """
+        Registers device in the pool and makes sure it is connected, evicting other devices if needed
+        """
+        self._devices[device.address] = device
+        device._on_use = self.acquire
+        self.__touch(device)
+        self.__ensure_idle_watcher()
+        # Explicit connect request is rare, so the cached link state is verified with the backend
+        if device.has_active_connection and await device.is_connected():
+            self.hits += 1
+            return
+        await self.__connect(device, timeout)
+
+    async def __connect(self, device: "BLEDevice", timeout: Optional[float] = None):
+        self.misses += 1
+        await self.__reserve_slot(device)
+        try:
+            await device.connect(timeout if timeout is not None else self.connect_timeout)
+        finally:
+            self._connecting[device.iface] -= 1
+        self.__touch(device)
+
+    async def acquire(self, device: "BLEDevice"):
+        """
+        Hook called by device before sending any command. Re-connects device if it was evicted.
+        Relies on the locally tracked link state: querying the backend would cost an IPC round trip per command
+        """
+        self.__touch(device)
+        if device.has_active_connection:
+            self.hits += 1
+        else:
+            await self.__connect(device)
+
+    def __ensure_idle_watcher(self):
+        if self.idle_timeout is None or (self._idle_watcher is not None and not self._idle_watcher.done()):
+            return
+        self._idle_watcher = asyncio.ensure_future(self.__watch_idle(self.idle_timeout))
+
+    async def __watch_idle(self, idle_timeout: float):
+        # Evicts idle devices even when there is no traffic at all
+        interval = max(idle_timeout / 2, 0.1)
+        while self._devices:
+            await asyncio.sleep(interval)
+            try:
+                async with self._lock:
+                    await self.evict_idle()
+            except Exception:
+                self._logger.exception("Idle connections eviction failed")
+
+    def close(self):
+        """
+        Stops background eviction of idle devices
+        """
+        if self._idle_watcher is not None:
+            self._idle_watcher.cancel()
+            self._idle_watcher = None
+
+    def remove(self, device: "BLEDevice"):
+        if self._devices.get(device.address) is device:
+            del self._devices[device.address]
+            self._last_used.pop(device.address, None)
+        device._on_use = None
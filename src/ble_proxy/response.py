@@ -0,0 +1,154 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import logging
+import time
+
+from typing import List, Optional, Callable, Tuple
+
+__all__ = ("FrameAssembler", "LengthPrefixedFrameAssembler", "ResponseDemultiplexer")
+
+UnsolicitedFrameHandler = Callable[[bytearray], None]
+
+
+class FrameAssembler(object):
+    """
+    Turns stream of notification fragments into complete frames.
+    Default implementation treats every notification as a complete frame.
+    """
+
+    def feed(self, data: bytearray) -> List[bytearray]:
+        return [bytearray(data)]
+
+    def reset(self):
+        pass
+
+
+class LengthPrefixedFrameAssembler(FrameAssembler):
+    """
+    Reassembles frames in format <marker> ... <payload length at length_offset> <payload> ... where the total frame
+    size is length_offset + 1 + payload length + trailer_size.
+    Bytes preceding the marker are considered garbage and dropped. Partial frame is discarded if the next fragment
+    doesn't arrive within max_fragment_gap seconds, so a lost fragment can't corrupt subsequent replies.
+    """
+
+    def __init__(self, marker: int, length_offset: int, trailer_size: int = 0, max_fragment_gap: float = 0.5) -> None:
+        super().__init__()
+        self.marker = marker
+        self.length_offset = length_offset
+        self.trailer_size = trailer_size
+        self.max_fragment_gap = max_fragment_gap
+        self._buffer = bytearray()
+        self._last_fragment_at = 0.0
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+    def feed(self, data: bytearray) -> List[bytearray]:
+        now = time.monotonic()
+        if self._buffer and now - self._last_fragment_at > self.max_fragment_gap:
+            self._logger.debug("Discarding stale partial frame: {}".format(self._buffer.hex()))
+            self._buffer.clear()
+        self._last_fragment_at = now
+        self._buffer += data
+        frames: List[bytearray] = []
+        while self._buffer:
+            start = self._buffer.find(self.marker)
+            if start < 0:
+                self._logger.debug("Dropping unframed bytes: {}".format(self._buffer.hex()))
+                self._buffer.clear()
+                break
+            if start > 0:
+                self._logger.debug("Dropping unframed bytes: {}".format(self._buffer[:start].hex()))
+                del self._buffer[:start]
+            if len(self._buffer) <= self.length_offset:
+                break
+            frame_size = self.length_offset + 1 + self._buffer[self.length_offset] + self.trailer_size
+            if len(self._buffer) < frame_size:
+                break
+            frames.append(self._buffer[:frame_size])
+            del self._buffer[:frame_size]
+        return frames
+
+    def reset(self):
+        self._buffer.clear()
+
+
+class ResponseDemultiplexer(object):
+    """
+    Routes incoming frames to outstanding requests.
+    Each request registers the prefix its reply starts with and gets a future. Frame resolves the oldest pending
+    request with matching prefix. Frames nobody waits for are passed to unsolicited handler (if any) and dropped.
+    """
+
+    def __init__(
+        self, assembler: Optional[FrameAssembler] = None, unsolicited_handler: Optional[UnsolicitedFrameHandler] = None
+    ) -> None:
+        super().__init__()
+        self.assembler = assembler or FrameAssembler()
+        self.unsolicited_handler = unsolicited_handler
+        self._pending: List[Tuple[bytes, "asyncio.Future[bytearray]"]] = []
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def expect(self, prefix: bytes = b"") -> "asyncio.Future[bytearray]":
+        """
+        Registers outstanding request. MUST be called before the request is sent to avoid missing fast reply.
+        :param prefix: reply prefix. Empty prefix matches any frame
+        :return: future which will be resolved with the reply frame
+        """
+        future: "asyncio.Future[bytearray]" = asyncio.get_event_loop().create_future()
+        self._pending.append((bytes(prefix), future))
+        return future
+
+    def discard(self, future: "asyncio.Future[bytearray]"):
+        self._pending = [x for x in self._pending if x[1] is not future]
+        if not future.done():
+            future.cancel()
+        elif not future.cancelled():
+            future.exception()  # Could be failed by reset() while owner wasn't waiting yet, mark as retrieved
+
+    def feed(self, data: bytearray):
+        for frame in self.assembler.feed(data):
+            self.dispatch(frame)
+
+    def dispatch(self, frame: bytearray):
+        for i, (prefix, future) in enumerate(self._pending):
+            if not future.done() and frame[: len(prefix)] == prefix:
+                del self._pending[i]
+                future.set_result(frame)
+                return
+        if self.unsolicited_handler is not None:
+            self.unsolicited_handler(frame)
+        else:
+            self._logger.debug("Unexpected frame: {}".format(frame.hex()))
+
+    def reset(self, exc: Optional[BaseException] = None):
+        """
+        Drops partially received data and fails all outstanding requests with the given exception (cancels them if
+        exception is not provided)
+        """
+        self.assembler.reset()
+        pending, self._pending = self._pending, []
+        for _, future in pending:
+            if future.done():
+                continue
+            if exc is not None:
+                future.set_exception(exc)
+            else:
+                future.cancel()
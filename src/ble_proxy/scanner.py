@@ -0,0 +1,134 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import abc
+import time
+from abc import ABCMeta
+
+from typing import Optional, NamedTuple, Any, Callable, Dict, List
+
+__all__ = ("Advertisement", "AdvertisementCallback", "AdvertisementScanner", "RegistryEntry", "DeviceRegistry")
+
+
+class Advertisement(NamedTuple):
+    address: str
+    name: Optional[str]
+    rssi: Optional[int]
+    raw: Any = None  # device object coming from underlying BLE library(backend)
+
+
+AdvertisementCallback = Callable[[Advertisement], None]
+
+
+class AdvertisementScanner(metaclass=ABCMeta):
+    """
+    Long running passive scanner which streams advertisements received by the adapter
+    """
+
+    def __init__(self, iface: str = "hci0") -> None:
+        super().__init__()
+        self.iface = iface
+
+    @abc.abstractmethod
+    async def start(self, callback: AdvertisementCallback):
+        pass
+
+    @abc.abstractmethod
+    async def stop(self):
+        pass
+
+
+class RegistryEntry(object):
+    def __init__(self, address: str, bt_device_name: str, name: Optional[str], rssi: Optional[float]) -> None:
+        super().__init__()
+        self.address = address
+        self.bt_device_name = bt_device_name
+        self.name = name
+        self.rssi = rssi  # smoothed
+        self.first_seen = time.monotonic()
+        self.last_seen = self.first_seen
+
+    def __repr__(self):
+        return "{} ({}) RSSI: {}".format(self.address, self.name, self.rssi)
+
+
+class DeviceRegistry(object):
+    """
+    In-memory registry of the devices seen by the scanner keyed by address.
+    RSSI is smoothed with exponential moving average, devices not seen for expiry seconds are dropped.
+    """
+
+    def __init__(self, expiry: float = 60, rssi_smoothing: float = 0.3) -> None:
+        """
+        :param expiry: seconds after the last advertisement when device is considered gone
+        :param rssi_smoothing: weight of the new RSSI sample in range 0..1
+        """
+        super().__init__()
+        self.expiry = expiry
+        self.rssi_smoothing = rssi_smoothing
+        self._entries: Dict[str, RegistryEntry] = {}
+
+    def update(self, adv: Advertisement, name: Optional[str] = None) -> bool:
+        """
+        Registers advertisement
+        :param name: user friendly device name, bluetooth name is used if not provided
+        :return: True if device wasn't known before
+        """
+        entry = self._entries.get(adv.address)
+        bt_name = (adv.name or "").strip()
+        if entry is None or self.__is_expired(entry):
+            self._entries[adv.address] = RegistryEntry(adv.address, bt_name, name or bt_name, adv.rssi)
+            return True
+        entry.last_seen = time.monotonic()
+        if bt_name:
+            entry.bt_device_name = bt_name
+            entry.name = name or bt_name
+        if adv.rssi is not None:
+            if entry.rssi is None:
+                entry.rssi = adv.rssi
+            else:
+                entry.rssi += self.rssi_smoothing * (adv.rssi - entry.rssi)
+        return False
+
+    def __is_expired(self, entry: RegistryEntry) -> bool:
+        return time.monotonic() - entry.last_seen > self.expiry
+
+    def get(self, address: str) -> Optional[RegistryEntry]:
+        entry = self._entries.get(address)
+        if entry is None or self.__is_expired(entry):
+            return None
+        return entry
+
+    def find_by_name(self, name: str) -> Optional[RegistryEntry]:
+        for entry in self.entries():
+            if name in (entry.name, entry.bt_device_name):
+                return entry
+        return None
+
+    def entries(self) -> List[RegistryEntry]:
+        self.expire()
+        return list(self._entries.values())
+
+    def expire(self):
+        for addr, entry in list(self._entries.items()):
+            if self.__is_expired(entry):
+                del self._entries[addr]
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self.entries())
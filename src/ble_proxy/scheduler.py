@@ -0,0 +1,194 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+from typing import Optional, List, Dict, Tuple, AsyncIterator, Callable
+
+from ble_proxy.commands import CommandSuperseded
+from ble_proxy.error import NotConnectedError
+
+__all__ = ("OperationKind", "AdapterScheduler", "is_adapter_failure")
+
+
+class OperationKind:
+    CONNECT = "connect"
+    WRITE = "write"
+    SCAN = "scan"
+
+
+# Errors of the bluetooth stack itself, matched by name so backends don't have to be imported
+ADAPTER_ERROR_NAMES = frozenset(("BleakError", "BleakDBusError", "DBusError"))
+# Stack errors which are nevertheless caused by the particular device
+DEVICE_ERROR_NAMES = frozenset(("BleakDeviceNotFoundError",))
+# Errors caused by the particular device (out of range, powered off, connection refused, lost reply, malformed frame)
+# rather than by the adapter
+DEVICE_ERRORS = (asyncio.TimeoutError, NotConnectedError, ConnectionError, ValueError, CommandSuperseded)
+
+
+def is_adapter_failure(kind: str, error: BaseException) -> bool:
+    """
+    Default classifier of errors raised within scheduler slot. The same rules apply to all operation kinds: e.g. an
+    unreachable device keeps failing to connect while being retried, that must not take the adapter out of rotation.
+    :return: True if error indicates adapter problem and should be counted towards adapter health
+    """
+    names = {cls.__name__ for cls in type(error).__mro__}
+    if names & DEVICE_ERROR_NAMES:
+        return False
+    if names & ADAPTER_ERROR_NAMES:
+        return True
+    return not isinstance(error, DEVICE_ERRORS)
+
+
+class _AdapterState(object):
+    def __init__(self, iface: str, limits: Dict[str, int]) -> None:
+        super().__init__()
+        self.iface = iface
+        self.queues = {kind: asyncio.Semaphore(limit) for kind, limit in limits.items()}
+        self.rssi: Dict[str, Tuple[int, float]] = {}  # address -> (rssi, timestamp)
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+
+    @property
+    def is_healthy(self) -> bool:
+        return self.unhealthy_until <= time.monotonic()
+
+
+class AdapterScheduler(object):
+    """
+    Schedules BLE operations across one or more bluetooth adapters.
+    Every adapter has its own FIFO queue per operation kind, so e.g. concurrent connects don't thrash BlueZ while
+    writes to already connected devices keep flowing. New devices are placed on the adapter with the best recent RSSI
+    and free link slots. Adapter failing failure_threshold operations in a row is avoided for cooldown seconds.
+    """
+
+    DEFAULT_LIMITS = {OperationKind.CONNECT: 1, OperationKind.SCAN: 1, OperationKind.WRITE: 4}
+    RSSI_BUCKET = 5  # dBm. Differences below this are considered noise
+
+    def __init__(
+        self,
+        ifaces: List[str],
+        max_links_per_iface: Optional[int] = None,
+        limits: Optional[Dict[str, int]] = None,
+        rssi_ttl: float = 300,
+        failure_threshold: int = 3,
+        cooldown: float = 30,
+        failure_classifier: Callable[[str, BaseException], bool] = is_adapter_failure,
+    ) -> None:
+        """
+        :param ifaces: available adapters, the first one is preferred when there is no other information
+        :param max_links_per_iface: max number of connected devices per adapter. None - no limit
+        :param limits: max number of concurrently running operations of each kind per adapter
+        :param rssi_ttl: seconds after which RSSI measurement is considered outdated
+        :param failure_classifier: decides whether error of the operation of the given kind is adapter failure
+        """
+        super().__init__()
+        if not ifaces:
+            raise ValueError("At least one bluetooth adapter must be specified")
+        self.max_links_per_iface = max_links_per_iface
+        self.rssi_ttl = rssi_ttl
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failure_classifier = failure_classifier
+        op_limits = dict(self.DEFAULT_LIMITS)
+        op_limits.update(limits or {})
+        self._adapters = {iface: _AdapterState(iface, op_limits) for iface in ifaces}
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+    @property
+    def ifaces(self) -> List[str]:
+        return list(self._adapters.keys())
+
+    @property
+    def healthy_ifaces(self) -> List[str]:
+        return [x.iface for x in self._adapters.values() if x.is_healthy]
+
+    def __get_adapter(self, iface: str) -> _AdapterState:
+        adapter = self._adapters.get(iface)
+        if adapter is None:
+            raise ValueError("Unknown bluetooth adapter {}".format(iface))
+        return adapter
+
+    @asynccontextmanager
+    async def slot(self, iface: str, kind: str) -> AsyncIterator[None]:
+        """
+        Waits in the adapter queue for the given operation kind, holds the slot while context is active.
+        Errors raised within context are counted as adapter failures if failure_classifier considers them adapter
+        level. Device level errors e.g. reply timeout of out of range device don't affect adapter health.
+        """
+        adapter = self.__get_adapter(iface)
+        async with adapter.queues[kind]:
+            try:
+                yield
+            except Exception as e:
+                if self.failure_classifier(kind, e):
+                    self.report_failure(iface)
+                raise
+            self.report_success(iface)
+
+    def record_rssi(self, iface: str, address: str, rssi: Optional[int]):
+        if rssi is not None and iface in self._adapters:
+            self._adapters[iface].rssi[address] = (rssi, time.monotonic())
+
+    def get_rssi(self, iface: str, address: str) -> Optional[int]:
+        measurement = self.__get_adapter(iface).rssi.get(address)
+        if measurement is None or time.monotonic() - measurement[1] > self.rssi_ttl:
+            return None
+        return measurement[0]
+
+    def report_failure(self, iface: str):
+        adapter = self.__get_adapter(iface)
+        adapter.consecutive_failures += 1
+        if adapter.consecutive_failures >= self.failure_threshold and adapter.is_healthy:
+            self._logger.warning(
+                "Adapter {} failed {} times in a row. Avoiding it for {}s".format(
+                    iface, adapter.consecutive_failures, self.cooldown
+                )
+            )
+            adapter.unhealthy_until = time.monotonic() + self.cooldown
+
+    def report_success(self, iface: str):
+        adapter = self.__get_adapter(iface)
+        adapter.consecutive_failures = 0
+        adapter.unhealthy_until = 0
+
+    def is_healthy(self, iface: str) -> bool:
+        return self.__get_adapter(iface).is_healthy
+
+    def choose_adapter(self, address: str, link_counts: Optional[Dict[str, int]] = None) -> str:
+        """
+        Picks adapter for the device.
+        Adapters are compared by: health, presence of free link slots, RSSI (rounded to RSSI_BUCKET) and then
+        the number of free link slots.
+
+        :param link_counts: number of currently connected devices per adapter
+        :return: adapter name
+        """
+        link_counts = link_counts or {}
+        candidates = [x for x in self._adapters.values() if x.is_healthy] or list(self._adapters.values())
+
+        def score(adapter: _AdapterState):
+            used = link_counts.get(adapter.iface, 0)
+            free = self.max_links_per_iface - used if self.max_links_per_iface is not None else 0
+            rssi = self.get_rssi(adapter.iface, address)
+            rssi_bucket = rssi // self.RSSI_BUCKET if rssi is not None else -1000
+            return (free > 0 or self.max_links_per_iface is None, rssi_bucket, free, -used)
+
+        # max() keeps the first of equal candidates so adapters order defines preference
+        return max(candidates, key=score).iface
@@ -0,0 +1,189 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import json
+import logging
+import os
+import time
+
+from typing import Optional, Dict, Any, List
+
+__all__ = ("DeviceRecord", "DeviceMetadataStore")
+
+
+class DeviceRecord(object):
+    def __init__(
+        self,
+        address: str,
+        name: Optional[str] = None,
+        bt_device_name: str = "",
+        rssi: Optional[int] = None,
+        iface: Optional[str] = None,
+        handles: Optional[Dict[str, int]] = None,
+        state: Optional[Dict[str, Any]] = None,
+        updated_at: Optional[float] = None,
+    ) -> None:
+        """
+        :param handles: characteristic uuid -> GATT handle
+        :param state: last known device specific state
+        :param updated_at: unix timestamp of the last update
+        """
+        super().__init__()
+        self.address = address
+        self.name = name
+        self.bt_device_name = bt_device_name
+        self.rssi = rssi
+        self.iface = iface
+        self.handles: Dict[str, int] = handles or {}
+        self.state: Dict[str, Any] = state or {}
+        self.updated_at = updated_at or time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(
+            address=self.address,
+            name=self.name,
+            bt_device_name=self.bt_device_name,
+            rssi=self.rssi,
+            iface=self.iface,
+            handles=self.handles,
+            state=self.state,
+            updated_at=self.updated_at,
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DeviceRecord":
+        return cls(
+            address=data["address"],
+            name=data.get("name"),
+            bt_device_name=data.get("bt_device_name") or "",
+            rssi=data.get("rssi"),
+            iface=data.get("iface"),
+            handles=data.get("handles"),
+            state=data.get("state"),
+            updated_at=data.get("updated_at"),
+        )
+
+    def __repr__(self):
+        return "DeviceRecord({}, {}, iface={}, rssi={})".format(self.address, self.name, self.iface, self.rssi)
+
+
+class DeviceMetadataStore(object):
+    """
+    Small persistent JSON store with the metadata of known devices: name, last RSSI and adapter, resolved GATT handles
+    and the last known state. Allows to connect and send commands right after process start without discovery and
+    service resolution. Changes are flushed to disk in background with flush_delay debounce.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str, flush_delay: float = 5) -> None:
+        super().__init__()
+        self.path = path
+        self.flush_delay = flush_delay
+        self._records: Dict[str, DeviceRecord] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+    def load(self):
+        """
+        Loads records from disk. Missing or broken file results in empty store
+        """
+        self._records = {}
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            if data.get("version") != self.VERSION:
+                self._logger.warning("Ignoring device store {} of unsupported version".format(self.path))
+                return
+            for item in data.get("devices", []):
+                record = DeviceRecord.from_dict(item)
+                self._records[record.address] = record
+        except (ValueError, KeyError, OSError) as e:
+            self._logger.warning("Unable to load device store {}: {}".format(self.path, str(e)))
+
+    def save(self):
+        """
+        Writes all records to disk atomically
+        """
+        self.__cancel_flush()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(dict(version=self.VERSION, devices=[x.to_dict() for x in self._records.values()]), f)
+        os.replace(tmp_path, self.path)
+
+    def __cancel_flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+    def __flush(self):
+        self._flush_handle = None
+        try:
+            self.save()
+        except OSError as e:
+            self._logger.warning("Unable to save device store {}: {}".format(self.path, str(e)))
+
+    def schedule_flush(self):
+        """
+        Schedules saving to disk in flush_delay seconds. Saves immediately if there is no running event loop.
+        """
+        if self._flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_event_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None or not loop.is_running():
+            self.__flush()
+        else:
+            self._flush_handle = loop.call_later(self.flush_delay, self.__flush)
+
+    def get(self, address: str) -> Optional[DeviceRecord]:
+        return self._records.get(address)
+
+    def find_by_name(self, name: str) -> Optional[DeviceRecord]:
+        for record in self._records.values():
+            if name in (record.name, record.bt_device_name):
+                return record
+        return None
+
+    def records(self) -> List[DeviceRecord]:
+        return list(self._records.values())
+
+    def update(self, address: str, **fields: Any) -> DeviceRecord:
+        """
+        Updates record fields (creates record if needed) and schedules flush. None values are ignored.
+        """
+        record = self._records.get(address)
+        if record is None:
+            record = self._records[address] = DeviceRecord(address)
+        for key, value in fields.items():
+            if not hasattr(record, key):
+                raise ValueError("Unknown device record field " + key)
+            if value is not None:
+                setattr(record, key, value)
+        record.updated_at = time.time()
+        self.schedule_flush()
+        return record
+
+    def remove(self, address: str):
+        if self._records.pop(address, None) is not None:
+            self.schedule_flush()
@@ -0,0 +1,191 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import random
+
+from typing import Optional, NamedTuple, Tuple, Type, Iterator
+
+from ble_proxy.error import NotConnectedError
+
+__all__ = ("LinkStats", "RTTEstimator", "RetryPolicy", "ReconnectPolicy")
+
+
+class LinkStats(NamedTuple):
+    srtt: Optional[float]  # smoothed round trip time, seconds. None until the first sample
+    rttvar: Optional[float]  # round trip time variation, seconds
+    timeout: float  # current reply timeout, seconds
+    samples: int
+    timeouts: int
+    retries: int
+
+    @property
+    def loss_ratio(self) -> float:
+        total = self.samples + self.timeouts
+        return self.timeouts / total if total > 0 else 0.0
+
+
+class RTTEstimator(object):
+    """
+    Per-link round trip time estimator computing reply timeout the same way TCP computes RTO (RFC 6298):
+    smoothed mean plus k variations, doubled on every timeout until a fresh sample is received.
+    """
+
+    def __init__(
+        self,
+        initial_timeout: float = 1,
+        min_timeout: float = 0.2,
+        max_timeout: float = 5,
+        alpha: float = 1 / 8,
+        beta: float = 1 / 4,
+        k: float = 4,
+    ) -> None:
+        """
+        :param initial_timeout: timeout used until the first RTT sample is collected
+        :param alpha: weight of the new sample in smoothed RTT
+        :param beta: weight of the new sample in RTT variation
+        :param k: number of RTT variations added on top of smoothed RTT
+        """
+        super().__init__()
+        self.initial_timeout = initial_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.alpha = alpha
+        self.beta = beta
+        self.k = k
+        self.srtt: Optional[float] = None
+        self.rttvar: Optional[float] = None
+        self.samples = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.__base_timeout = initial_timeout
+        self.__backoff = 1
+
+    def __clamp(self, value: float) -> float:
+        return min(max(value, self.min_timeout), self.max_timeout)
+
+    @property
+    def timeout(self) -> float:
+        return self.__clamp(self.__base_timeout * self.__backoff)
+
+    def sample(self, rtt: float):
+        """
+        Registers measured round trip time. Must not be called for retransmitted requests as the reply can't be
+        matched with the particular attempt (Karn's algorithm)
+        """
+        if self.srtt is None or self.rttvar is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar += self.beta * (abs(self.srtt - rtt) - self.rttvar)
+            self.srtt += self.alpha * (rtt - self.srtt)
+        self.samples += 1
+        self.__base_timeout = self.srtt + self.k * self.rttvar
+        self.__backoff = 1
+
+    def on_timeout(self):
+        """
+        Registers reply timeout. Timeout is doubled (exponential backoff) until the next reply is received
+        """
+        self.timeouts += 1
+        if self.timeout < self.max_timeout:
+            self.__backoff *= 2
+
+    def on_reply(self):
+        """
+        Registers reply which can't be used as RTT sample (e.g. reply to retransmitted command). Link is alive so
+        backoff is cleared but estimates are kept as is
+        """
+        self.__backoff = 1
+
+    def reset(self):
+        self.srtt = None
+        self.rttvar = None
+        self.__base_timeout = self.initial_timeout
+        self.__backoff = 1
+
+    @property
+    def stats(self) -> LinkStats:
+        return LinkStats(self.srtt, self.rttvar, self.timeout, self.samples, self.timeouts, self.retries)
+
+
+class RetryPolicy(object):
+    """
+    Defines whether failed command could be sent again. Non-idempotent commands (e.g. relative moves) are never
+    retried once written as the lost reply doesn't mean the command was lost.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        retry_on: Tuple[Type[BaseException], ...] = (asyncio.TimeoutError, NotConnectedError),
+    ) -> None:
+        """
+        :param max_attempts: total number of attempts including the first one
+        :param retry_on: exception types considered transient
+        """
+        super().__init__()
+        self.max_attempts = max_attempts
+        self.retry_on = retry_on
+
+    def should_retry(self, attempt: int, error: BaseException, idempotent: bool) -> bool:
+        """
+        :param attempt: number of the failed attempt starting from 1
+        """
+        return idempotent and attempt < self.max_attempts and isinstance(error, self.retry_on)
+
+
+class ReconnectPolicy(object):
+    """
+    Defines how lost link is restored: attempts are made with exponentially growing delays randomized by jitter so
+    that many devices which lost the link at once (e.g. adapter reset) don't reconnect simultaneously.
+    """
+
+    def __init__(
+        self,
+        initial_delay: float = 0.5,
+        max_delay: float = 30,
+        multiplier: float = 2,
+        jitter: float = 0.2,
+        max_attempts: Optional[int] = None,
+        connect_timeout: float = 5,
+        wait_timeout: float = 10,
+    ) -> None:
+        """
+        :param initial_delay: delay after the first failed attempt. The first attempt is made immediately
+        :param jitter: max random deviation of the delay as a fraction of the delay
+        :param max_attempts: number of attempts before giving up. None - never give up
+        :param wait_timeout: max time command waits for the reconnection before failing with NotConnectedError
+        """
+        super().__init__()
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.max_attempts = max_attempts
+        self.connect_timeout = connect_timeout
+        self.wait_timeout = wait_timeout
+
+    def delays(self) -> Iterator[float]:
+        """
+        :return: delays to wait after every failed attempt
+        """
+        delay = self.initial_delay
+        attempt = 1
+        while self.max_attempts is None or attempt < self.max_attempts:
+            yield max(0.0, delay * (1 + random.uniform(-self.jitter, self.jitter)))
+            delay = min(delay * self.multiplier, self.max_delay)
+            attempt += 1
@@ -0,0 +1,179 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compact binary log of GATT traffic, see ble_proxy.backend.recording and ble_proxy.backend.replay.
+
+File starts with MAGIC followed by records:
+    event (u8), time since previous record in microseconds (u32), address index (u16), characteristic index (u16),
+    data length (u16), data
+Addresses and characteristic identifiers are interned: DEFINE record assigns the next index to the string stored in
+its data, index 0 means "none".
+"""
+
+import struct
+import threading
+import time
+
+from typing import Optional, NamedTuple, Iterator, List, Dict, Union, BinaryIO
+
+MAGIC = b"BLETRC\x00\x01"
+_HEADER = struct.Struct(">BIHHH")
+_MAX_DELTA = 0xFFFFFFFF
+_MAX_DATA = 0xFFFF
+_ADV = struct.Struct(">h")
+
+
+class TraceEvent:
+    DEFINE = 0
+    # Actions initiated by the host
+    CONNECT = 1
+    DISCONNECT = 2
+    WRITE = 3
+    WRITE_WITH_RESPONSE = 4
+    READ = 5
+    DESCRIPTOR_WRITE = 6
+    SUBSCRIBE = 7
+    # Events coming from the device or the stack
+    CONNECTED = 20
+    CONNECT_FAILED = 21
+    LINK_LOST = 22
+    NOTIFY = 23
+    READ_RESULT = 24
+    WRITE_FAILED = 25
+    ADVERTISEMENT = 26  # Seen by discovery
+    SCAN_ADVERTISEMENT = 27  # Seen by background scanner
+
+    HOST_ACTIONS = frozenset((CONNECT, DISCONNECT, WRITE, WRITE_WITH_RESPONSE, READ, DESCRIPTOR_WRITE, SUBSCRIBE))
+
+
+class TraceRecord(NamedTuple):
+    timestamp: float  # seconds since the beginning of the trace
+    event: int
+    address: Optional[str]
+    characteristic: Optional[str]
+    data: bytes = b""
+
+
+def encode_advertisement(name: Optional[str], rssi: Optional[int]) -> bytes:
+    return _ADV.pack(-32768 if rssi is None else rssi) + (name or "").encode("utf-8")
+
+
+def decode_advertisement(data: bytes):
+    """
+    :return: tuple (name, rssi)
+    """
+    (rssi,) = _ADV.unpack_from(data)
+    return data[_ADV.size :].decode("utf-8") or None, None if rssi == -32768 else rssi
+
+
+class TraceWriter(object):
+    """
+    Appends records to the trace file. Every record is flushed immediately so trace of a crashed process is usable.
+    """
+
+    def __init__(self, target: Union[str, BinaryIO], clock=time.monotonic) -> None:
+        """
+        :param target: file path or binary stream
+        """
+        super().__init__()
+        self._file: BinaryIO = open(target, "wb") if isinstance(target, str) else target
+        self._owns_file = isinstance(target, str)
+        self._clock = clock
+        self._strings: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._file.write(MAGIC)
+        self._started = clock()
+        self._last = 0
+
+    def record(
+        self,
+        event: int,
+        address: Optional[str],
+        characteristic: Optional[str] = None,
+        data: Union[bytes, bytearray] = b"",
+    ):
+        with self._lock:
+            if self._file.closed:
+                return
+            now = int((self._clock() - self._started) * 1e6)
+            addr_idx = self.__intern(address, now)
+            char_idx = self.__intern(characteristic, now)
+            self.__write(event, now, addr_idx, char_idx, bytes(data))
+            self._file.flush()
+
+    def __intern(self, value: Optional[str], now: int) -> int:
+        if value is None:
+            return 0
+        idx = self._strings.get(value)
+        if idx is None:
+            idx = self._strings[value] = len(self._strings) + 1
+            self.__write(TraceEvent.DEFINE, now, 0, 0, value.encode("utf-8"))
+        return idx
+
+    def __write(self, event: int, now: int, addr_idx: int, char_idx: int, data: bytes):
+        if len(data) > _MAX_DATA:
+            raise ValueError("Trace record payload is too large: {} bytes".format(len(data)))
+        delta = min(now - self._last, _MAX_DELTA)
+        self._last = now
+        self._file.write(_HEADER.pack(event, delta, addr_idx, char_idx, len(data)))
+        self._file.write(data)
+
+    def close(self):
+        with self._lock:
+            if self._owns_file and not self._file.closed:
+                self._file.close()
+            else:
+                self._file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def iter_trace(source: Union[str, BinaryIO]) -> Iterator[TraceRecord]:
+    """
+    Reads records of the trace file. DEFINE records are consumed internally. Truncated trailing record is ignored.
+    :raises ValueError: if file is not a trace
+    """
+    file: BinaryIO = open(source, "rb") if isinstance(source, str) else source
+    try:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError("Not a BLE trace file")
+        strings: List[Optional[str]] = [None]
+        elapsed = 0
+        while True:
+            header = file.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return
+            event, delta, addr_idx, char_idx, size = _HEADER.unpack(header)
+            data = file.read(size)
+            if len(data) < size:
+                return
+            elapsed += delta
+            if event == TraceEvent.DEFINE:
+                strings.append(data.decode("utf-8"))
+                continue
+            yield TraceRecord(elapsed / 1e6, event, strings[addr_idx], strings[char_idx], data)
+    finally:
+        if isinstance(source, str):
+            file.close()
+
+
+def load_trace(source: Union[str, BinaryIO]) -> List[TraceRecord]:
+    return list(iter_trace(source))
@@ -14,9 +14,11 @@
 #    You should have received a copy of the GNU General Public License
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from typing import Optional, TypeVar, Type, Any
+import asyncio
 
-__all__ = ("none_throws", "safe_cast")
+from typing import Optional, TypeVar, Type, Any, Dict, Hashable, Callable, Awaitable
+
+__all__ = ("none_throws", "safe_cast", "SingleFlight")
 
 
 _T = TypeVar("_T")
@@ -36,4 +38,35 @@ def safe_cast(new_type: Type[_T], value: Any) -> _T:
     return value  # type: ignore[no-any-return]
 
 
+class SingleFlight(object):
+    """
+    Deduplicates identical concurrent calls: while call for the key is in flight all other callers with the same key
+    wait for its result instead of starting their own. Cancellation of a single caller doesn't affect the others.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._in_flight: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self.shared_calls = 0
+
+    def is_in_flight(self, key: Hashable) -> bool:
+        return key in self._in_flight
+
+    def __on_done(self, key: Hashable, future: "asyncio.Future[Any]"):
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+        if not future.cancelled():
+            future.exception()  # Mark exception as retrieved, callers receive it through shield
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[_T]]) -> _T:
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.shared_calls += 1
+        else:
+            future = asyncio.ensure_future(func())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda f: self.__on_done(key, f))
+        return await asyncio.shield(future)
+
+
 # ===================================
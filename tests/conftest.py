@@ -0,0 +1,83 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import sys
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from am43_rc import protocol  # noqa: E402
+from am43_rc.emulator import AM43Emulator  # noqa: E402
+from am43_rc.service import AM43DeviceManager, AM43Device  # noqa: E402
+from ble_proxy.backend.simulated import SimulatedBackend, LinkProfile  # noqa: E402
+from ble_proxy.metrics import InMemoryMetrics  # noqa: E402
+
+ADDRESS = "02:00:00:00:43:01"
+ZERO_LATENCY = LinkProfile(latency=0, connect_latency=0)
+
+
+class ReplyDroppingEmulator(AM43Emulator):
+    """
+    Executes commands but loses the replies to the first drop_count commands of the given types
+    """
+
+    def __init__(self, dropped=(protocol.Cmd.GET_POSITION,), drop_count: int = 1, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.dropped = dropped
+        self.drop_count = drop_count
+
+    def handle_command(self, command: int, params: bytes) -> Optional[bytes]:
+        reply = super().handle_command(command, params)
+        if command in self.dropped and self.drop_count > 0:
+            self.drop_count -= 1
+            return None
+        return reply
+
+
+@pytest.fixture
+def backend() -> SimulatedBackend:
+    """
+    Zero latency link to AM43 emulators standing at 50%
+    """
+    return SimulatedBackend(lambda address: AM43Emulator(position=50), profile=ZERO_LATENCY)
+
+
+@pytest.fixture
+def metrics() -> InMemoryMetrics:
+    return InMemoryMetrics()
+
+
+@pytest.fixture
+def connect(metrics: InMemoryMetrics):
+    """
+    Returns async context manager connecting AM43DeviceManager over the given backend to the emulator at ADDRESS
+    """
+
+    @asynccontextmanager
+    async def connected(backend, **kwargs):
+        manager = AM43DeviceManager(backend=backend, metrics=metrics, **kwargs)
+        try:
+            device: AM43Device = await manager.connect(ADDRESS)
+            yield device
+        finally:
+            await manager.disconnect_all()
+
+    return connected
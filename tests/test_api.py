@@ -0,0 +1,196 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+import aiohttp
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from am43_rc.api.server import AM43ApiServer
+from am43_rc.emulator import create_backend
+from am43_rc.service import AM43DeviceManager
+from ble_proxy.backend.simulated import SimulatedBackend
+from ble_proxy.metrics import InMemoryMetrics
+
+from conftest import ADDRESS, ZERO_LATENCY
+
+OTHER = "02:00:00:00:43:02"
+
+
+@asynccontextmanager
+async def api_client(backend):
+    manager = AM43DeviceManager(backend=backend, metrics=InMemoryMetrics())
+    server = AM43ApiServer(manager, connect_attempts=1, background_scan=False)
+    client = TestClient(TestServer(server.app))
+    await client.start_server()
+    try:
+        yield client
+    finally:
+        await client.close()
+        await manager.disconnect_all()
+
+
+async def receive_change(ws, timeout: float = 2):
+    msg = await ws.receive(timeout=timeout)
+    assert msg.type == aiohttp.WSMsgType.TEXT
+    return json.loads(msg.data)
+
+
+async def wait_for_change(ws, address: str, field: str, value):
+    """
+    Skips pushed changes until the given field of the device gets the value
+    """
+    while True:
+        change = await receive_change(ws)
+        if change["address"] == address and change["changes"].get(field) == value:
+            return change
+
+
+def test_state(backend):
+    async def scenario():
+        async with api_client(backend) as client:
+            resp = await client.get("/api/devices/{}/state".format(ADDRESS.lower()))
+            assert resp.status == 200
+            body = await resp.json()
+            assert (body["address"], body["battery"], body["light"], body["position"]) == (ADDRESS, 80, 5, 50)
+            assert body["status"]["has_light_sensor"] is True
+
+    asyncio.run(scenario())
+
+
+def test_position_and_move(backend):
+    async def scenario():
+        async with api_client(backend) as client:
+            url = "/api/devices/{}".format(ADDRESS)
+            assert (await client.put(url + "/position", json={"position": 30})).status == 200
+            assert (await client.put(url + "/position", json={"position": 40, "wait": False})).status == 202
+            assert (await client.post(url + "/move", json={"action": "stop"})).status == 200
+            emulator = backend.get_peripheral(ADDRESS)
+            assert not emulator.is_moving
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize(
+    "method, path, body, status",
+    [
+        ("put", "/position", {"position": 120}, 422),
+        ("put", "/position", "not json", 400),
+        ("post", "/move", {"action": "dance"}, 422),
+    ],
+)
+def test_invalid_requests(backend, method, path, body, status):
+    async def scenario():
+        async with api_client(backend) as client:
+            url = "/api/devices/{}{}".format(ADDRESS, path)
+            if isinstance(body, str):
+                resp = await client.request(method, url, data=body)
+            else:
+                resp = await client.request(method, url, json=body)
+            assert resp.status == status
+            assert "error" in await resp.json()
+
+    asyncio.run(scenario())
+
+
+def test_unreachable_device_is_reported():
+    async def scenario():
+        async with api_client(SimulatedBackend(profile=ZERO_LATENCY)) as client:
+            resp = await client.get("/api/devices/{}/state".format(ADDRESS))
+            assert resp.status == 400
+
+    asyncio.run(scenario())
+
+
+def test_batch(backend):
+    async def scenario():
+        async with api_client(backend) as client:
+            operations = [
+                {"address": ADDRESS, "action": "set_position", "position": 20},
+                {"address": OTHER, "action": "close"},
+            ]
+            resp = await client.post("/api/batch", json={"operations": operations})
+            assert resp.status == 200
+            body = await resp.json()
+            assert body["ok"] is True
+            assert sorted(x["address"] for x in body["results"]) == [ADDRESS, OTHER]
+            assert backend.get_peripheral(OTHER).is_moving
+
+    asyncio.run(scenario())
+
+
+def test_discover():
+    async def scenario():
+        async with api_client(create_backend(2, ZERO_LATENCY)) as client:
+            resp = await client.get("/api/devices?timeout=0.1")
+            assert resp.status == 200
+            assert sorted(x["name"] for x in await resp.json()) == ["Blind 1", "Blind 2"]
+
+    asyncio.run(scenario())
+
+
+def test_link_stats_and_metrics(backend):
+    async def scenario():
+        async with api_client(backend) as client:
+            await client.get("/api/devices/{}/state".format(ADDRESS))
+            stats = await (await client.get("/api/link-stats")).json()
+            assert stats[ADDRESS]["samples"] > 0
+            resp = await client.get("/metrics")
+            assert resp.status == 200
+            assert "am43_command_seconds" in await resp.text()
+
+    asyncio.run(scenario())
+
+
+def test_device_websocket_polls(backend):
+    async def scenario():
+        async with api_client(backend) as client:
+            async with client.ws_connect("/api/ws?address={}&poll_interval=0.1".format(ADDRESS)) as ws:
+                await wait_for_change(ws, ADDRESS, "battery", 80)
+                backend.get_peripheral(ADDRESS).battery = 60
+                change = await wait_for_change(ws, ADDRESS, "battery", 60)
+                assert change["state"]["light"] == 5
+
+    asyncio.run(scenario())
+
+
+def test_manager_websocket_polls_all_devices(backend):
+    async def scenario():
+        async with api_client(backend) as client:
+            for address in (ADDRESS, OTHER):
+                await client.get("/api/devices/{}/state".format(address))
+            async with client.ws_connect("/api/ws?poll_interval=0.1") as ws:
+                # Current state of every managed device comes first
+                initial = {(await receive_change(ws))["address"] for _ in range(2)}
+                assert initial == {ADDRESS, OTHER}
+                backend.get_peripheral(OTHER).light = 9
+                await wait_for_change(ws, OTHER, "light", 9)
+
+    asyncio.run(scenario())
+
+
+def test_websocket_for_unknown_device_fails_handshake():
+    async def scenario():
+        async with api_client(SimulatedBackend(profile=ZERO_LATENCY)) as client:
+            with pytest.raises(aiohttp.WSServerHandshakeError) as e:
+                await client.ws_connect("/api/ws?address={}".format(ADDRESS))
+            assert e.value.status == 400
+
+    asyncio.run(scenario())
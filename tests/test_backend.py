@@ -0,0 +1,69 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import pytest
+
+from ble_proxy import backend as registry
+from ble_proxy.backend import get_backend, register_backend, available_backends
+from ble_proxy.backend.simulated import SimulatedBackend
+
+import am43_rc.service  # noqa: F401
+
+
+@pytest.fixture(autouse=True)
+def isolated_registry(monkeypatch):
+    monkeypatch.setattr(registry, "_registry", dict(registry._registry))
+    monkeypatch.setattr(registry, "_entry_points", lambda: {})
+    monkeypatch.delenv("BLE_PROXY_BACKEND", raising=False)
+
+
+def test_emulator_is_not_registered_on_import():
+    assert "am43-emulator" not in available_backends()
+    with pytest.raises(ValueError, match="Unknown BLE backend"):
+        get_backend("am43-emulator")
+
+
+def test_backend_from_entry_point(monkeypatch):
+    monkeypatch.setattr(registry, "_entry_points", lambda: {"am43-emulator": "am43_rc.emulator:create_backend"})
+    assert "am43-emulator" in available_backends()
+    backend = get_backend("am43-emulator", count=2)
+    assert isinstance(backend, SimulatedBackend)
+    assert len(backend.advertisements) == 2
+
+
+def test_backend_from_reference():
+    backend = get_backend("am43_rc.emulator:create_backend", count=1)
+    assert [x.address for x in backend.advertisements] == ["02:00:00:00:43:01"]
+
+
+def test_registered_reference_is_resolved_once():
+    register_backend("lazy", "ble_proxy.backend.simulated:SimulatedBackend")
+    assert registry._registry["lazy"] == "ble_proxy.backend.simulated:SimulatedBackend"
+    assert isinstance(get_backend("lazy"), SimulatedBackend)
+    assert registry._registry["lazy"] is SimulatedBackend
+
+
+def test_default_backend_from_environment(monkeypatch):
+    monkeypatch.setenv("BLE_PROXY_BACKEND", "simulated")
+    assert isinstance(get_backend(), SimulatedBackend)
+
+
+def test_instance_is_returned_as_is():
+    backend = SimulatedBackend()
+    assert get_backend(backend) is backend
+    register_backend("factory", lambda **options: backend)
+    assert get_backend("factory") is backend
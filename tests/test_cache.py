@@ -0,0 +1,105 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import asyncio
+
+from am43_rc import protocol
+from am43_rc.cache import AM43StateCache
+
+from conftest import ADDRESS
+
+
+class FakeClock(object):
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_cache(**kwargs):
+    clock = FakeClock()
+    return AM43StateCache(clock=clock, **kwargs), clock
+
+
+def test_fields_expire_with_own_ttl():
+    cache, clock = make_cache(ttl={AM43StateCache.FIELD_LIGHT: 10})
+    cache.put(ADDRESS, AM43StateCache.FIELD_BATTERY, 80)
+    cache.put(ADDRESS, AM43StateCache.FIELD_LIGHT, 5)
+    clock.now += 11
+    assert cache.get(ADDRESS, AM43StateCache.FIELD_BATTERY).value == 80
+    assert cache.get(ADDRESS, AM43StateCache.FIELD_LIGHT) is None
+    assert cache.stats == (1, 1)
+
+
+def test_max_age_overrides_ttl():
+    cache, clock = make_cache()
+    cache.put(ADDRESS, AM43StateCache.FIELD_BATTERY, 80)
+    clock.now += 5
+    assert cache.get(ADDRESS, AM43StateCache.FIELD_BATTERY, max_age=10) is not None
+    assert cache.get(ADDRESS, AM43StateCache.FIELD_BATTERY, max_age=1) is None
+    assert cache.get(ADDRESS, AM43StateCache.FIELD_BATTERY, max_age=0) is None
+
+
+def test_moving_position_is_cached_once_stable():
+    cache, clock = make_cache()
+    cache.put(ADDRESS, AM43StateCache.FIELD_POSITION, 50)
+    cache.mark_moving(ADDRESS)
+    assert cache.get(ADDRESS, AM43StateCache.FIELD_POSITION) is None
+    cache.put(ADDRESS, AM43StateCache.FIELD_POSITION, 40)
+    assert cache.get(ADDRESS, AM43StateCache.FIELD_POSITION) is None
+    clock.now += 0.5
+    cache.put(ADDRESS, AM43StateCache.FIELD_POSITION, 40)
+    # Same value but too early to tell the motor stopped
+    assert cache.get(ADDRESS, AM43StateCache.FIELD_POSITION) is None
+    clock.now += AM43StateCache.STABLE_INTERVAL
+    cache.put(ADDRESS, AM43StateCache.FIELD_POSITION, 40)
+    assert cache.get(ADDRESS, AM43StateCache.FIELD_POSITION).value == 40
+
+
+def test_invalidate():
+    cache, _ = make_cache()
+    for field, value in ((AM43StateCache.FIELD_BATTERY, 80), (AM43StateCache.FIELD_LIGHT, 5)):
+        cache.put(ADDRESS, field, value)
+    cache.invalidate(ADDRESS, [AM43StateCache.FIELD_LIGHT])
+    assert cache.get(ADDRESS, AM43StateCache.FIELD_LIGHT) is None
+    assert cache.get(ADDRESS, AM43StateCache.FIELD_BATTERY) is not None
+    cache.invalidate(ADDRESS)
+    assert cache.get(ADDRESS, AM43StateCache.FIELD_BATTERY) is None
+
+
+def test_device_reads_through_cache(backend, connect):
+    def queries(command):
+        return sum(1 for frame in backend.get_peripheral(ADDRESS).received_commands if frame[5] == command)
+
+    async def scenario():
+        cache = AM43StateCache()
+        async with connect(backend, state_cache=cache) as device:
+            for _ in range(3):
+                state = await device.read_state()
+            assert (state.battery, state.light, state.position) == (80, 5, 50)
+            assert queries(protocol.Cmd.GET_BATTERY) == 1
+            assert queries(protocol.Cmd.GET_POSITION) == 1
+            # Motion command invalidates position, the other fields are still served from cache
+            await device.set_position(20)
+            await device.read_state()
+            assert queries(protocol.Cmd.GET_POSITION) == 2
+            assert queries(protocol.Cmd.GET_LIGHT) == 1
+            await device.read_battery_status(max_age=0)
+            assert queries(protocol.Cmd.GET_BATTERY) == 2
+
+    asyncio.run(scenario())
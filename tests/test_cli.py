@@ -0,0 +1,81 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import json
+
+import pytest
+
+from am43_rc.cli.client import DaemonClient, DaemonUnavailable, RemoteCommandError
+from am43_rc.cli.daemon import AM43Daemon
+from am43_rc.emulator import create_backend
+from am43_rc.service import AM43DeviceManager
+
+from conftest import ADDRESS, ZERO_LATENCY
+
+BACKEND = "am43_rc.emulator:create_backend"
+
+
+def test_daemon_serves_client_requests(tmp_path):
+    socket_path = str(tmp_path / "am43.sock")
+    backend = create_backend(1, ZERO_LATENCY, position=50)
+
+    async def scenario():
+        loop = asyncio.get_event_loop()
+        client = DaemonClient(socket_path, timeout=5)
+
+        async def request(command: str, **kwargs):
+            return await loop.run_in_executor(None, lambda: client.request(command, **kwargs))
+
+        daemon = AM43Daemon(AM43DeviceManager(backend=backend), socket_path)
+        await daemon.start()
+        try:
+            state = await request("state", address=ADDRESS.lower())
+            assert (state["address"], state["position"], state["battery"], state["light"]) == (ADDRESS, 50, 80, 5)
+            assert await request("position", address=ADDRESS, position=80) is None
+            assert backend.get_peripheral(ADDRESS).is_moving
+            # Connection is kept warm between requests
+            assert (await request("ping"))["devices"] == [ADDRESS]
+            for bad_request in (dict(command="dance", address=ADDRESS), dict(command="open")):
+                with pytest.raises(RemoteCommandError):
+                    await request(**bad_request)
+        finally:
+            await daemon.stop()
+        with pytest.raises(DaemonUnavailable):
+            await request("ping")
+
+    asyncio.run(scenario())
+
+
+def test_manager_options_disable_forwarding():
+    from am43_rc.cli import build_parser
+    from am43_rc.cli.commands import manager_options_given
+
+    parser = build_parser()
+    assert manager_options_given(parser.parse_args(["state", ADDRESS])) == []
+    args = parser.parse_args(["-b", BACKEND, "--store", "devices.json", "state", ADDRESS])
+    assert manager_options_given(args) == ["--backend", "--store"]
+
+
+def test_command_runs_in_process_without_daemon(tmp_path, capsys):
+    from am43_rc.cli import main
+
+    common = ["-s", str(tmp_path / "missing.sock"), "--backend", BACKEND]
+    assert main(common + ["state", ADDRESS]) == 0
+    state = json.loads(capsys.readouterr().out)
+    assert (state["address"], state["battery"]) == (ADDRESS, 80)
+    with pytest.raises(SystemExit):
+        main(common + ["position", ADDRESS, "101"])
@@ -0,0 +1,183 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import asyncio
+
+import pytest
+
+from am43_rc import protocol
+from am43_rc.emulator import AM43Emulator
+from ble_proxy.backend.simulated import SimulatedBackend, LinkProfile
+from ble_proxy.commands import CommandQueue, CommandPriority, CommandSuperseded
+
+from conftest import ADDRESS
+
+# Writes take a while so commands issued together have to wait in the queue
+SLOW_LINK = LinkProfile(latency=0.02, connect_latency=0)
+
+
+@pytest.fixture
+def slow_backend() -> SimulatedBackend:
+    return SimulatedBackend(lambda address: AM43Emulator(position=50), profile=SLOW_LINK)
+
+
+def sent_commands(backend: SimulatedBackend):
+    emulator = backend.get_peripheral(ADDRESS)
+    return [(frame[5], frame[7]) for frame in emulator.received_commands]
+
+
+def test_queue_serves_by_priority_then_order():
+    async def scenario():
+        queue = CommandQueue()
+        served = []
+
+        async def command(name, priority):
+            async with queue.turn(priority):
+                served.append(name)
+
+        async with queue.turn():
+            tasks = [
+                asyncio.ensure_future(command(name, priority))
+                for name, priority in (
+                    ("poll", CommandPriority.BACKGROUND),
+                    ("first", CommandPriority.NORMAL),
+                    ("stop", CommandPriority.URGENT),
+                    ("second", CommandPriority.NORMAL),
+                )
+            ]
+            await asyncio.sleep(0)
+            assert queue.depth == 4
+        await asyncio.gather(*tasks)
+        assert served == ["stop", "first", "second", "poll"]
+        assert queue.stats.executed == 5
+
+    asyncio.run(scenario())
+
+
+def test_queue_coalesces_pending_commands():
+    async def scenario():
+        queue = CommandQueue()
+        loop = asyncio.get_event_loop()
+        outcomes = [loop.create_future() for _ in range(3)]
+
+        async def command(outcome):
+            async with queue.turn(coalesce_key="motion", outcome=outcome):
+                outcome.set_result("done")
+
+        async with queue.turn():
+            tasks = [asyncio.ensure_future(command(outcome)) for outcome in outcomes]
+            await asyncio.sleep(0)
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert isinstance(results[0], CommandSuperseded) and isinstance(results[1], CommandSuperseded)
+        # Each superseded command is handed the outcome of the one which replaced it
+        assert results[0].outcome is outcomes[1] and results[1].outcome is outcomes[2]
+        assert results[2] is None
+        assert queue.stats.coalesced == 2
+        assert queue.stats.executed == 2
+
+    asyncio.run(scenario())
+
+
+def test_queue_lower_priority_does_not_supersede():
+    async def scenario():
+        queue = CommandQueue()
+        loop = asyncio.get_event_loop()
+        served = []
+
+        async def command(name, priority):
+            outcome = loop.create_future()
+            async with queue.turn(priority, coalesce_key="motion", outcome=outcome):
+                served.append(name)
+                outcome.set_result(name)
+
+        async with queue.turn():
+            tasks = [
+                asyncio.ensure_future(command(name, priority))
+                for name, priority in (("stop", CommandPriority.URGENT), ("move", CommandPriority.NORMAL))
+            ]
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        assert served == ["stop", "move"]
+        assert queue.stats.coalesced == 0
+
+    asyncio.run(scenario())
+
+
+def test_queue_requires_outcome_for_coalescing():
+    async def scenario():
+        async with CommandQueue().turn(coalesce_key="motion"):
+            pass
+
+    with pytest.raises(ValueError):
+        asyncio.run(scenario())
+
+
+def test_pending_motion_commands_are_coalesced(slow_backend, connect):
+    async def scenario():
+        async with connect(slow_backend) as device:
+            slow_backend.get_peripheral(ADDRESS).received_commands.clear()
+            handles = await asyncio.gather(*[device.set_position(p, wait=False) for p in (10, 20, 30, 40)])
+            results = await asyncio.gather(*handles)
+            # The first one was written right away, the newest one replaced those waiting behind it
+            assert sent_commands(slow_backend) == [(protocol.Cmd.SET_POSITION, 10), (protocol.Cmd.SET_POSITION, 40)]
+            assert all(result.acknowledged for result in results)
+            assert device.queue_stats.coalesced == 2
+
+    asyncio.run(scenario())
+
+
+def test_stop_preempts_queued_commands(slow_backend, connect):
+    async def scenario():
+        async with connect(slow_backend) as device:
+            slow_backend.get_peripheral(ADDRESS).received_commands.clear()
+            handle, battery, light, stop = await asyncio.gather(
+                device.set_position(10, wait=False),
+                device.read_battery_status(max_age=0),
+                device.read_light_status(max_age=0),
+                device.stop(wait=False),
+            )
+            assert (battery, light) == (80, 5)
+            assert (await handle).acknowledged and (await stop).acknowledged
+            assert [command for command, _ in sent_commands(slow_backend)] == [
+                protocol.Cmd.SET_POSITION,
+                protocol.Cmd.MOVE,
+                protocol.Cmd.GET_BATTERY,
+                protocol.Cmd.GET_LIGHT,
+            ]
+
+    asyncio.run(scenario())
+
+
+def test_pending_stop_is_not_superseded_by_motion(slow_backend, connect):
+    async def scenario():
+        async with connect(slow_backend) as device:
+            slow_backend.get_peripheral(ADDRESS).received_commands.clear()
+            first, battery, stop, move = await asyncio.gather(
+                device.set_position(10, wait=False),
+                device.read_battery_status(max_age=0),
+                device.stop(wait=False),
+                device.set_position(30, wait=False),
+            )
+            results = await asyncio.gather(first, stop, move)
+            assert all(result.acknowledged for result in results)
+            sent = sent_commands(slow_backend)
+            # Stop went ahead of the queued commands and was sent in addition to the following set position
+            assert sent[:2] == [(protocol.Cmd.SET_POSITION, 10), (protocol.Cmd.MOVE, AM43Emulator.MOVE_STOP)]
+            assert sorted(sent[2:]) == sorted([(protocol.Cmd.GET_BATTERY, 1), (protocol.Cmd.SET_POSITION, 30)])
+            assert device.queue_stats.coalesced == 0
+
+    asyncio.run(scenario())
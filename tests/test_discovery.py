@@ -0,0 +1,80 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+from am43_rc.emulator import create_backend
+from am43_rc.service import AM43DeviceManager
+from ble_proxy.scanner import Advertisement
+
+from conftest import ADDRESS, ZERO_LATENCY
+
+
+def make_manager(count: int = 3) -> AM43DeviceManager:
+    backend = create_backend(count, ZERO_LATENCY)
+    backend.advertisements.append(Advertisement("02:00:00:00:00:99", "Speaker", -40))
+    return AM43DeviceManager(backend=backend)
+
+
+def test_discover_iter_yields_every_target_device_once():
+    async def scenario():
+        manager = make_manager()
+        started = asyncio.get_event_loop().time()
+        found = [x.address async for x in manager.discover_iter(timeout=0.5)]
+        assert sorted(found) == ["02:00:00:00:43:{:02X}".format(i + 1) for i in range(3)]
+        assert asyncio.get_event_loop().time() - started < 1
+        # Temporary scanners are stopped after iteration
+        assert not manager.is_scanning
+
+    asyncio.run(scenario())
+
+
+def test_find_stops_scanning_once_device_is_seen():
+    async def scenario():
+        manager = make_manager()
+        started = asyncio.get_event_loop().time()
+        by_name = await manager.find("Blind 2", timeout=5)
+        by_address = await manager.find(ADDRESS.lower(), timeout=5)
+        assert asyncio.get_event_loop().time() - started < 1
+        assert by_name.address == "02:00:00:00:43:02"
+        assert by_address.name == "Blind 1"
+
+    asyncio.run(scenario())
+
+
+def test_find_returns_none_on_timeout():
+    async def scenario():
+        manager = make_manager()
+        assert await manager.find("Blind 9", timeout=0.3) is None
+        # Non target devices are never reported
+        assert await manager.find("Speaker", timeout=0.3) is None
+
+    asyncio.run(scenario())
+
+
+def test_find_uses_registry_of_background_scan():
+    async def scenario():
+        manager = make_manager()
+        await manager.start_background_scan()
+        try:
+            await asyncio.sleep(0.3)
+            started = asyncio.get_event_loop().time()
+            assert (await manager.find("Blind 3", timeout=5)).address == "02:00:00:00:43:03"
+            assert asyncio.get_event_loop().time() - started < 0.05
+        finally:
+            await manager.stop_background_scan()
+
+    asyncio.run(scenario())
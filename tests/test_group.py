@@ -0,0 +1,82 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import asyncio
+
+import pytest
+
+from am43_rc.emulator import AM43Emulator
+from am43_rc.entity import AM43State
+from am43_rc.group import AM43Group
+from am43_rc.service import AM43DeviceManager
+from ble_proxy.backend.simulated import SimulatedBackend
+
+from conftest import ZERO_LATENCY
+
+ADDRESSES = ["02:00:00:00:43:{:02X}".format(i + 1) for i in range(5)]
+
+
+def run_group(backend, scenario):
+    async def run():
+        manager = AM43DeviceManager(backend=backend)
+        try:
+            return await scenario(manager)
+        finally:
+            await manager.disconnect_all()
+
+    return asyncio.run(run())
+
+
+def test_command_runs_on_every_device(backend):
+    report = run_group(backend, lambda manager: AM43Group(manager, ADDRESSES).set_position(20))
+    assert report.ok
+    assert [x.address for x in report.results] == ADDRESSES
+    assert all(backend.get_peripheral(x).is_moving for x in ADDRESSES)
+
+
+def test_failure_of_one_device_does_not_affect_others():
+    backend = SimulatedBackend(profile=ZERO_LATENCY)
+    for address in ADDRESSES[1:]:
+        backend.add_peripheral(address, AM43Emulator(position=50))
+    report = run_group(backend, lambda manager: AM43Group(manager, ADDRESSES, connect_attempts=1).read_state())
+    assert not report.ok
+    (failed,) = report.failed
+    assert failed.address == ADDRESSES[0] and isinstance(failed.error, ValueError)
+    assert len(report.succeeded) == 4
+    assert all(isinstance(x.value, AM43State) and x.value.battery == 80 for x in report.succeeded)
+
+
+def test_concurrency_is_bounded(backend):
+    running = []
+    peak = []
+
+    async def command(device):
+        running.append(device.address)
+        peak.append(len(running))
+        await asyncio.sleep(0.02)
+        running.remove(device.address)
+        return device.address
+
+    report = run_group(backend, lambda manager: AM43Group(manager, ADDRESSES, concurrency=2).run(command))
+    assert report.ok
+    assert [x.value for x in report.results] == ADDRESSES
+    assert max(peak) == 2
+
+
+def test_concurrency_must_be_positive(backend):
+    with pytest.raises(ValueError):
+        AM43Group(AM43DeviceManager(backend=backend), ADDRESSES, concurrency=0)
@@ -0,0 +1,94 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import math
+
+from am43_rc import protocol
+from ble_proxy.backend.simulated import SimulatedBackend
+from ble_proxy.metrics import Histogram, InMemoryMetrics, render_prometheus
+from ble_proxy.timing import RTTEstimator
+
+from conftest import ADDRESS, ZERO_LATENCY, ReplyDroppingEmulator
+
+
+def test_histogram_quantile_is_bucket_upper_bound():
+    histogram = Histogram((0.1, 1.0))
+    assert math.isnan(histogram.quantile(0.5))
+    for value in (0.05, 0.1, 0.5, 5):
+        histogram.observe(value)
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.75) == 1.0
+    assert histogram.quantile(1) == math.inf
+
+
+def test_prometheus_rendering():
+    metrics = InMemoryMetrics(buckets=(1, 0.1), bucket_overrides={"move_seconds": (10,)})
+    metrics.inc("errors_total", address='a"b')
+    metrics.inc("errors_total", 2, address='a"b')
+    metrics.observe("command_seconds", 0.05, result="ok")
+    metrics.observe("command_seconds", 0.5, result="ok")
+    metrics.observe("move_seconds", 20)
+    assert render_prometheus(metrics, prefix="am43_") == "\n".join(
+        (
+            "# TYPE am43_errors_total counter",
+            'am43_errors_total{address="a\\"b"} 3',
+            "# TYPE am43_command_seconds histogram",
+            'am43_command_seconds_bucket{result="ok",le="0.1"} 1',
+            'am43_command_seconds_bucket{result="ok",le="1"} 2',
+            'am43_command_seconds_bucket{result="ok",le="+Inf"} 2',
+            'am43_command_seconds_sum{result="ok"} 0.55',
+            'am43_command_seconds_count{result="ok"} 2',
+            "# TYPE am43_move_seconds histogram",
+            'am43_move_seconds_bucket{le="10"} 0',
+            'am43_move_seconds_bucket{le="+Inf"} 1',
+            "am43_move_seconds_sum 20",
+            "am43_move_seconds_count 1",
+            "",
+        )
+    )
+
+
+def test_commands_and_connects_are_instrumented(backend, connect, metrics):
+    async def scenario():
+        async with connect(backend) as device:
+            await device.read_state()
+        labels = dict(address=ADDRESS, iface="hci0")
+        assert metrics.get_histogram("ble_connect_seconds", result="ok", **labels).count == 1
+        assert metrics.get_counter("ble_connect_attempts_total", iface="hci0", result="ok") == 1
+        assert metrics.get_histogram("ble_command_seconds", result="ok", **labels).count == 3
+        assert metrics.get_histogram("ble_lock_wait_seconds", **labels).count == 3
+        command = protocol.command_name(protocol.Cmd.GET_POSITION)
+        assert metrics.get_histogram("am43_command_seconds", address=ADDRESS, command=command).count == 1
+        assert "ble_command_retries_total" not in metrics.counters
+
+    asyncio.run(scenario())
+
+
+def test_lost_replies_are_counted(connect, metrics):
+    backend = SimulatedBackend(lambda address: ReplyDroppingEmulator(position=50), profile=ZERO_LATENCY)
+
+    async def scenario():
+        async with connect(backend) as device:
+            device.rtt = RTTEstimator(initial_timeout=0.1, min_timeout=0.05)
+            await device.read_position(max_age=0)
+        labels = dict(address=ADDRESS, iface="hci0")
+        assert metrics.get_counter("ble_reply_timeouts_total", **labels) == 1
+        assert metrics.get_counter("ble_command_retries_total", **labels) == 1
+        assert "ble_reply_timeouts_total" in render_prometheus(metrics)
+
+    asyncio.run(scenario())
@@ -0,0 +1,85 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+from am43_rc import protocol
+from am43_rc.emulator import AM43Emulator
+from am43_rc.motion import MotionResult
+from ble_proxy.backend.simulated import SimulatedBackend, LinkProfile
+from ble_proxy.timing import RTTEstimator
+
+from conftest import ADDRESS, ZERO_LATENCY, ReplyDroppingEmulator
+
+
+def test_handle_resolves_with_ack_after_return(connect):
+    backend = SimulatedBackend(lambda address: AM43Emulator(position=50), profile=LinkProfile(latency=0.05))
+
+    async def scenario():
+        async with connect(backend) as device:
+            handle = await device.set_position(80, wait=False)
+            assert not handle.done()
+            assert await handle == MotionResult(True, True)
+            assert (handle.target, handle.command) == (80, protocol.Cmd.SET_POSITION)
+            assert backend.get_peripheral(ADDRESS).is_moving
+
+    asyncio.run(scenario())
+
+
+def test_rejected_command_is_not_confirmed(connect):
+    backend = SimulatedBackend(lambda address: AM43Emulator(position=None), profile=ZERO_LATENCY)
+
+    async def scenario():
+        async with connect(backend) as device:
+            handle = await device.open(wait=False)
+            assert await handle.wait(timeout=1) == MotionResult(False, False)
+
+    asyncio.run(scenario())
+
+
+def make_lossy_backend(command: int, **emulator_options) -> SimulatedBackend:
+    return SimulatedBackend(
+        lambda address: ReplyDroppingEmulator((command,), travel_time=2, **emulator_options), profile=ZERO_LATENCY
+    )
+
+
+def test_lost_ack_is_verified_by_position(connect):
+    backend = make_lossy_backend(protocol.Cmd.SET_POSITION, position=50)
+
+    async def scenario():
+        async with connect(backend) as device:
+            device.rtt = RTTEstimator(initial_timeout=0.1, min_timeout=0.05)
+            device.MOTION_CHECK_INTERVAL = 0.1
+            handle = await device.set_position(80, wait=False)
+            result = await handle
+            assert result.confirmed and result.acknowledged is None
+            assert 50 < result.position < 80
+
+    asyncio.run(scenario())
+
+
+def test_lost_stop_ack_is_verified_by_position(connect):
+    backend = make_lossy_backend(protocol.Cmd.MOVE, position=50)
+
+    async def scenario():
+        async with connect(backend) as device:
+            device.rtt = RTTEstimator(initial_timeout=0.1, min_timeout=0.05)
+            device.MOTION_CHECK_INTERVAL = 0.1
+            handle = await device.stop(wait=False)
+            result = await handle
+            assert result == MotionResult(True, None, 50)
+
+    asyncio.run(scenario())
@@ -0,0 +1,101 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+import pytest
+
+from am43_rc.emulator import AM43Emulator
+from am43_rc.motion import MotionOutcome, MotionTracker
+from ble_proxy.backend.simulated import SimulatedBackend
+
+from conftest import ZERO_LATENCY
+
+
+def scripted(*positions):
+    """
+    read_position returning the given positions one by one, the last one is repeated
+    """
+    remaining = list(positions)
+
+    async def read_position():
+        return remaining.pop(0) if len(remaining) > 1 else remaining[0]
+
+    return read_position
+
+
+def test_tracker_reports_progress_until_target():
+    async def scenario():
+        finished = []
+        tracker = MotionTracker(
+            scripted(0, 10, 20, 30), 30, min_interval=0.01, max_interval=0.05, on_finished=finished.append
+        )
+        progress = [x async for x in tracker]
+        assert [x.position for x in progress] == [0, 10, 20, 30]
+        assert progress[-1].eta == 0
+        assert tracker.outcome == MotionOutcome.REACHED and finished == [tracker]
+        assert tracker.speed > 0
+        with pytest.raises(RuntimeError):
+            await tracker.wait()
+
+    asyncio.run(scenario())
+
+
+def test_tracker_detects_stall_and_stop():
+    async def scenario():
+        stalled = MotionTracker(scripted(0, 10, 20), 30, min_interval=0.01, max_interval=0.05, stall_timeout=0.2)
+        assert await stalled.wait(timeout=2) == MotionOutcome.STALLED
+        stopped = MotionTracker(scripted(0, 10), min_interval=0.01, max_interval=0.05, stall_timeout=0.2)
+        assert await stopped.wait(timeout=2) == MotionOutcome.STOPPED
+        unknown = MotionTracker(scripted(None), 30)
+        assert await unknown.wait(timeout=2) == MotionOutcome.UNKNOWN
+
+    asyncio.run(scenario())
+
+
+def test_tracker_polls_at_estimated_arrival():
+    async def scenario():
+        tracker = MotionTracker(scripted(0), 30, initial_speed=300, min_interval=0.01)
+        progress = tracker.__aiter__()
+        first = await progress.__anext__()
+        assert first.eta == pytest.approx(0.1)
+        started = asyncio.get_event_loop().time()
+        await progress.__anext__()
+        assert asyncio.get_event_loop().time() - started == pytest.approx(0.1, abs=0.05)
+        await progress.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_wait_until_position(connect):
+    backend = SimulatedBackend(lambda address: AM43Emulator(position=50, travel_time=1), profile=ZERO_LATENCY)
+
+    async def scenario():
+        async with connect(backend) as device:
+            await device.set_position(80)
+            assert await device.wait_until_position(80, timeout=3)
+            # Speed learned from the move is used for the next estimate
+            assert device.motion_speed > 0
+            await device.set_position(0)
+            with pytest.raises(asyncio.TimeoutError):
+                await device.wait_until_position(0, timeout=0.1)
+            tracker = device.track_motion(0, min_interval=0.05, max_interval=0.1, stall_timeout=0.2)
+            await asyncio.sleep(0.1)
+            await device.stop()
+            assert await tracker.wait(timeout=3) == MotionOutcome.STALLED
+            assert tracker.polls < 20
+
+    asyncio.run(scenario())
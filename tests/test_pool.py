@@ -0,0 +1,82 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import asyncio
+
+from am43_rc.service import AM43DeviceManager
+
+from conftest import ADDRESS
+
+OTHER = "02:00:00:00:43:02"
+
+
+def test_commands_on_connected_device_are_hits(backend):
+    async def scenario():
+        manager = AM43DeviceManager(backend=backend)
+        try:
+            device = await manager.connect(ADDRESS)
+            for _ in range(3):
+                await device.read_battery_status(max_age=0)
+            stats = manager.pool_stats
+            assert (stats.hits, stats.misses, stats.connected) == (3, 1, 1)
+            assert stats.hit_ratio == 0.75
+            await manager.connect(ADDRESS)
+            assert manager.pool_stats.hits == 4
+        finally:
+            await manager.disconnect_all()
+
+    asyncio.run(scenario())
+
+
+def test_least_recently_used_device_is_evicted(backend):
+    async def scenario():
+        manager = AM43DeviceManager(max_connections_per_iface=1, backend=backend)
+        try:
+            first = await manager.connect(ADDRESS)
+            second = await manager.connect(OTHER)
+            assert not first.has_active_connection and second.has_active_connection
+            assert manager.pool_stats.evictions == 1
+            # Evicted device is re-connected transparently once used, freeing the slot again
+            assert await first.read_battery_status(max_age=0) == 80
+            assert first.has_active_connection and not second.has_active_connection
+            stats = manager.pool_stats
+            assert (stats.misses, stats.evictions, stats.connected) == (3, 2, 1)
+        finally:
+            await manager.disconnect_all()
+
+    asyncio.run(scenario())
+
+
+def test_idle_device_is_evicted_in_background(backend):
+    async def scenario():
+        manager = AM43DeviceManager(idle_timeout=0.2, backend=backend)
+        try:
+            device = await manager.connect(ADDRESS)
+            await asyncio.sleep(0.1)
+            await device.read_light_status(max_age=0)
+            await asyncio.sleep(0.15)
+            # Recently used device is kept
+            assert device.has_active_connection
+            await asyncio.sleep(0.3)
+            assert not device.has_active_connection
+            assert manager.pool_stats.evictions == 1
+            assert await device.read_light_status(max_age=0) == 5
+            assert manager.pool_stats.misses == 2
+        finally:
+            await manager.disconnect_all()
+
+    asyncio.run(scenario())
@@ -0,0 +1,169 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import asyncio
+from typing import Optional
+
+import pytest
+
+from am43_rc import protocol
+from am43_rc.emulator import AM43Emulator
+from ble_proxy.backend.simulated import SimulatedBackend
+
+from conftest import ZERO_LATENCY
+
+CONTROL_CHAR = protocol.CONTROL_RW_CHARACTERISTIC_UUID
+
+
+def exchange(emulator: AM43Emulator, frame: bytes) -> bytes:
+    (reply,) = [data for char, data in emulator.handle_write(CONTROL_CHAR, frame)]
+    return reply
+
+
+def test_command_frame_layout():
+    frame = protocol.build_frame(protocol.Cmd.SET_POSITION, bytes((42,)))
+    assert frame[:5] == protocol.CMD_PREFIX
+    assert frame[5:8] == bytes((protocol.Cmd.SET_POSITION, 1, 42))
+    assert frame[-1] == protocol.calc_crc(frame[:-1])
+    assert protocol.Frames.SET_POSITION[42] == frame
+
+
+def test_emulator_replies_are_decoded():
+    emulator = AM43Emulator(position=30, battery=77, light=9, speed=40)
+    assert protocol.decode_reply(exchange(emulator, protocol.Frames.GET_BATTERY)) == (protocol.Cmd.GET_BATTERY, 77)
+    assert protocol.decode_reply(exchange(emulator, protocol.Frames.GET_LIGHT)) == (protocol.Cmd.GET_LIGHT, 9)
+    command, status = protocol.decode_reply(exchange(emulator, protocol.Frames.GET_POSITION))
+    assert command == protocol.Cmd.GET_POSITION
+    assert (status.position, status.speed, status.has_light_sensor) == (30, 40, True)
+    assert protocol.decode_reply(exchange(emulator, protocol.Frames.STOP)) == (protocol.Cmd.MOVE, True)
+
+
+def test_replies_pass_verification():
+    emulator = AM43Emulator()
+    for command, frame in (
+        (protocol.Cmd.GET_BATTERY, protocol.Frames.GET_BATTERY),
+        (protocol.Cmd.GET_POSITION, protocol.Frames.GET_POSITION),
+        (protocol.Cmd.SET_POSITION, protocol.Frames.SET_POSITION[10]),
+    ):
+        reply = exchange(emulator, frame)
+        protocol.verify_reply(reply, command, check_crc=True)
+        assert protocol.is_crc_valid(reply)
+
+
+def test_position_unknown_without_limits():
+    emulator = AM43Emulator(position=None)
+    _, status = protocol.decode_reply(exchange(emulator, protocol.Frames.GET_POSITION))
+    assert status.position is None
+    assert protocol.decode_reply(exchange(emulator, protocol.Frames.OPEN)) == (protocol.Cmd.MOVE, False)
+
+
+def test_corrupted_command_is_ignored_by_emulator():
+    emulator = AM43Emulator()
+    frame = bytearray(protocol.Frames.GET_BATTERY)
+    frame[-1] ^= 0xFF
+    assert emulator.handle_write(CONTROL_CHAR, bytes(frame)) == []
+    assert emulator.crc_errors == 1
+
+
+def test_verify_reply_rejects_foreign_and_corrupted_replies():
+    reply = bytearray(exchange(AM43Emulator(), protocol.Frames.GET_LIGHT))
+    with pytest.raises(ValueError):
+        protocol.verify_reply(reply, protocol.Cmd.GET_BATTERY)
+    reply[-1] ^= 0xFF
+    protocol.verify_reply(reply, protocol.Cmd.GET_LIGHT)
+    assert not protocol.is_crc_valid(reply)
+    with pytest.raises(ValueError, match="CRC"):
+        protocol.verify_reply(reply, protocol.Cmd.GET_LIGHT, check_crc=True)
+
+
+@pytest.mark.parametrize(
+    "frame",
+    [
+        bytes((protocol.REPLY_MARKER, protocol.Cmd.GET_BATTERY, 1, 0x00)),
+        bytes((protocol.REPLY_MARKER, protocol.Cmd.GET_LIGHT, 0)),
+        bytes((protocol.REPLY_MARKER, protocol.Cmd.MOVE, 0)),
+        bytes((protocol.REPLY_MARKER, protocol.Cmd.GET_POSITION, 2, 0x1C, 0x1E)),
+        bytes((protocol.REPLY_MARKER, 0x77, 1, 0x00)),
+        bytes((0x00, protocol.Cmd.GET_BATTERY, 1)),
+        b"",
+    ],
+)
+def test_malformed_reply_raises_value_error(frame):
+    with pytest.raises(ValueError):
+        protocol.decode_reply(frame)
+
+
+def test_truncated_status_raises_value_error():
+    reply = exchange(AM43Emulator(), protocol.Frames.GET_POSITION)
+    with pytest.raises(ValueError, match="Truncated status"):
+        protocol.decode_status(reply[:-3])
+
+
+class TruncatingEmulator(AM43Emulator):
+    """
+    Cuts payload of GET_POSITION replies short
+    """
+
+    def handle_command(self, command: int, params: bytes) -> Optional[bytes]:
+        reply = super().handle_command(command, params)
+        if reply is not None and command == protocol.Cmd.GET_POSITION:
+            reply = protocol.build_reply(command, reply[protocol.REPLY_HEADER_SIZE : protocol.REPLY_HEADER_SIZE + 2])
+        return reply
+
+
+def test_device_reports_truncated_status_as_value_error(connect):
+    backend = SimulatedBackend(lambda address: TruncatingEmulator(position=50), profile=ZERO_LATENCY)
+
+    async def scenario():
+        async with connect(backend) as device:
+            with pytest.raises(ValueError):
+                await device.read_status()
+            state = await device.read_state(partial=True, max_age=0)
+            assert isinstance(state.errors["position"], ValueError)
+            assert (state.battery, state.light) == (80, 5)
+
+    asyncio.run(scenario())
+
+
+def test_stream_is_split_into_frames():
+    emulator = AM43Emulator(battery=60, light=3)
+    replies = [exchange(emulator, f) for f in (protocol.Frames.GET_BATTERY, protocol.Frames.GET_LIGHT)]
+    truncated = replies[0][:-2]
+    stream = b"\x00\x11" + replies[0] + b"\xff" + replies[1] + truncated
+    frames = list(protocol.iter_frames(stream))
+    assert [bytes(f) for f in frames] == replies
+    assert list(protocol.decode_batch(frames)) == [(protocol.Cmd.GET_BATTERY, 60), (protocol.Cmd.GET_LIGHT, 3)]
+
+
+def test_decode_batch_skip_invalid():
+    frames = [
+        bytes((protocol.REPLY_MARKER, protocol.Cmd.GET_BATTERY, 0)),
+        protocol.build_reply(protocol.Cmd.MOVE, b"\x5a"),
+    ]
+    assert list(protocol.decode_batch(frames)) == [(protocol.Cmd.MOVE, True)]
+    with pytest.raises(ValueError):
+        list(protocol.decode_batch(frames, skip_invalid=False))
+
+
+def test_device_reads_state_from_emulator(backend, connect):
+    async def scenario():
+        async with connect(backend) as device:
+            state = await device.read_state(max_age=0)
+            assert (state.battery, state.light, state.position) == (80, 5, 50)
+            assert not state.errors
+
+    asyncio.run(scenario())
@@ -0,0 +1,105 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+import pytest
+
+from ble_proxy.error import NotConnectedError
+from ble_proxy.timing import ReconnectPolicy, RetryPolicy
+
+from conftest import ADDRESS
+
+
+def test_reconnect_delays_grow_up_to_limit():
+    policy = ReconnectPolicy(initial_delay=1, max_delay=5, jitter=0, max_attempts=5)
+    assert list(policy.delays()) == [1, 2, 4, 5]
+    jittered = ReconnectPolicy(initial_delay=1, jitter=0.2)
+    delays = jittered.delays()
+    for expected in (1, 2, 4, 8):
+        assert expected * 0.8 <= next(delays) <= expected * 1.2
+
+
+def test_lost_link_is_restored_in_background(backend, connect, metrics):
+    async def scenario():
+        policy = ReconnectPolicy(initial_delay=0.05, jitter=0)
+        async with connect(backend, reconnect_policy=policy) as device:
+            device._connection.drop_link()
+            assert device.is_reconnecting
+            # Command issued while reconnecting waits for the link instead of failing
+            assert await device.read_battery_status(max_age=0) == 80
+            assert (device.disconnect_count, device.reconnect_count) == (1, 1)
+            assert await device.is_connected()
+        labels = dict(address=ADDRESS, iface="hci0")
+        assert metrics.get_counter("ble_link_lost_total", **labels) == 1
+        assert metrics.get_counter("ble_reconnects_total", **labels) == 1
+
+    asyncio.run(scenario())
+
+
+def test_reconnect_retries_failed_attempts(backend, connect):
+    async def scenario():
+        policy = ReconnectPolicy(initial_delay=0.02, jitter=0)
+        async with connect(backend, reconnect_policy=policy) as device:
+            connection = device._connection
+            attempts = []
+            original_connect = connection.connect
+
+            async def flaky_connect(timeout: float = 2) -> bool:
+                attempts.append(timeout)
+                if len(attempts) < 3:
+                    raise ConnectionError("Out of range")
+                return await original_connect(timeout)
+
+            connection.connect = flaky_connect
+            connection.drop_link()
+            assert await device.read_position(max_age=0) == 50
+            assert len(attempts) == 3 and device.reconnect_count == 1
+
+    asyncio.run(scenario())
+
+
+def test_commands_fail_once_reconnect_gives_up(backend, connect):
+    async def scenario():
+        policy = ReconnectPolicy(initial_delay=0.02, jitter=0, max_attempts=2)
+        async with connect(backend, reconnect_policy=policy) as device:
+
+            async def unreachable(timeout: float = 2) -> bool:
+                raise ConnectionError("Out of range")
+
+            device._connection.connect = unreachable
+            device.retry_policy = RetryPolicy(max_attempts=1)
+            device._connection.drop_link()
+            with pytest.raises(NotConnectedError):
+                await device.read_battery_status(max_age=0)
+            assert not device.is_reconnecting
+            # The next command connects on demand and reports the connection error
+            with pytest.raises(ConnectionError):
+                await device.read_battery_status(max_age=0)
+
+    asyncio.run(scenario())
+
+
+def test_requested_disconnect_is_not_restored(backend, connect):
+    async def scenario():
+        async with connect(backend, reconnect_policy=ReconnectPolicy(initial_delay=0.01)) as device:
+            await device.disconnect()
+            await asyncio.sleep(0.05)
+            assert not device.is_reconnecting
+            assert device.disconnect_count == 0
+            assert not await device.is_connected()
+
+    asyncio.run(scenario())
@@ -0,0 +1,114 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import asyncio
+
+import pytest
+
+from am43_rc import protocol
+from am43_rc.emulator import create_backend
+from am43_rc.service import AM43DeviceManager
+from ble_proxy.backend.recording import RecordingBackend
+from ble_proxy.backend.replay import ReplayBackend, ReplayMismatch
+from ble_proxy.trace import TraceEvent, load_trace
+
+from conftest import ADDRESS, ZERO_LATENCY
+
+
+async def exercise(device):
+    state = await device.read_state(max_age=0)
+    handle = await device.set_position(70, wait=False)
+    acknowledged = (await handle).acknowledged
+    status = await device.read_status()
+    return (state.battery, state.light, state.position, acknowledged, status)
+
+
+@pytest.fixture
+def trace(tmp_path, backend, connect):
+    path = str(tmp_path / "session.trace")
+    recorder = RecordingBackend(path, backend)
+
+    async def record():
+        async with connect(recorder) as device:
+            return await exercise(device)
+
+    try:
+        recorded = asyncio.run(record())
+    finally:
+        recorder.close()
+    return path, recorded
+
+
+def test_trace_contains_session(trace):
+    path, _ = trace
+    records = load_trace(path)
+    assert {rec.address for rec in records} == {ADDRESS}
+    events = [rec.event for rec in records]
+    assert events[0] == TraceEvent.CONNECT and TraceEvent.DISCONNECT in events
+    writes = [bytes(rec.data) for rec in records if rec.event in (TraceEvent.WRITE, TraceEvent.WRITE_WITH_RESPONSE)]
+    assert protocol.Frames.SET_POSITION[70] in writes
+    notifications = [rec.data for rec in records if rec.event == TraceEvent.NOTIFY]
+    assert notifications and all(protocol.is_crc_valid(data) for data in notifications)
+
+
+def test_replay_reproduces_recorded_session(trace, connect):
+    path, recorded = trace
+    backend = ReplayBackend(path, speed=None, strict=True)
+
+    async def replay():
+        async with connect(backend) as device:
+            return await exercise(device)
+
+    assert asyncio.run(replay()) == recorded
+    session = backend.sessions[ADDRESS]
+    assert session.finished
+    assert session.mismatches == 0
+
+
+def test_strict_replay_detects_divergence(trace, connect):
+    path, _ = trace
+    backend = ReplayBackend(path, speed=None, strict=True)
+
+    async def diverge():
+        async with connect(backend) as device:
+            await device.set_position(30)
+
+    with pytest.raises(ReplayMismatch):
+        asyncio.run(diverge())
+
+
+def test_background_scan_is_recorded_and_replayed(tmp_path):
+    path = str(tmp_path / "scan.trace")
+
+    async def scan(backend):
+        manager = AM43DeviceManager(backend=backend)
+        await manager.start_background_scan()
+        await asyncio.sleep(0.35)
+        await manager.stop_background_scan()
+        return sorted((x.address, x.name) for x in manager.get_known_devices())
+
+    recorder = RecordingBackend(path, create_backend(3, ZERO_LATENCY))
+    try:
+        recorded = asyncio.run(scan(recorder))
+    finally:
+        recorder.close()
+    assert len(recorded) == 3
+    scanned = [rec for rec in load_trace(path) if rec.event == TraceEvent.SCAN_ADVERTISEMENT]
+    assert len(scanned) >= 9
+
+    replayed = asyncio.run(scan(ReplayBackend(path, speed=None)))
+    assert replayed == recorded
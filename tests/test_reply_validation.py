@@ -0,0 +1,111 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import asyncio
+from typing import Optional
+
+import pytest
+
+from am43_rc import protocol
+from am43_rc.emulator import AM43Emulator
+from ble_proxy.backend.simulated import SimulatedBackend
+
+from conftest import ADDRESS, ZERO_LATENCY
+
+
+class CorruptingEmulator(AM43Emulator):
+    """
+    Flips CRC of the replies to the given commands
+    """
+
+    def __init__(self, corrupted=(protocol.Cmd.GET_BATTERY,), **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.corrupted = corrupted
+
+    def handle_command(self, command: int, params: bytes) -> Optional[bytes]:
+        reply = super().handle_command(command, params)
+        if reply is not None and command in self.corrupted:
+            reply = reply[:-1] + bytes((reply[-1] ^ 0xFF,))
+        return reply
+
+
+@pytest.fixture
+def corrupting_backend() -> SimulatedBackend:
+    return SimulatedBackend(lambda address: CorruptingEmulator(position=50), profile=ZERO_LATENCY)
+
+
+def reply_errors(metrics, command: str, reason: str) -> float:
+    return metrics.get_counter("am43_reply_errors_total", address=ADDRESS, command=command, reason=reason)
+
+
+def test_reply_with_bad_crc_is_rejected(corrupting_backend, connect, metrics):
+    async def scenario():
+        async with connect(corrupting_backend) as device:
+            with pytest.raises(ValueError, match="CRC"):
+                await device.read_battery_status(max_age=0)
+            # Other commands are not affected
+            assert await device.read_light_status(max_age=0) == 5
+            assert reply_errors(metrics, "GET_BATTERY", "crc") == 1
+            assert reply_errors(metrics, "GET_LIGHT", "crc") == 0
+
+    asyncio.run(scenario())
+
+
+def test_partial_state_reports_crc_error(corrupting_backend, connect):
+    async def scenario():
+        async with connect(corrupting_backend) as device:
+            state = await device.read_state(partial=True, max_age=0)
+            assert state.battery is None
+            assert isinstance(state.errors["battery"], ValueError)
+            assert (state.light, state.position) == (5, 50)
+
+    asyncio.run(scenario())
+
+
+def test_bad_crc_is_counted_when_verification_disabled(corrupting_backend, connect, metrics):
+    async def scenario():
+        async with connect(corrupting_backend) as device:
+            device.VERIFY_REPLY_CRC = False
+            assert await device.read_battery_status(max_age=0) == 80
+            assert reply_errors(metrics, "GET_BATTERY", "crc") == 1
+
+    asyncio.run(scenario())
+
+
+def test_bad_crc_of_motion_ack_is_rejected(connect, metrics):
+    backend = SimulatedBackend(
+        lambda address: CorruptingEmulator(corrupted=(protocol.Cmd.SET_POSITION,), position=50), profile=ZERO_LATENCY
+    )
+
+    async def scenario():
+        async with connect(backend) as device:
+            handle = await device.set_position(20, wait=False)
+            with pytest.raises(ValueError, match="CRC"):
+                await handle
+            assert reply_errors(metrics, "SET_POSITION", "crc") == 1
+
+    asyncio.run(scenario())
+
+
+def test_valid_replies_are_not_counted(backend, connect, metrics):
+    async def scenario():
+        async with connect(backend) as device:
+            await device.read_state(max_age=0)
+            await device.set_position(20)
+            assert "am43_reply_errors_total" not in metrics.counters
+
+    asyncio.run(scenario())
@@ -0,0 +1,79 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import types
+
+from am43_rc.emulator import create_backend
+from am43_rc.service import AM43DeviceManager
+from ble_proxy import scanner
+from ble_proxy.scanner import Advertisement, DeviceRegistry
+
+from conftest import ADDRESS, ZERO_LATENCY
+
+
+def make_registry(monkeypatch, **kwargs):
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(scanner, "time", types.SimpleNamespace(monotonic=lambda: clock.now))
+    return DeviceRegistry(**kwargs), clock
+
+
+def test_registry_smooths_rssi(monkeypatch):
+    registry, _ = make_registry(monkeypatch, rssi_smoothing=0.5)
+    assert registry.update(Advertisement(ADDRESS, "Blind 1", -80))
+    assert not registry.update(Advertisement(ADDRESS, "Blind 1", -60))
+    assert registry.get(ADDRESS).rssi == -70
+    # Advertisement without RSSI or name keeps the previous values
+    registry.update(Advertisement(ADDRESS, None, None))
+    entry = registry.get(ADDRESS)
+    assert (entry.rssi, entry.bt_device_name) == (-70, "Blind 1")
+
+
+def test_registry_expires_silent_devices(monkeypatch):
+    registry, clock = make_registry(monkeypatch, expiry=10)
+    registry.update(Advertisement(ADDRESS, "Blind 1", -60), name="Kitchen")
+    clock.now += 5
+    assert registry.find_by_name("Kitchen").address == ADDRESS
+    assert registry.find_by_name("Blind 1").address == ADDRESS
+    clock.now += 6
+    assert registry.get(ADDRESS) is None
+    assert len(registry) == 0
+    # Device seen again after expiry is reported as new one
+    assert registry.update(Advertisement(ADDRESS, "Blind 1", -60))
+
+
+def test_background_scan_collects_target_devices():
+    backend = create_backend(2, ZERO_LATENCY)
+    backend.advertisements.append(Advertisement("02:00:00:00:00:99", "Speaker", -40))
+
+    async def scenario():
+        manager = AM43DeviceManager(ifaces=["hci0", "hci1"], backend=backend)
+        await manager.start_background_scan()
+        try:
+            assert manager.is_scanning
+            await asyncio.sleep(0.3)
+            known = sorted(manager.get_known_devices(), key=lambda x: x.address)
+            assert [(x.address, x.name) for x in known] == [(ADDRESS, "Blind 1"), ("02:00:00:00:43:02", "Blind 2")]
+            assert all(-75 < x.rssi < -45 for x in known)
+            # Discovery is served from the registry without waiting for a scan
+            started = asyncio.get_event_loop().time()
+            assert len(await manager.discover(timeout=5)) == 2
+            assert asyncio.get_event_loop().time() - started < 1
+        finally:
+            await manager.stop_background_scan()
+        assert not manager.is_scanning
+
+    asyncio.run(scenario())
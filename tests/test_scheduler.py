@@ -0,0 +1,141 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import asyncio
+
+import pytest
+
+from am43_rc.emulator import AM43Emulator
+from am43_rc.service import AM43DeviceManager
+from ble_proxy.backend.simulated import SimulatedBackend, SimulatedBLEConnection, LinkProfile
+from ble_proxy.error import NotConnectedError
+from ble_proxy.scheduler import AdapterScheduler, OperationKind, is_adapter_failure
+
+from conftest import ADDRESS, ZERO_LATENCY
+
+UNREACHABLE = "02:00:00:00:43:FF"
+
+
+class BleakError(Exception):
+    pass
+
+
+class BleakDeviceNotFoundError(BleakError):
+    pass
+
+
+class PartlyUnreachableBackend(SimulatedBackend):
+    """
+    Connections to UNREACHABLE use the given link profile
+    """
+
+    def __init__(self, unreachable_profile: LinkProfile) -> None:
+        super().__init__(lambda address: AM43Emulator(position=50), profile=ZERO_LATENCY)
+        self.unreachable_profile = unreachable_profile
+
+    def create_connection(self, target, iface):
+        if target == UNREACHABLE:
+            return SimulatedBLEConnection(target, self.get_peripheral(target), iface, self.unreachable_profile)
+        return super().create_connection(target, iface)
+
+
+@pytest.mark.parametrize(
+    "error",
+    [asyncio.TimeoutError(), NotConnectedError(), ConnectionRefusedError(), ValueError(), BleakDeviceNotFoundError()],
+)
+@pytest.mark.parametrize("kind", [OperationKind.CONNECT, OperationKind.WRITE])
+def test_device_errors_are_not_adapter_failures(kind, error):
+    assert not is_adapter_failure(kind, error)
+
+
+@pytest.mark.parametrize("error", [BleakError(), OSError(19, "No such device"), RuntimeError()])
+@pytest.mark.parametrize("kind", [OperationKind.CONNECT, OperationKind.WRITE])
+def test_stack_errors_are_adapter_failures(kind, error):
+    assert is_adapter_failure(kind, error)
+
+
+def test_failing_adapter_cools_down():
+    async def scenario():
+        scheduler = AdapterScheduler(["hci0", "hci1"], failure_threshold=2, cooldown=0.1)
+        for _ in range(2):
+            with pytest.raises(BleakError):
+                async with scheduler.slot("hci0", OperationKind.CONNECT):
+                    raise BleakError()
+        assert scheduler.healthy_ifaces == ["hci1"]
+        assert scheduler.choose_adapter(ADDRESS) == "hci1"
+        await asyncio.sleep(0.15)
+        assert scheduler.is_healthy("hci0")
+        assert scheduler.choose_adapter(ADDRESS) == "hci0"
+
+    asyncio.run(scenario())
+
+
+def test_success_resets_failure_count():
+    async def scenario():
+        scheduler = AdapterScheduler(["hci0"], failure_threshold=2)
+        scheduler.report_failure("hci0")
+        async with scheduler.slot("hci0", OperationKind.WRITE):
+            pass
+        scheduler.report_failure("hci0")
+        assert scheduler.is_healthy("hci0")
+
+    asyncio.run(scenario())
+
+
+def test_device_errors_keep_adapter_healthy():
+    async def scenario():
+        scheduler = AdapterScheduler(["hci0"], failure_threshold=1)
+        for error in (asyncio.TimeoutError(), ConnectionRefusedError()):
+            with pytest.raises(type(error)):
+                async with scheduler.slot("hci0", OperationKind.CONNECT):
+                    raise error
+        assert scheduler.is_healthy("hci0")
+
+    asyncio.run(scenario())
+
+
+def test_placement_prefers_stronger_signal():
+    scheduler = AdapterScheduler(["hci0", "hci1"], max_links_per_iface=1)
+    scheduler.record_rssi("hci1", ADDRESS, -50)
+    scheduler.record_rssi("hci0", ADDRESS, -80)
+    assert scheduler.choose_adapter(ADDRESS) == "hci1"
+    # Adapter without free link slots is used only if there is no other option
+    assert scheduler.choose_adapter(ADDRESS, {"hci1": 1}) == "hci0"
+
+
+@pytest.mark.parametrize(
+    "profile",
+    [
+        LinkProfile(latency=0, connect_latency=0, connect_failure_rate=1.0),  # Connection refused
+        LinkProfile(latency=0, connect_latency=1),  # Out of range, times out
+    ],
+    ids=["refused", "timeout"],
+)
+def test_unreachable_device_does_not_degrade_adapter(profile):
+    async def scenario():
+        manager = AM43DeviceManager(ifaces=["hci0", "hci1"], backend=PartlyUnreachableBackend(profile))
+        try:
+            for _ in range(5):
+                with pytest.raises((ConnectionError, asyncio.TimeoutError)):
+                    await manager.connect(UNREACHABLE, timeout=0.05)
+            device = await manager.connect(ADDRESS)
+            # hci0 is preferred unless it is considered failing
+            assert device.iface == "hci0"
+        finally:
+            await manager.disconnect_all()
+
+    asyncio.run(scenario())
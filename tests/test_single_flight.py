@@ -0,0 +1,95 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import asyncio
+
+import pytest
+
+from am43_rc import protocol
+from ble_proxy.utils import SingleFlight
+
+from conftest import ADDRESS
+
+
+def test_concurrent_calls_share_result():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def query():
+            calls.append(1)
+            number = len(calls)
+            await asyncio.sleep(0.01)
+            return number
+
+        results = await asyncio.gather(*[flight.run("key", query) for _ in range(5)], flight.run("other", query))
+        assert results == [1, 1, 1, 1, 1, 2]
+        assert flight.shared_calls == 4
+        assert not flight.is_in_flight("key")
+        # Finished call isn't reused
+        assert await flight.run("key", query) == 3
+
+    asyncio.run(scenario())
+
+
+def test_error_is_delivered_to_all_callers():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(*[flight.run("key", failing) for _ in range(3)], return_exceptions=True)
+        assert all(isinstance(x, ValueError) for x in results)
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_caller_does_not_cancel_others():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def query():
+            await asyncio.sleep(0.02)
+            return "done"
+
+        first = asyncio.ensure_future(flight.run("key", query))
+        second = asyncio.ensure_future(flight.run("key", query))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == "done"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+    asyncio.run(scenario())
+
+
+def test_identical_device_queries_are_sent_once(backend, connect):
+    async def scenario():
+        async with connect(backend) as device:
+            emulator = backend.get_peripheral(ADDRESS)
+            emulator.received_commands.clear()
+            batteries = await asyncio.gather(*[device.read_battery_status(max_age=0) for _ in range(4)])
+            states = await asyncio.gather(*[device.read_state(max_age=0) for _ in range(3)])
+            assert batteries == [80] * 4
+            assert all(x.position == 50 for x in states)
+            commands = [frame[5] for frame in emulator.received_commands]
+            assert commands.count(protocol.Cmd.GET_BATTERY) == 2
+            assert commands.count(protocol.Cmd.GET_POSITION) == 1
+
+    asyncio.run(scenario())
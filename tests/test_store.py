@@ -0,0 +1,104 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import json
+
+from am43_rc.emulator import create_backend
+from am43_rc.service import AM43DeviceManager
+from ble_proxy.backend.simulated import SimulatedBLEConnection
+from ble_proxy.store import DeviceMetadataStore
+
+import pytest
+
+from conftest import ADDRESS, ZERO_LATENCY
+
+
+def test_records_survive_reload(tmp_path):
+    path = str(tmp_path / "devices.json")
+    store = DeviceMetadataStore(path)
+    store.update(ADDRESS, name="Kitchen", iface="hci1", rssi=-70, handles={"fe51": 42})
+    store.update(ADDRESS, rssi=None, state={"position": 30})
+    store.save()
+    loaded = DeviceMetadataStore(path)
+    loaded.load()
+    record = loaded.find_by_name("Kitchen")
+    assert (record.address, record.iface, record.rssi) == (ADDRESS, "hci1", -70)
+    assert (record.handles, record.state) == ({"fe51": 42}, {"position": 30})
+    with pytest.raises(ValueError):
+        store.update(ADDRESS, colour="red")
+
+
+def test_broken_or_foreign_file_results_in_empty_store(tmp_path):
+    path = tmp_path / "devices.json"
+    store = DeviceMetadataStore(str(path))
+    for content in ("{broken", json.dumps(dict(version=99, devices=[dict(address=ADDRESS)]))):
+        path.write_text(content)
+        store.load()
+        assert store.records() == []
+
+
+def test_flush_is_debounced(tmp_path):
+    path = tmp_path / "devices.json"
+
+    async def scenario():
+        store = DeviceMetadataStore(str(path), flush_delay=0.05)
+        store.update(ADDRESS, name="Kitchen")
+        store.update(ADDRESS, rssi=-60)
+        assert not path.exists()
+        await asyncio.sleep(0.1)
+        assert json.loads(path.read_text())["devices"][0]["rssi"] == -60
+
+    asyncio.run(scenario())
+
+
+def test_restarted_manager_reuses_metadata(tmp_path, monkeypatch):
+    path = str(tmp_path / "devices.json")
+    backend = create_backend(1, ZERO_LATENCY, position=50)
+    hints = []
+    resolve = SimulatedBLEConnection.resolve_characteristic
+
+    async def resolve_recording(self, characteristic, handle_hint=None):
+        hints.append(handle_hint)
+        return await resolve(self, characteristic, handle_hint)
+
+    monkeypatch.setattr(SimulatedBLEConnection, "resolve_characteristic", resolve_recording)
+
+    async def first_run():
+        manager = AM43DeviceManager(metadata_store=DeviceMetadataStore(path), backend=backend)
+        try:
+            await manager.discover(timeout=0)
+            device = await manager.connect(ADDRESS)
+            await device.read_state()
+        finally:
+            await manager.disconnect_all()
+
+    async def second_run():
+        manager = AM43DeviceManager(metadata_store=DeviceMetadataStore(path), backend=backend)
+        try:
+            assert manager.get_last_known_state(ADDRESS).position == 50
+            device = await manager.connect(ADDRESS)
+            assert device.name == "Blind 1"
+            assert (await device.read_state()).position == 50
+        finally:
+            await manager.disconnect_all()
+
+    asyncio.run(first_run())
+    assert None in hints
+    del hints[:]
+    asyncio.run(second_run())
+    # Handles resolved by the previous process are passed as hints so service lookup is skipped
+    assert hints and None not in hints
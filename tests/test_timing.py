@@ -0,0 +1,102 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+import pytest
+
+from am43_rc import protocol
+from ble_proxy.backend.simulated import SimulatedBackend
+from ble_proxy.error import NotConnectedError
+from ble_proxy.timing import RTTEstimator, RetryPolicy
+
+from conftest import ADDRESS, ZERO_LATENCY, ReplyDroppingEmulator
+
+
+def test_timeout_follows_rtt_samples():
+    rtt = RTTEstimator(initial_timeout=1, min_timeout=0.01)
+    assert rtt.timeout == 1
+    rtt.sample(0.1)
+    assert (rtt.srtt, rtt.rttvar) == (0.1, 0.05)
+    assert rtt.timeout == pytest.approx(0.1 + 4 * 0.05)
+    for _ in range(50):
+        rtt.sample(0.1)
+    # Stable link converges to smoothed RTT
+    assert rtt.timeout == pytest.approx(0.1, abs=0.01)
+
+
+def test_timeout_backs_off_until_fresh_reply():
+    rtt = RTTEstimator(initial_timeout=1, max_timeout=5)
+    rtt.on_timeout()
+    assert rtt.timeout == 2
+    rtt.on_timeout()
+    rtt.on_timeout()
+    assert rtt.timeout == 5
+    assert rtt.stats.loss_ratio == 1
+    rtt.on_reply()
+    assert rtt.timeout == 1
+    assert rtt.samples == 0
+
+
+def test_only_idempotent_transient_failures_are_retried():
+    policy = RetryPolicy(max_attempts=2)
+    assert policy.should_retry(1, asyncio.TimeoutError(), idempotent=True)
+    assert policy.should_retry(1, NotConnectedError(), idempotent=True)
+    assert not policy.should_retry(2, asyncio.TimeoutError(), idempotent=True)
+    assert not policy.should_retry(1, asyncio.TimeoutError(), idempotent=False)
+    assert not policy.should_retry(1, ValueError(), idempotent=True)
+
+
+def make_backend(dropped) -> SimulatedBackend:
+    return SimulatedBackend(
+        lambda address: ReplyDroppingEmulator(dropped, drop_count=1, position=50), profile=ZERO_LATENCY
+    )
+
+
+def test_lost_reply_to_query_is_retried_without_rtt_sample(connect):
+    backend = make_backend((protocol.Cmd.GET_POSITION,))
+
+    async def scenario():
+        async with connect(backend) as device:
+            device.rtt = RTTEstimator(initial_timeout=0.1, min_timeout=0.05)
+            assert await device.read_position(max_age=0) == 50
+            stats = device.link_stats
+            assert (stats.timeouts, stats.retries) == (1, 1)
+            # Reply to the retransmitted command can't be matched with the attempt (Karn's algorithm)
+            assert stats.samples == 0
+            await device.read_battery_status(max_age=0)
+            assert device.link_stats.samples == 1
+        position_queries = [
+            x for x in backend.get_peripheral(ADDRESS).received_commands if x[5] == protocol.Cmd.GET_POSITION
+        ]
+        assert len(position_queries) == 2
+
+    asyncio.run(scenario())
+
+
+def test_lost_reply_to_relative_move_is_not_retried(connect):
+    backend = make_backend((protocol.Cmd.MOVE,))
+
+    async def scenario():
+        async with connect(backend) as device:
+            device.rtt = RTTEstimator(initial_timeout=0.1, min_timeout=0.05)
+            with pytest.raises(asyncio.TimeoutError):
+                await device.close()
+            assert device.link_stats.retries == 0
+        moves = [x for x in backend.get_peripheral(ADDRESS).received_commands if x[5] == protocol.Cmd.MOVE]
+        assert len(moves) == 1
+
+    asyncio.run(scenario())
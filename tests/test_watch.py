@@ -0,0 +1,131 @@
+#    AM43 Remote Control
+#    Copyright (C) 2020 Dmitry Berezovsky
+#
+#    am43 is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    am43 is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+import pytest
+
+from am43_rc import protocol
+from am43_rc.emulator import create_backend
+from am43_rc.service import AM43DeviceManager
+from ble_proxy.broadcast import Broadcaster
+
+from conftest import ADDRESS, ZERO_LATENCY
+
+
+def test_broadcaster_fans_out_to_bounded_subscriptions():
+    async def scenario():
+        broadcaster: Broadcaster[int] = Broadcaster()
+        merging = broadcaster.subscribe(maxsize=2, merge=lambda older, newer: older + newer)
+        dropping = broadcaster.subscribe(maxsize=2)
+        received = []
+        broadcaster.add_callback(lambda item: 1 / 0)
+        broadcaster.add_callback(received.append)
+        for item in (1, 2, 3, 4):
+            broadcaster.publish(item)
+        assert received == [1, 2, 3, 4]
+        assert [merging.get_nowait(), merging.get_nowait()] == [1, 9]
+        assert [dropping.get_nowait(), dropping.get_nowait()] == [3, 4]
+        assert (merging.overflows, dropping.overflows) == (2, 2)
+        broadcaster.publish(5)
+        dropping.close()
+        assert broadcaster.subscriber_count == 3
+        # Buffered items are still delivered after close
+        assert [x async for x in dropping] == [5]
+        with pytest.raises(ValueError):
+            broadcaster.subscribe(maxsize=0)
+
+    asyncio.run(scenario())
+
+
+def test_device_changes_are_fanned_out(backend, connect):
+    async def scenario():
+        async with connect(backend) as device:
+            first, second = device.watch(), device.watch()
+            await device.read_state()
+            for subscription in (first, second):
+                changes = {}
+                while len(subscription):
+                    changes.update(subscription.get_nowait().changes)
+                assert changes == dict(battery=80, light=5, position=50)
+            # Only changed fields are emitted
+            backend.get_peripheral(ADDRESS).battery = 70
+            await device.read_state(max_age=0)
+            change = await asyncio.wait_for(first.get(), 1)
+            assert change.changes == dict(battery=70)
+            assert (change.state.battery, change.state.position) == (70, 50)
+            assert len(first) == 0
+            first.close()
+            second.close()
+            # Late subscriber starts with the current state
+            async with device.watch() as late:
+                assert late.get_nowait().changes == dict(battery=70, light=5, position=50)
+            async with device.watch(emit_current=False) as silent:
+                assert silent.get_nowait() is None
+
+    asyncio.run(scenario())
+
+
+def test_slow_consumer_receives_merged_changes(backend, connect):
+    async def scenario():
+        async with connect(backend) as device:
+            async with device.watch(maxsize=1) as subscription:
+                await device.read_state()
+                change = subscription.get_nowait()
+                assert change.changes == dict(battery=80, light=5, position=50)
+                assert subscription.overflows == 2
+
+    asyncio.run(scenario())
+
+
+def test_polling_is_shared_and_stops_with_last_subscription(backend, connect):
+    def battery_queries():
+        return sum(1 for x in backend.get_peripheral(ADDRESS).received_commands if x[5] == protocol.Cmd.GET_BATTERY)
+
+    async def scenario():
+        async with connect(backend) as device:
+            fast = device.watch(poll_interval=0.05)
+            slow = device.watch(poll_interval=10)
+            assert (await asyncio.wait_for(fast.get(), 1)).state.battery == 80
+            await asyncio.sleep(0.3)
+            # Device is polled once per the smallest interval, not once per subscription
+            assert 3 <= battery_queries() <= 8
+            fast.close()
+            slow.close()
+            await asyncio.sleep(0.1)
+            polled = battery_queries()
+            await asyncio.sleep(0.2)
+            assert battery_queries() == polled
+
+    asyncio.run(scenario())
+
+
+def test_manager_watch_merges_devices():
+    async def scenario():
+        manager = AM43DeviceManager(backend=create_backend(2, ZERO_LATENCY, position=50))
+        try:
+            first = await manager.connect(ADDRESS)
+            await first.read_state()
+            async with manager.watch() as subscription:
+                assert subscription.get_nowait().address == ADDRESS
+                second = await manager.connect("02:00:00:00:43:02")
+                await second.read_battery_status()
+                change = await asyncio.wait_for(subscription.get(), 1)
+                assert (change.address, change.changes) == ("02:00:00:00:43:02", dict(battery=80))
+        finally:
+            await manager.disconnect_all()
+
+    asyncio.run(scenario())